@@ -65,6 +65,16 @@ export interface VisitorAnalytics {
     device: string;
     visits: number;
   }>;
+  browser_breakdown: Array<{
+    browser: string;
+    visits: number;
+  }>;
+  os_breakdown: Array<{
+    os: string;
+    visits: number;
+  }>;
+  unique_visitors: number | null;
+  unique_visitors_approximate: boolean;
 }
 
 export interface PopularCakeSize {
@@ -84,9 +94,12 @@ export interface CartRecoveryAnalytics {
 }
 
 export interface ProductPageView {
+  product_id: string;
   product_slug: string;
+  product_name: string;
   page_url: string;
   visits: number;
+  unique_visitors: number | null;
 }
 
 export interface WeeklyOrderStatusMix {
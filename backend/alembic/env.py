@@ -17,7 +17,9 @@ from app.models.user import User  # noqa: F401
 from app.models.audit_log import AuditLog  # noqa: F401
 from app.models.product import Product, ProductVariant, StockAdjustment  # noqa: F401
 from app.models.order import Order, OrderItem, Payment  # noqa: F401
-from app.models.analytics import AnalyticsEvent, DailyRevenue  # noqa: F401
+from app.models.analytics import (  # noqa: F401
+    AnalyticsEvent, DailyEventStats, DailyProductSales, DailyRevenue,
+)
 from app.models.business import ScheduleCapacity, CakeDeposit  # noqa: F401
 from app.models.ml import CakePricePrediction, ServingEstimate, CustomCake, ProcessedImage, MLModelVersion  # noqa: F401
 
@@ -0,0 +1,72 @@
+"""Add daily_product_sales rollup and backfill it from paid orders
+
+Revision ID: add_daily_product_sales
+Revises: add_hot_path_indexes
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_daily_product_sales'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULLS NOT DISTINCT (PostgreSQL 15+): products without variants have
+    # variant_id NULL and still need exactly one row per day
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS daily_product_sales (
+            id BIGSERIAL PRIMARY KEY,
+            date DATE NOT NULL,
+            product_id UUID,
+            variant_id UUID,
+            product_name VARCHAR(255) NOT NULL,
+            variant_name VARCHAR(100),
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue NUMERIC(12, 2) NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            cake_quantity INTEGER NOT NULL DEFAULT 0,
+            cake_revenue NUMERIC(12, 2) NOT NULL DEFAULT 0,
+            CONSTRAINT uq_daily_product_sales_key
+                UNIQUE NULLS NOT DISTINCT (date, product_id, variant_id)
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_daily_product_sales_date
+        ON daily_product_sales (date)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_daily_product_sales_product_id
+        ON daily_product_sales (product_id)
+    """)
+
+    # Backfill the full history (same aggregation as SalesRollupService)
+    op.execute("DELETE FROM daily_product_sales")
+    op.execute("""
+        INSERT INTO daily_product_sales (
+            date, product_id, variant_id, product_name, variant_name,
+            quantity, revenue, order_count, cake_quantity, cake_revenue
+        )
+        SELECT
+            CAST(coalesce(o.paid_at, o.created_at) AS DATE),
+            oi.product_id,
+            oi.variant_id,
+            max(oi.product_name),
+            max(oi.variant_name),
+            sum(oi.quantity),
+            sum(oi.line_total),
+            count(DISTINCT oi.order_id),
+            sum(CASE WHEN o.has_cake THEN oi.quantity ELSE 0 END),
+            sum(CASE WHEN o.has_cake THEN oi.line_total ELSE 0 END)
+        FROM order_items oi
+        JOIN orders o ON oi.order_id = o.id
+        WHERE o.status IN ('PAID', 'CONFIRMED', 'COMPLETED')
+        GROUP BY CAST(coalesce(o.paid_at, o.created_at) AS DATE), oi.product_id, oi.variant_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS daily_product_sales")
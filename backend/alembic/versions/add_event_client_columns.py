@@ -0,0 +1,34 @@
+"""Add device, browser, OS and location columns to analytics_events
+
+Revision ID: add_event_client_columns
+Revises: add_product_view_resources
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_event_client_columns'
+down_revision = 'add_product_view_resources'
+branch_labels = None
+depends_on = None
+
+# Nullable without defaults: a catalog-only change on the parent and every
+# partition, no table rewrite. Filled in for new events at ingestion.
+COLUMNS = {
+    "device_type": "VARCHAR(16)",
+    "browser": "VARCHAR(32)",
+    "os": "VARCHAR(32)",
+    "country": "VARCHAR(2)",
+    "city": "VARCHAR(100)",
+}
+
+
+def upgrade() -> None:
+    for name, type_ in COLUMNS.items():
+        op.execute(f"ALTER TABLE analytics_events ADD COLUMN IF NOT EXISTS {name} {type_}")
+
+
+def downgrade() -> None:
+    for name in reversed(list(COLUMNS)):
+        op.execute(f"ALTER TABLE analytics_events DROP COLUMN IF EXISTS {name}")
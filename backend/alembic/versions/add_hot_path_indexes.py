@@ -0,0 +1,54 @@
+"""Add composite and partial indexes for analytics and order hot paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_clerk_user_id
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_clerk_user_id'
+branch_labels = None
+depends_on = None
+
+# OrderStatus is stored by enum name
+PAID_STATUSES = "status IN ('PAID', 'CONFIRMED', 'COMPLETED')"
+
+INDEXES = {
+    # Revenue summary / items sold / daily revenue filter paid orders by paid_at
+    "ix_orders_paid_at_paid": f"orders (paid_at) WHERE {PAID_STATUSES}",
+    # Best sellers / popular products filter paid orders by created_at
+    "ix_orders_created_at_paid": f"orders (created_at) WHERE {PAID_STATUSES}",
+    # Dashboard order counts per status over a date range
+    "ix_orders_status_created_at": "orders (status, created_at)",
+    # Customer history and order velocity in risk analysis
+    "ix_orders_customer_created_at": "orders (customer_id, created_at)",
+    # Order → items joins aggregating quantity / line_total per product
+    "ix_order_items_order_product": (
+        "order_items (order_id, product_id) INCLUDE (quantity, line_total)"
+    ),
+    # Visits per day / product page views by event type and time
+    "ix_analytics_events_type_created_at": (
+        "analytics_events (event_type, created_at) INCLUDE (session_id)"
+    ),
+}
+
+
+def upgrade() -> None:
+    # CONCURRENTLY so orders and analytics_events stay writable while the
+    # indexes build; it cannot run inside the migration transaction.
+    # IF NOT EXISTS keeps this safe on databases built with create_all.
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+        op.execute("ANALYZE orders")
+        op.execute("ANALYZE order_items")
+        op.execute("ANALYZE analytics_events")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in reversed(list(INDEXES)):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,94 @@
+"""Index analytics events by resource and key daily_event_stats by product
+
+Revision ID: add_product_view_resources
+Revises: partition_analytics_events
+Create Date: 2026-10-16
+
+Existing product page views are tagged with their product afterwards, by
+the one-off `python scripts/backfill_product_views.py` (batched per day, so
+analytics_events is never locked for long).
+"""
+from sqlalchemy import text
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_view_resources'
+down_revision = 'partition_analytics_events'
+branch_labels = None
+depends_on = None
+
+INDEX = "ix_analytics_events_resource_created_at"
+COLUMNS = "(resource_type, resource_id, created_at) INCLUDE (event_type)"
+
+# Product slug of a /products/<slug> page_url (same rule as
+# product_slug_from_url)
+SLUG = "split_part(split_part(rtrim(s.page_url, '/'), '/products/', 2), '?', 1)"
+
+
+def upgrade() -> None:
+    # Built on each partition CONCURRENTLY, then attached to an index
+    # created ON ONLY the parent, so event ingestion is never blocked
+    partitions = op.get_bind().execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'analytics_events'::regclass
+    """)).scalars().all()
+    op.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY analytics_events {COLUMNS}")
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_resource_created_at "
+                f"ON {partition} {COLUMNS}"
+            )
+            op.execute(
+                f"ALTER INDEX {INDEX} ATTACH PARTITION {partition}_resource_created_at"
+            )
+
+    # daily_event_stats: product rows are keyed by product id instead of
+    # page URL; existing URL rows are folded into their product. Databases
+    # created by init_db (create_all) after this change already have the
+    # new shape — no page_url column, constraint on resource_id.
+    bind = op.get_bind()
+    op.execute("ALTER TABLE daily_event_stats ADD COLUMN IF NOT EXISTS resource_id VARCHAR(255)")
+    has_page_url = bind.execute(text("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'daily_event_stats' AND column_name = 'page_url'
+    """)).first() is not None
+    if has_page_url:
+        op.execute(f"""
+            INSERT INTO daily_event_stats (date, event_type, resource_id, events, unique_sessions)
+            SELECT s.date, s.event_type, p.id::text, sum(s.events), sum(s.unique_sessions)
+            FROM daily_event_stats s
+            JOIN products p ON p.slug = {SLUG}
+            WHERE s.page_url IS NOT NULL
+            GROUP BY s.date, s.event_type, p.id
+        """)
+        op.execute("DELETE FROM daily_event_stats WHERE page_url IS NOT NULL")
+        op.execute(
+            "ALTER TABLE daily_event_stats DROP CONSTRAINT IF EXISTS uq_daily_event_stats_key"
+        )
+    op.execute("ALTER TABLE daily_event_stats DROP COLUMN IF EXISTS page_url")
+    has_key = bind.execute(text("""
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'uq_daily_event_stats_key'
+          AND conrelid = 'daily_event_stats'::regclass
+    """)).first() is not None
+    if not has_key:
+        op.execute("""
+            ALTER TABLE daily_event_stats ADD CONSTRAINT uq_daily_event_stats_key
+                UNIQUE NULLS NOT DISTINCT (date, event_type, resource_id)
+        """)
+
+
+def downgrade() -> None:
+    # Per-product rollup rows cannot be mapped back to URLs and are dropped
+    op.execute("DELETE FROM daily_event_stats WHERE resource_id IS NOT NULL")
+    op.execute("ALTER TABLE daily_event_stats DROP CONSTRAINT IF EXISTS uq_daily_event_stats_key")
+    op.execute("ALTER TABLE daily_event_stats DROP COLUMN resource_id")
+    op.execute("ALTER TABLE daily_event_stats ADD COLUMN page_url VARCHAR(500)")
+    op.execute("""
+        ALTER TABLE daily_event_stats ADD CONSTRAINT uq_daily_event_stats_key
+            UNIQUE NULLS NOT DISTINCT (date, event_type, page_url)
+    """)
+    op.execute(f"DROP INDEX IF EXISTS {INDEX}")
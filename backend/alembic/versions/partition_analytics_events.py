@@ -0,0 +1,143 @@
+"""Partition analytics_events by month and add daily_event_stats
+
+Revision ID: partition_analytics_events
+Revises: add_daily_product_sales
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'partition_analytics_events'
+down_revision = 'add_daily_product_sales'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, event_type, user_id, session_id, resource_type, resource_id, "
+    "properties, page_url, referrer, user_agent, ip_address, created_at"
+)
+
+# Same indexes as before, now declared on the partitioned parent (and so
+# created on every partition)
+INDEXES = {
+    "ix_analytics_events_event_type": "(event_type)",
+    "ix_analytics_events_user_id": "(user_id)",
+    "ix_analytics_events_session_id": "(session_id)",
+    "ix_analytics_events_created_at": "(created_at)",
+    "ix_analytics_events_type_created_at": "(event_type, created_at) INCLUDE (session_id)",
+}
+
+# Monthly partitions from the oldest event's month to three months ahead
+# (AnalyticsPartitionService keeps them ahead from here on)
+CREATE_PARTITIONS = """
+    DO $$
+    DECLARE
+        month date;
+        first_month date := date_trunc('month', coalesce(
+            (SELECT min(created_at) FROM analytics_events_legacy), now()
+        ) AT TIME ZONE 'UTC');
+    BEGIN
+        FOR month IN
+            SELECT generate_series(
+                first_month,
+                date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                interval '1 month'
+            )::date
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF analytics_events '
+                'FOR VALUES FROM (%L) TO (%L)',
+                'analytics_events_' || to_char(month, 'YYYY_MM'),
+                month || ' 00:00:00+00',
+                (month + interval '1 month')::date || ' 00:00:00+00'
+            );
+        END LOOP;
+    END
+    $$
+"""
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS daily_event_stats (
+            id BIGSERIAL PRIMARY KEY,
+            date DATE NOT NULL,
+            event_type VARCHAR(100) NOT NULL,
+            page_url VARCHAR(500),
+            events INTEGER NOT NULL DEFAULT 0,
+            unique_sessions INTEGER NOT NULL DEFAULT 0,
+            CONSTRAINT uq_daily_event_stats_key
+                UNIQUE NULLS NOT DISTINCT (date, event_type, page_url)
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_daily_event_stats_date
+        ON daily_event_stats (date)
+    """)
+
+    # Swap the plain table for a partitioned one. The old table's indexes
+    # are dropped first so their names can be reused on the new parent.
+    op.execute("ALTER TABLE analytics_events RENAME TO analytics_events_legacy")
+    op.execute("ALTER INDEX analytics_events_pkey RENAME TO analytics_events_legacy_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("""
+        CREATE TABLE analytics_events (
+            id UUID NOT NULL,
+            event_type VARCHAR(100) NOT NULL,
+            user_id UUID,
+            session_id VARCHAR(255),
+            resource_type VARCHAR(50),
+            resource_id VARCHAR(255),
+            properties JSONB,
+            page_url VARCHAR(500),
+            referrer VARCHAR(500),
+            user_agent TEXT,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT analytics_events_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(CREATE_PARTITIONS)
+    op.execute(
+        f"INSERT INTO analytics_events ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM analytics_events_legacy"
+    )
+    op.execute("DROP TABLE analytics_events_legacy")
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON analytics_events {definition}")
+    op.execute("ANALYZE analytics_events")
+
+
+def downgrade() -> None:
+    # Months already retired into daily_event_stats are not restored
+    op.execute("ALTER TABLE analytics_events RENAME TO analytics_events_partitioned")
+    op.execute("ALTER INDEX analytics_events_pkey RENAME TO analytics_events_partitioned_pkey")
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    op.execute("""
+        CREATE TABLE analytics_events (
+            id UUID NOT NULL,
+            event_type VARCHAR(100) NOT NULL,
+            user_id UUID,
+            session_id VARCHAR(255),
+            resource_type VARCHAR(50),
+            resource_id VARCHAR(255),
+            properties JSONB,
+            page_url VARCHAR(500),
+            referrer VARCHAR(500),
+            user_agent TEXT,
+            ip_address VARCHAR(45),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT analytics_events_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute(
+        f"INSERT INTO analytics_events ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM analytics_events_partitioned"
+    )
+    op.execute("DROP TABLE analytics_events_partitioned")
+    for name, definition in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON analytics_events {definition}")
+    op.execute("DROP TABLE IF EXISTS daily_event_stats")
@@ -5,13 +5,15 @@ Event tracking, revenue dashboard, best sellers, inventory insights.
 
 from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import require_admin
 from app.core.database import get_db
 from app.models.user import User
 from app.schemas.analytics import (
+    AnalyticsEventBatch,
+    AnalyticsEventBatchResponse,
     AnalyticsEventCreate,
     AnalyticsEventResponse,
     BestSellerResponse,
@@ -19,8 +21,10 @@ from app.schemas.analytics import (
     InventoryTurnoverResponse,
     PopularVariantResponse,
     RevenueSummary,
+    SalesRankingsResponse,
     WeeklyOrderStatusMixResponse,
 )
+from app.services.analytics_ingest_service import AnalyticsIngestService
 from app.services.analytics_service import AnalyticsService
 from app.services.trend_service import TrendService
 
@@ -28,44 +32,62 @@ router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
 
 # ── Event Tracking (public — for frontend) ──────────────────────────────────
-@router.post("/events", response_model=AnalyticsEventResponse)
-async def track_event(
-    data: AnalyticsEventCreate,
-    request: Request,
-    db: AsyncSession = Depends(get_db),
-):
+@router.post(
+    "/events",
+    response_model=AnalyticsEventResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def track_event(data: AnalyticsEventCreate, request: Request):
     """
     Record an analytics event.
     Used by the frontend to track page views, add-to-cart, searches, etc.
+    The event is buffered and written in bulk shortly after (202 Accepted).
     """
-    service = AnalyticsService(db)
-
-    # Try to get current user (optional — anonymous tracking allowed)
-    user_id = None
-    try:
-        from app.api.deps import bearer_scheme
-        creds = await bearer_scheme(request)
-        if creds:
-            from app.core.security import decode_token
-            payload = decode_token(creds.credentials)
-            if payload:
-                user_id = payload.get("sub")
-    except Exception:
-        pass
-
-    event = await service.record_event(
-        event_type=data.event_type,
+    # Optional — anonymous tracking allowed
+    user_id = AnalyticsIngestService.user_id_from_authorization(
+        request.headers.get("authorization")
+    )
+    row = AnalyticsIngestService.build_row(
+        data,
         user_id=user_id,
-        session_id=data.session_id,
-        resource_type=data.resource_type,
-        resource_id=data.resource_id,
-        properties=data.properties,
-        page_url=data.page_url,
-        referrer=data.referrer,
         user_agent=request.headers.get("user-agent"),
         ip_address=request.client.host if request.client else None,
     )
-    return event
+    if not AnalyticsIngestService.enqueue(row):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analytics ingestion is saturated, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    return row
+
+
+@router.post(
+    "/events/batch",
+    response_model=AnalyticsEventBatchResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def track_events(data: AnalyticsEventBatch, request: Request):
+    """
+    Record up to MAX_EVENTS_PER_BATCH analytics events in one request.
+    The frontend queues events and sends them together (see the contract
+    next to AnalyticsEventBatch); the batch is accepted or refused as a whole.
+    """
+    rows = AnalyticsIngestService.build_rows(
+        data.events,
+        user_id=AnalyticsIngestService.user_id_from_authorization(
+            request.headers.get("authorization")
+        ),
+        user_agent=request.headers.get("user-agent"),
+        ip_address=request.client.host if request.client else None,
+    )
+    if not AnalyticsIngestService.enqueue(*rows):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analytics ingestion is saturated, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    return {"accepted": len(rows)}
 
 
 # ── Admin Dashboard ──────────────────────────────────────────────────────────
@@ -149,15 +171,28 @@ async def get_worst_sellers(
     return await service.get_worst_sellers(days=days, limit=limit)
 
 
+@router.get("/seller-rankings", response_model=SalesRankingsResponse)
+async def get_seller_rankings(
+    days: int = Query(30, ge=1, le=365),
+    limit: int = Query(10, ge=1, le=50),
+    admin: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """[Admin] Get best and worst sellers in one call."""
+    service = AnalyticsService(db)
+    return await service.get_sales_rankings(days=days, limit=limit)
+
+
 @router.get("/visitors")
 async def get_visitor_analytics(
     days: int = Query(30, ge=1, le=365),
+    exact: bool = Query(False, description="Exact unique visitors via COUNT(DISTINCT) (slow)"),
     admin: User = Depends(require_admin),
     db: AsyncSession = Depends(get_db),
 ):
-    """[Admin] Get visitor traffic (visits over time)."""
+    """[Admin] Get visitor traffic (visits over time, approximate unique visitors)."""
     service = AnalyticsService(db)
-    return await service.get_visitor_analytics(days=days)
+    return await service.get_visitor_analytics(days=days, exact=exact)
 
 
 @router.get("/product-page-views")
@@ -29,6 +29,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import require_admin
 from app.core.database import async_session_factory, get_db
+from app.core.http_cache import etag_matches, not_modified, version_etag
 from app.core.logging import get_logger
 from app.core.rate_limiter import check_rate_limit, rate_limit_upload
 from app.core.validators import (
@@ -39,6 +40,7 @@ from app.models.ml import ProcessedImage
 from app.models.product import ProductCategory
 from app.models.user import User
 from app.schemas.product import ProductCreate, VariantCreate
+from app.services.cache_service import CacheService
 from app.services.image_processing_service import ImageCategory, ImageProcessingService
 from app.services.product_service import ProductService
 
@@ -69,6 +71,7 @@ async def _run_process_image_task(
             if "error" in result:
                 logger.error("Background processing failed for %s: %s", image_id, result["error"])
             await session.commit()
+            await CacheService.bump_version("images")
         except Exception:
             await session.rollback()
             logger.exception("Background processing crashed for %s", image_id)
@@ -91,6 +94,7 @@ async def _run_reprocess_image_task(
             if "error" in result:
                 logger.error("Background reprocess failed for %s: %s", image_id, result["error"])
             await session.commit()
+            await CacheService.bump_version("images")
         except Exception:
             await session.rollback()
             logger.exception("Background reprocess crashed for %s", image_id)
@@ -339,6 +343,7 @@ async def reject_and_reprocess(
     image.rejection_reason = data.custom_prompt
     image.error_message = None
     await db.commit()
+    await CacheService.bump_version("images")
 
     background_tasks.add_task(
         _run_reprocess_image_task, data.image_id, data.custom_prompt, cat.value if cat else None
@@ -360,6 +365,8 @@ async def choose_image_version(
     result = await service.admin_choose_image(data.image_id, data.choice)
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
+    await db.commit()
+    await CacheService.bump_version("images")
     return result
 
 
@@ -374,6 +381,8 @@ async def delete_image(
     deleted = await service.delete_image(image_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Image not found")
+    await db.commit()
+    await CacheService.bump_version("images")
     return {"message": "Image deleted", "image_id": str(image_id)}
 
 
@@ -416,6 +425,7 @@ async def get_public_selected_image(
 @router.get("/{image_id}/serve")
 async def serve_image_public(
     image_id: uuid.UUID,
+    request: Request,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -425,7 +435,18 @@ async def serve_image_public(
 
     Used when a product thumbnail is set directly to /api/v1/images/{id}/serve.
     Serves the admin-chosen version if one exists, otherwise the original upload.
+
+    Only inline (legacy base64) images carry an ETag, so a matching
+    If-None-Match — answered with 304 before the database is read — always
+    refers to image bytes. Redirects are cached privately for half the
+    pre-signed URL's lifetime instead, so a stored redirect is never
+    revalidated past the expiry of its signature.
     """
+    # "inline" keeps ETags issued for redirects by earlier releases from matching
+    etag = version_etag(await CacheService.get_version("images"), image_id, "inline")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     result = await db.execute(select(ProcessedImage).where(ProcessedImage.id == image_id))
     image = result.scalar_one_or_none()
     if not image or not image.original_url:
@@ -434,11 +455,17 @@ async def serve_image_public(
         raise HTTPException(status_code=403, detail="Image not available")
 
     from app.core.config import get_settings
+    ttl = get_settings().S3_PRESIGNED_URL_TTL
     # Prefer the admin-chosen version (original or processed); fall back to original
     url_to_serve, _ = ImageProcessingService.resolve_selected_image_url(image)
-    return await ImageProcessingService.build_serve_response(
-        url_to_serve or image.original_url, ttl=get_settings().S3_PRESIGNED_URL_TTL
+    response = await ImageProcessingService.build_serve_response(
+        url_to_serve or image.original_url, ttl=ttl
     )
+    if response.status_code == 307:
+        response.headers["Cache-Control"] = f"private, max-age={ttl // 2}"
+    else:
+        response.headers["ETag"] = etag
+    return response
 
 
 # ── One-time URL migration ────────────────────────────────────────────────────
@@ -574,6 +601,7 @@ async def migrate_base64_images_to_s3(
             continue
 
     await db.commit()
+    await CacheService.bump_version("images")
 
     return {
         "message": "Base64 → S3 migration complete",
@@ -0,0 +1,67 @@
+"""
+Metrics endpoints — request latency / status metrics across all workers.
+Readable by admins, or by a scraper presenting METRICS_TOKEN.
+"""
+
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.api.deps import bearer_scheme, get_current_user
+from app.core import slow_queries
+from app.core.config import get_settings
+from app.core.database import async_session_factory
+from app.core.metrics import collect, latency_summary, render_prometheus
+from app.models.user import UserRole
+
+router = APIRouter(prefix="/metrics", tags=["Monitoring"])
+settings = get_settings()
+
+
+async def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+) -> None:
+    """
+    Allow the configured METRICS_TOKEN, otherwise require an admin user.
+    A session is only opened for the admin lookup, so scrapes stay off the pool.
+    """
+    if (
+        settings.METRICS_TOKEN
+        and credentials is not None
+        and hmac.compare_digest(credentials.credentials, settings.METRICS_TOKEN)
+    ):
+        return
+    async with async_session_factory() as db:
+        user = await get_current_user(credentials, db)
+    if user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+
+
+@router.get("", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """[Admin] Prometheus text-format metrics, aggregated across workers."""
+    return PlainTextResponse(
+        render_prometheus(await collect()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@router.get("/latency", dependencies=[Depends(require_metrics_access)])
+async def get_latency_summary():
+    """[Admin] p50/p95/p99 latency per endpoint, slowest first."""
+    return latency_summary(await collect())
+
+
+@router.get("/slow-queries", dependencies=[Depends(require_metrics_access)])
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """[Admin] Most recent slow SQL statements with their EXPLAIN plans."""
+    return {
+        "enabled": settings.SLOW_QUERY_MS > 0,
+        "threshold_ms": settings.SLOW_QUERY_MS,
+        "queries": await slow_queries.read(limit),
+    }
@@ -7,12 +7,20 @@ import asyncio
 import os
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user, log_admin_action, require_admin
-from app.core.database import get_db
+from app.core.database import async_session_factory, get_db
+from app.core.http_cache import (
+    etag_matches,
+    http_date,
+    not_modified,
+    not_modified_since,
+    version_etag,
+)
 from app.core.logging import get_logger
+from app.models.product import ProductCategory
 from app.models.user import User
 from app.schemas.product import (
     ProductCreate,
@@ -26,7 +34,13 @@ from app.schemas.product import (
     VariantUpdate,
 )
 from app.schemas.user import MessageResponse
-from app.services.cache_service import CacheService, CACHE_TTL
+from app.services.cache_service import (
+    CACHE_STALE_TTL,
+    CACHE_TTL,
+    CachedResponse,
+    CacheService,
+)
+from app.services.catalog_service import CatalogService
 from app.services.product_service import ProductService
 
 router = APIRouter(prefix="/products", tags=["Products"])
@@ -55,47 +69,103 @@ async def _sanitize_negative_stock(product, db: AsyncSession) -> None:
         await db.flush()
 
 
+async def _load_product_list(**filters) -> dict:
+    """
+    Cache factory for the public product list.
+    Uses its own session because it may run as a background refresh after
+    the request that triggered it has finished.
+    """
+    async with async_session_factory() as db:
+        service = ProductService(db)
+        products = await service.list_products(is_active=True, **filters)
+        for product in products:
+            await _sanitize_negative_stock(product, db)
+        await db.commit()
+        return CachedResponse.payload(
+            [ProductListResponse.model_validate(p).model_dump(mode="json") for p in products]
+        )
+
+
 # ── Public Endpoints ─────────────────────────────────────────────────────────
 @router.get("/", response_model=list[ProductListResponse])
 async def list_products(
+    request: Request,
     category: str | None = None,
     is_featured: bool | None = None,
     is_cake: bool | None = None,
     search: str | None = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
 ):
-    """Browse products (public). Only shows active products."""
-    cache_key = CacheService._make_key(
-        "product_list",
-        category=category,
-        is_featured=is_featured,
-        is_cake=is_cake,
-        search=search,
-        skip=skip,
-        limit=limit,
+    """
+    Browse products (public). Only shows active products.
+    Served from pre-serialized bytes: the body is validated once when it is
+    cached, never on a hit.
+    """
+    filters = {
+        "category": category,
+        "is_featured": is_featured,
+        "is_cake": is_cake,
+        "search": search,
+        "skip": skip,
+        "limit": limit,
+    }
+    cache_key = CacheService._make_key("product_list_body", **filters)
+    etag = version_etag(await CacheService.get_version("catalog"), cache_key)
+    if etag_matches(request, etag):
+        return not_modified(etag, {"Vary": "Accept-Encoding"})
+
+    cached = await CacheService.get_or_set(
+        cache_key,
+        lambda: _load_product_list(**filters),
+        ttl=CACHE_TTL["product_list"],
+        tags=CacheService.product_tags(category=category),
+        stale_ttl=CACHE_STALE_TTL["product_list"],
+        early_beta=1.0,
+        loader=CachedResponse.from_payload,
     )
-    cached = await CacheService.get(cache_key)
-    if cached is not None:
-        return cached
+    return cached.to_response(request, etag=etag)
 
-    service = ProductService(db)
-    products = await service.list_products(
-        category=category,
-        is_active=True,
-        is_featured=is_featured,
-        is_cake=is_cake,
-        search=search,
-        skip=skip,
-        limit=limit,
+
+# ── Catalog snapshots (served without SQL, see CatalogService) ──────────────
+async def _catalog_response(request: Request, name: str) -> Response:
+    document = await CatalogService.get_document(name)
+    if etag_matches(request, document.etag):
+        return not_modified(document.etag, {"Vary": "Accept-Encoding"})
+    return document.to_response(request)
+
+
+@router.get("/catalog/featured", response_model=list[ProductListResponse])
+async def get_featured_catalog(request: Request):
+    """Featured products (public), from the precomputed catalog."""
+    return await _catalog_response(request, CatalogService.FEATURED)
+
+
+@router.get("/catalog/popular", response_model=list[ProductListResponse])
+async def get_popular_catalog(request: Request):
+    """Best-selling products of the last 30 days (public), from the precomputed catalog."""
+    return await _catalog_response(request, CatalogService.POPULAR)
+
+
+@router.get("/catalog/homepage")
+async def get_homepage_catalog(request: Request):
+    """Homepage data (public): featured and popular products in one response."""
+    featured = await CatalogService.get_document(CatalogService.FEATURED)
+    popular = await CatalogService.get_document(CatalogService.POPULAR)
+    etag = version_etag(featured.etag.strip('"'), popular.etag.strip('"'))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(
+        content=b'{"featured":' + featured.body + b',"popular":' + popular.body + b"}",
+        media_type="application/json",
+        headers={"ETag": etag},
     )
-    for product in products:
-        await _sanitize_negative_stock(product, db)
 
-    serialized = [ProductListResponse.model_validate(p).model_dump(mode="json") for p in products]
-    await CacheService.set(cache_key, serialized, ttl=CACHE_TTL["product_list"])
-    return serialized
+
+@router.get("/catalog/category/{category}", response_model=list[ProductListResponse])
+async def get_category_catalog(category: ProductCategory, request: Request):
+    """All active products in a category (public), from the precomputed catalog."""
+    return await _catalog_response(request, CatalogService.category_document(category))
 
 
 @router.get("/count")
@@ -105,32 +175,139 @@ async def count_products(db: AsyncSession = Depends(get_db)):
     return {"total": await service.count_products(is_active=True)}
 
 
-@router.get("/slug/{slug}", response_model=ProductResponse)
-async def get_product_by_slug(
-    slug: str,
-    db: AsyncSession = Depends(get_db),
-):
-    """Get a product by slug (public)."""
-    service = ProductService(db)
-    product = await service.get_product_by_slug(slug)
-    if not product or not product.is_active:
+async def _load_product_detail(product_id: uuid.UUID) -> dict | None:
+    """Cache factory for one product page; None caches "not found"."""
+    async with async_session_factory() as db:
+        product = await ProductService(db).get_product(product_id)
+        if not product or not product.is_active:
+            return None
+        await _sanitize_negative_stock(product, db)
+        await db.commit()
+        return _detail_payload(product)
+
+
+def _detail_payload(product) -> dict:
+    return CachedResponse.payload(
+        ProductResponse.model_validate(product).model_dump(mode="json"),
+        last_modified=http_date(product.updated_at),
+    )
+
+
+def _detail_key(product_id) -> str:
+    return CacheService._make_key("product_detail", product_id)
+
+
+async def _cached_product_detail(product_id: uuid.UUID) -> CachedResponse | None:
+    """Product page bytes, cached per product and dropped by its own writes only."""
+    return await CacheService.get_or_set(
+        _detail_key(product_id),
+        lambda: _load_product_detail(product_id),
+        ttl=CACHE_TTL["product_detail"],
+        tags=(f"product:{product_id}",),
+        stale_ttl=CACHE_STALE_TTL["product_detail"],
+        early_beta=1.0,
+        loader=CachedResponse.from_payload,
+    )
+
+
+async def _resolve_slug(slug: str) -> str | None:
+    async with async_session_factory() as db:
+        product_id = await ProductService(db).get_product_id_by_slug(slug)
+        return str(product_id) if product_id else None
+
+
+def _detail_response(request: Request, cached: CachedResponse | None, etag: str) -> Response:
+    if cached is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    await _sanitize_negative_stock(product, db)
-    return product
+    if not_modified_since(request, cached.last_modified):
+        return not_modified(etag)
+    return cached.to_response(request, etag=etag)
 
 
-@router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(
-    product_id: uuid.UUID,
-    db: AsyncSession = Depends(get_db),
+@router.get("/batch", response_model=list[ProductResponse])
+async def get_products_batch(
+    request: Request,
+    ids: list[uuid.UUID] = Query(..., min_length=1, max_length=100),
 ):
-    """Get a product by ID (public)."""
-    service = ProductService(db)
-    product = await service.get_product(product_id)
-    if not product or not product.is_active:
+    """
+    Get several products by ID in one call (public), in the order requested.
+    Unknown or inactive IDs are omitted. Cached products are read with one
+    MGET; the rest are loaded in a single query and cached for next time.
+    """
+    ids = list(dict.fromkeys(ids))
+    etag = version_etag(await CacheService.get_version("catalog"), "batch", *ids)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    entries = await CacheService.get_many(
+        [_detail_key(product_id) for product_id in ids],
+        loader=CacheService.envelope_loader(CachedResponse.from_payload),
+    )
+    found = {
+        product_id: CacheService.unwrap(entry)
+        for product_id, entry in zip(ids, entries)
+        if entry is not None
+    }
+
+    missing = [product_id for product_id in ids if product_id not in found]
+    if missing:
+        async with async_session_factory() as db:
+            products = {p.id: p for p in await ProductService(db).get_products(missing)}
+            for product in products.values():
+                await _sanitize_negative_stock(product, db)
+            await db.commit()
+        for product_id in missing:
+            product = products.get(product_id)
+            payload = _detail_payload(product) if product and product.is_active else None
+            found[product_id] = await CacheService.put(
+                _detail_key(product_id),
+                payload,
+                ttl=CACHE_TTL["product_detail"],
+                tags=(f"product:{product_id}",),
+                stale_ttl=CACHE_STALE_TTL["product_detail"],
+                loader=CachedResponse.from_payload,
+            )
+
+    bodies = [found[product_id].body for product_id in ids if found[product_id] is not None]
+    return Response(
+        content=b"[" + b",".join(bodies) + b"]",
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+
+@router.get("/slug/{slug}", response_model=ProductResponse)
+async def get_product_by_slug(slug: str, request: Request):
+    """
+    Get a product by slug (public). Supports conditional GET.
+    The slug resolves to an ID through a cached alias, so both routes share
+    one cached body per product.
+    """
+    etag = version_etag(await CacheService.get_version("catalog"), "slug", slug)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    product_id = await CacheService.get_or_set(
+        CacheService._make_key("product_slug", slug),
+        lambda: _resolve_slug(slug),
+        ttl=CACHE_TTL["product_detail"],
+        tags=("products",),  # renames and new products can remap any slug
+    )
+    if product_id is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    await _sanitize_negative_stock(product, db)
-    return product
+    cached = await _cached_product_detail(uuid.UUID(product_id))
+    return _detail_response(request, cached, etag)
+
+
+@router.get("/{product_id}", response_model=ProductResponse)
+async def get_product(product_id: uuid.UUID, request: Request):
+    """Get a product by ID (public). Supports conditional GET."""
+    etag = version_etag(await CacheService.get_version("catalog"), "id", product_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    cached = await _cached_product_detail(product_id)
+    return _detail_response(request, cached, etag)
 
 
 @router.get("/low-stock/all", response_model=list[VariantResponse])
@@ -145,13 +322,11 @@ async def get_low_stock(
 
 async def _invalidate_and_notify(product_id: str | None = None):
     """
-    1. Bust the backend Redis cache.
-    2. Ping Next.js to drop its 'products' cache tag instantly.
-    3. Purge Cloudflare edge cache so CDN serves fresh HTML immediately.
-    All three run concurrently, fire-and-forget — admin response is never delayed.
+    1. Ping Next.js to drop its 'products' cache tag instantly.
+    2. Purge Cloudflare edge cache so CDN serves fresh HTML immediately.
+    Both run concurrently, fire-and-forget — admin response is never delayed.
+    The backend cache is invalidated by ProductService once the write commits.
     """
-    await CacheService.invalidate_product(product_id)
-
     import httpx
 
     async def _ping_nextjs():
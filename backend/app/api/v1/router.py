@@ -10,6 +10,7 @@ from app.api.v1.business import router as business_router
 from app.api.v1.carts import router as carts_router
 from app.api.v1.health import router as health_router
 from app.api.v1.images import router as images_router
+from app.api.v1.metrics import router as metrics_router
 from app.api.v1.ml import router as ml_router
 from app.api.v1.orders import router as orders_router
 from app.api.v1.payments import router as payments_router
@@ -31,3 +32,4 @@ api_v1_router.include_router(ml_router)
 api_v1_router.include_router(images_router)
 api_v1_router.include_router(carts_router)
 api_v1_router.include_router(telegram_router)
+api_v1_router.include_router(metrics_router)
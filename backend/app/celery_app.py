@@ -211,6 +211,14 @@ if Celery is not None:
             "task": "app.workers.analytics_tasks.aggregate_daily_revenue",
             "schedule": 86400.0,  # Every 24 hours
         },
+        "product-sales-reconciliation": {
+            "task": "app.workers.analytics_tasks.reconcile_daily_product_sales",
+            "schedule": 86400.0,  # Every 24 hours
+        },
+        "analytics-partition-maintenance": {
+            "task": "app.workers.analytics_tasks.maintain_analytics_partitions",
+            "schedule": 86400.0,  # Every 24 hours
+        },
         "low-stock-check": {
             "task": "app.workers.analytics_tasks.check_low_stock_alerts",
             "schedule": 3600.0,  # Every hour
@@ -106,6 +106,14 @@ class Settings(BaseSettings):
     SENTRY_DSN: str = ""
     APP_VERSION: str = "0.1.0"
 
+    # Bearer token Prometheus presents to GET /metrics (admins can always read it)
+    METRICS_TOKEN: str = ""
+    # Slow-query log: statements slower than this are recorded with an EXPLAIN
+    # plan (0 disables); the newest SLOW_QUERY_BUFFER_SIZE entries are kept
+    SLOW_QUERY_MS: int = 0
+    SLOW_QUERY_EXPLAIN: bool = True
+    SLOW_QUERY_BUFFER_SIZE: int = 200
+
     # ── AWS S3 (image storage — no blobs in the DB) ──────────────────────
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
@@ -124,6 +132,28 @@ class Settings(BaseSettings):
     RATE_LIMIT_UPLOAD_PER_MINUTE: int = 20   # image uploads (per authenticated user)
     RATE_LIMIT_ORDER_PER_MINUTE: int = 30    # order creation (per user)
 
+    # ── Request Validation ───────────────────────────────────────────────
+    # Optional file of blocked query-string substrings (one per line, # for
+    # comments); replaces the built-in list and is re-read when it changes.
+    REQUEST_BLOCKLIST_FILE: str = ""
+
+    # ── Caching ──────────────────────────────────────────────────────────
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024      # per-worker in-process LRU size
+    CACHE_LOCAL_TTL_SECONDS: int = 30        # upper bound on in-process freshness
+
+    # ── Analytics Ingestion ──────────────────────────────────────────────
+    ANALYTICS_INGEST_QUEUE_SIZE: int = 20000  # per-worker buffered events
+    ANALYTICS_INGEST_BATCH_SIZE: int = 500    # events per bulk INSERT
+    ANALYTICS_HLL_TTL_DAYS: int = 400         # unique-visitor sketches kept in Redis
+    GEOIP_DATABASE_PATH: str = ""             # GeoLite2-City.mmdb (needs geoip2); "" = no locations
+
+    # ── Analytics Retention ──────────────────────────────────────────────
+    # analytics_events is partitioned by month; months older than the
+    # retention are summarized into daily_event_stats, then dropped
+    ANALYTICS_RETENTION_MONTHS: int = 13      # 0 = keep raw events forever
+    ANALYTICS_PARTITIONS_AHEAD: int = 3       # future months created in advance
+    ANALYTICS_DROP_EXPIRED_PARTITIONS: bool = True  # False = detach only (archive by hand)
+
     # ── Logging ──────────────────────────────────────────────────────────
     LOG_LEVEL: str = "INFO"
 
@@ -0,0 +1,67 @@
+"""
+HTTP conditional-request helpers (ETag / If-None-Match / Last-Modified).
+
+ETags are derived from content *versions* (generation counters held in
+Redis — see CacheService.get_version) rather than from the response body,
+so a matching If-None-Match can be answered with 304 before the database is
+touched or a response is built.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from starlette.responses import Response
+
+
+def version_etag(version: int | str, *parts) -> str:
+    """Weak ETag for a representation identified by `parts` at `version`."""
+    digest = hashlib.sha1(":".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of `etag` against the request's If-None-Match header."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == wanted for candidate in header.split(",")
+    )
+
+
+def not_modified_since(request: Request, last_modified: datetime | str | None) -> bool:
+    """
+    True when If-Modified-Since covers `last_modified` (ignored if If-None-Match
+    is set). `last_modified` may be a datetime or an HTTP date string.
+    """
+    if last_modified is None or "if-none-match" in request.headers:
+        return False
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+        if isinstance(last_modified, str):
+            last_modified = parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def http_date(value: datetime) -> str:
+    """Format a datetime for the Last-Modified header."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def not_modified(etag: str, headers: dict[str, str] | None = None) -> Response:
+    """Empty 304 response carrying the validator."""
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
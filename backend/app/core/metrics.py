@@ -0,0 +1,314 @@
+"""
+Request metrics — per-route latency histograms, status counters, in-flight
+gauge and response sizes, exposed in Prometheus text format. Other
+components can record their own unlabelled counters and gauges
+(`registry.inc` / `registry.set_gauge`).
+
+Each worker records into its own in-memory registry (MetricsMiddleware) and
+periodically publishes a snapshot to a Redis hash. The /metrics endpoint
+merges the live snapshots of every worker, so one scrape covers the whole
+deployment. Routes are labelled by their template
+("/api/v1/products/{product_id}"), never the raw path, to bound cardinality.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import time
+import uuid
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.monitoring import RequestTimer
+from app.core.redis import get_redis
+
+logger = get_logger("metrics")
+settings = get_settings()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUANTILES = (0.5, 0.95, 0.99)
+
+SNAPSHOT_KEY = "ks:metrics:snapshots"
+PUBLISH_INTERVAL = 10.0
+SNAPSHOT_MAX_AGE = 300  # snapshots older than this belong to stopped workers
+
+UNMATCHED_ROUTE = "unmatched"
+
+_WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class _Histogram:
+    """Fixed-bucket histogram; counts are per bucket (cumulated on export)."""
+
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * (size + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+
+class MetricsRegistry:
+    """One worker's request metrics."""
+
+    def __init__(self):
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.latency: dict[tuple[str, str], _Histogram] = {}
+        self.sizes: dict[tuple[str, str], _Histogram] = {}
+        self.in_flight = 0
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, float] = {}
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int) -> None:
+        key = (method, route)
+        counter = (method, route, status)
+        self.requests[counter] = self.requests.get(counter, 0) + 1
+
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = _Histogram(len(LATENCY_BUCKETS))
+            self.sizes[key] = _Histogram(len(SIZE_BUCKETS))
+        latency.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        latency.sum += seconds
+
+        sizes = self.sizes[key]
+        sizes.counts[bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+        sizes.sum += size
+
+    def snapshot(self) -> dict:
+        """JSON-serializable copy of the registry."""
+        return {
+            "ts": time.time(),
+            "in_flight": self.in_flight,
+            "requests": [[m, r, s, n] for (m, r, s), n in self.requests.items()],
+            "latency": [[m, r, h.sum, h.counts] for (m, r), h in self.latency.items()],
+            "sizes": [[m, r, h.sum, h.counts] for (m, r), h in self.sizes.items()],
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+        }
+
+
+registry = MetricsRegistry()
+
+
+# ── Aggregation & export ─────────────────────────────────────────────────────
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """Sum worker snapshots into one."""
+    requests: dict[tuple, int] = {}
+    histograms = {"latency": {}, "sizes": {}}
+    in_flight = 0
+    totals = {"counters": {}, "gauges": {}}  # gauges are summed across workers too
+    for snap in snapshots:
+        in_flight += snap.get("in_flight", 0)
+        for kind, merged in totals.items():
+            for name, value in snap.get(kind, {}).items():
+                merged[name] = merged.get(name, 0) + value
+        for method, route, status, count in snap.get("requests", []):
+            key = (method, route, status)
+            requests[key] = requests.get(key, 0) + count
+        for name, merged in histograms.items():
+            for method, route, total, counts in snap.get(name, []):
+                entry = merged.setdefault((method, route), [0.0, [0] * len(counts)])
+                entry[0] += total
+                entry[1] = [a + b for a, b in zip(entry[1], counts)]
+    return {
+        "in_flight": in_flight,
+        "requests": [[m, r, s, n] for (m, r, s), n in sorted(requests.items())],
+        **{
+            name: [[m, r, t, c] for (m, r), (t, c) in sorted(merged.items())]
+            for name, merged in histograms.items()
+        },
+        **{kind: dict(sorted(merged.items())) for kind, merged in totals.items()},
+    }
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(lines: list[str], name: str, buckets, rows) -> None:
+    for method, route, total, counts in rows:
+        labels = f'method="{_label(method)}",route="{_label(route)}"'
+        cumulative = 0
+        for bound, count in zip(buckets, counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {total}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Prometheus text exposition format (0.0.4)."""
+    lines = [
+        "# HELP http_requests_total HTTP requests by route and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for method, route, status, count in snapshot["requests"]:
+        lines.append(
+            f'http_requests_total{{method="{_label(method)}",route="{_label(route)}",'
+            f'status="{status}"}} {count}'
+        )
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    _render_histogram(lines, "http_request_duration_seconds", LATENCY_BUCKETS, snapshot["latency"])
+    lines += [
+        "# HELP http_response_size_bytes Response body size by route.",
+        "# TYPE http_response_size_bytes histogram",
+    ]
+    _render_histogram(lines, "http_response_size_bytes", SIZE_BUCKETS, snapshot["sizes"])
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being served.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {snapshot['in_flight']}",
+    ]
+    for kind, prom_type in (("counters", "counter"), ("gauges", "gauge")):
+        for name, value in snapshot.get(kind, {}).items():
+            lines += [f"# TYPE {name} {prom_type}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(q: float, counts: list[int]) -> float | None:
+    """Estimate a quantile from bucket counts (linear within a bucket)."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            if i == len(LATENCY_BUCKETS):  # +Inf bucket: best we can say
+                return LATENCY_BUCKETS[-1]
+            lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+            return lower + (LATENCY_BUCKETS[i] - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
+
+
+def latency_summary(snapshot: dict) -> list[dict]:
+    """Per-route request count and p50/p95/p99 latency (ms), slowest p95 first."""
+    rows = []
+    for method, route, total, counts in snapshot["latency"]:
+        count = sum(counts)
+        row = {
+            "method": method,
+            "route": route,
+            "count": count,
+            "mean_ms": round(total / count * 1000, 2) if count else None,
+        }
+        for q in QUANTILES:
+            value = _quantile(q, counts)
+            row[f"p{int(q * 100)}_ms"] = round(value * 1000, 2) if value is not None else None
+        rows.append(row)
+    rows.sort(key=lambda r: r["p95_ms"] or 0, reverse=True)
+    return rows
+
+
+async def collect() -> dict:
+    """Merged snapshot across all live workers (this worker's is always current)."""
+    snapshots = {_WORKER_ID: registry.snapshot()}
+    try:
+        redis = await get_redis()
+        stored = await redis.hgetall(SNAPSHOT_KEY)
+        cutoff = time.time() - SNAPSHOT_MAX_AGE
+        for worker, data in stored.items():
+            if worker == _WORKER_ID:
+                continue
+            snap = json.loads(data)
+            if snap.get("ts", 0) >= cutoff:
+                snapshots[worker] = snap
+    except Exception as e:
+        logger.warning("Metrics: reading worker snapshots failed: %s", str(e))
+    return merge_snapshots(list(snapshots.values()))
+
+
+# ── Cross-worker publishing ──────────────────────────────────────────────────
+_publisher_task: asyncio.Task | None = None
+
+
+async def _publish_forever() -> None:
+    while True:
+        await asyncio.sleep(PUBLISH_INTERVAL)
+        try:
+            redis = await get_redis()
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(SNAPSHOT_KEY, _WORKER_ID, json.dumps(registry.snapshot()))
+            pipe.expire(SNAPSHOT_KEY, SNAPSHOT_MAX_AGE * 12)
+            await pipe.execute()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Metrics snapshot publish failed: %s", str(e))
+
+
+def start_metrics_publisher() -> None:
+    """Start publishing this worker's snapshot (called at app startup)."""
+    global _publisher_task
+    if _publisher_task is None or _publisher_task.done():
+        _publisher_task = asyncio.create_task(_publish_forever())
+
+
+async def stop_metrics_publisher() -> None:
+    """Stop publishing and drop this worker's snapshot (called at app shutdown)."""
+    global _publisher_task
+    if _publisher_task is not None:
+        _publisher_task.cancel()
+        try:
+            await _publisher_task
+        except asyncio.CancelledError:
+            pass
+        _publisher_task = None
+    try:
+        redis = await get_redis()
+        await redis.hdel(SNAPSHOT_KEY, _WORKER_ID)
+    except Exception:
+        pass
+
+
+# ── ASGI middleware ──────────────────────────────────────────────────────────
+class MetricsMiddleware:
+    """Record latency, status, size and concurrency for every HTTP request."""
+
+    def __init__(self, app, metrics: MetricsRegistry | None = None, slow_request_ms: int = 1000):
+        self.app = app
+        self.registry = metrics or registry
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.registry.in_flight += 1
+        start = RequestTimer.start()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            self.registry.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            self.registry.observe(scope["method"], route, status, elapsed, size)
+            RequestTimer.log_slow_request(
+                route, scope["method"], int(elapsed * 1000), self.slow_request_ms
+            )
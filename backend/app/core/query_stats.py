@@ -0,0 +1,185 @@
+"""
+Per-request SQL statistics — query count, DB time and N+1 detection.
+
+Cursor-execute events on the engine record into the QueryStats of the current
+request (a contextvar, so concurrent requests never mix). Statements that
+repeat with the same shape within one request are reported as likely N+1
+loops. Outside production, responses carry X-DB-Queries / X-DB-Time.
+
+    with track_queries() as stats:
+        await service.get_best_sellers()
+    assert stats.count <= 3, stats.report()
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger("query_stats")
+settings = get_settings()
+
+# A statement shape seen this many times in one request is flagged as N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_current: ContextVar["QueryStats | None"] = ContextVar("query_stats", default=None)
+# Trackers that see every query in the process (tests driving the app from
+# another thread, where the request's contextvar is out of reach)
+_process_trackers: list["QueryStats"] = []
+
+_WHITESPACE = re.compile(r"\s+")
+# Expanded IN lists: "IN ($1, $2, $3)" / "(?, ?)" / "(%(p_1)s, %(p_2)s)" → "(?)"
+_PLACEHOLDER = r"(?:\$\d+|\?|%\(\w+\)s|:\w+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize SQL so executions differing only in parameters compare equal."""
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Queries executed within one request (or `track_queries` block)."""
+
+    __slots__ = ("count", "duration", "shapes", "scope")
+
+    def __init__(self, scope: dict | None = None):
+        self.scope = scope
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.duration += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times (likely N+1)."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    @property
+    def route(self) -> str | None:
+        """"METHOD /route/{template}" of the request being tracked, if any."""
+        if self.scope is None:
+            return None
+        route = getattr(self.scope.get("route"), "path", None) or self.scope.get("path")
+        return f"{self.scope.get('method')} {route}"
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f}ms"]
+        lines += [f"  {n}x {shape}" for shape, n in self.shapes.most_common()]
+        return "\n".join(lines)
+
+
+def current() -> QueryStats | None:
+    """Stats of the request (or `track_queries` block) running in this context."""
+    return _current.get()
+
+
+@contextmanager
+def track_queries(all_threads: bool = False, scope: dict | None = None):
+    """
+    Collect QueryStats for the queries run inside the block — in this
+    context only, or with `all_threads` every query the process runs.
+    """
+    stats = QueryStats(scope)
+    if all_threads:
+        _process_trackers.append(stats)
+        try:
+            yield stats
+        finally:
+            _process_trackers.remove(stats)
+        return
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# ── Engine instrumentation ───────────────────────────────────────────────────
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _process_trackers:
+        conn.info.setdefault("query_stats_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    starts = conn.info.get("query_stats_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for tracker in _process_trackers:
+        tracker.record(statement, elapsed)
+
+
+def pop_start_on_error(info_key: str):
+    """
+    A handle_error listener dropping the start time `info_key` holds for a
+    statement that raised (after_cursor_execute never runs for it), so the
+    next statement on the connection is not timed from the wrong start.
+    """
+
+    def _handle_error(context) -> None:
+        conn = context.connection
+        starts = conn.info.get(info_key) if conn is not None else None
+        if starts:
+            starts.pop()
+
+    return _handle_error
+
+
+_handle_error = pop_start_on_error("query_stats_start")
+
+
+def instrument_engine(engine) -> None:
+    """Attach the query counters to an Engine or AsyncEngine (idempotent)."""
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
+
+
+# ── ASGI middleware ──────────────────────────────────────────────────────────
+class QueryStatsMiddleware:
+    """Track queries per request; warn on N+1 and expose headers outside production."""
+
+    def __init__(self, app, expose_headers: bool | None = None):
+        self.app = app
+        self.expose_headers = (
+            not settings.is_production if expose_headers is None else expose_headers
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_stats(message):
+            if self.expose_headers and message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", ()),
+                        (b"x-db-queries", str(stats.count).encode()),
+                        (b"x-db-time", f"{stats.duration * 1000:.1f}".encode()),
+                    ],
+                }
+            await send(message)
+
+        with track_queries(scope=scope) as stats:
+            await self.app(scope, receive, send_with_stats)
+
+        for shape, count in stats.repeated():
+            logger.warning(
+                "Possible N+1 on %s: %d executions of %s", stats.route, count, shape[:300],
+            )
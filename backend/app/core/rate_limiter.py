@@ -13,7 +13,13 @@ Usage in route handlers
     await check_rate_limit(request, limit=10, window=60)
 """
 
+import hashlib
+import math
+import uuid
+from typing import NamedTuple
+
 from fastapi import HTTPException, Request, status
+from redis.exceptions import NoScriptError
 
 from app.core.config import get_settings
 from app.core.logging import get_logger
@@ -22,6 +28,76 @@ from app.core.redis import get_redis
 logger = get_logger("rate_limiter")
 settings = get_settings()
 
+# One sorted set per key: a member per accepted request, scored by its time
+# in ms (Redis server clock, so every worker agrees). Trim, count, record and
+# compute the reset in one atomic step — a single round trip per check.
+_SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], window)
+
+local reset = 0
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {allowed, limit - count, reset}
+"""
+_SLIDING_WINDOW_SHA = hashlib.sha1(_SLIDING_WINDOW_SCRIPT.encode("utf-8")).hexdigest()
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of one rate-limit check."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int   # seconds until the oldest counted request leaves the window
+    window: int
+
+
+async def sliding_window_hit(key: str, limit: int, window: int) -> RateLimitResult:
+    """
+    Count one request against `key` (at most `limit` per `window` seconds).
+    Rejected requests are not recorded. Raises on Redis errors so callers
+    can choose to fail open.
+    """
+    redis = await get_redis()
+    args = (limit, window * 1000, uuid.uuid4().hex)
+    try:
+        allowed, remaining, reset_ms = await redis.evalsha(_SLIDING_WINDOW_SHA, 1, key, *args)
+    except NoScriptError:
+        # First call since a Redis restart / SCRIPT FLUSH — EVAL caches it again
+        allowed, remaining, reset_ms = await redis.eval(_SLIDING_WINDOW_SCRIPT, 1, key, *args)
+    return RateLimitResult(
+        allowed=bool(allowed),
+        limit=limit,
+        remaining=max(0, int(remaining)),
+        reset=max(1, math.ceil(int(reset_ms) / 1000)),
+        window=window,
+    )
+
+
+def rate_limit_headers(result: RateLimitResult) -> dict[str, str]:
+    """IETF `RateLimit-*` response headers for a check result."""
+    return {
+        "RateLimit-Limit": str(result.limit),
+        "RateLimit-Remaining": str(result.remaining),
+        "RateLimit-Reset": str(result.reset),
+        "RateLimit-Policy": f"{result.limit};w={result.window}",
+    }
+
 
 async def check_rate_limit(
     request: Request,
@@ -40,7 +116,9 @@ async def check_rate_limit(
     user_id  : authenticated user UUID string; when present, limits are
                applied per-user rather than per-IP, preventing shared-IP abuse.
 
-    Raises HTTP 429 when the limit is exceeded.
+    Raises HTTP 429 when the limit is exceeded. The result is kept on
+    `request.state.rate_limit` so SecurityHeadersMiddleware can emit the
+    `RateLimit-*` headers on the response.
     """
     if limit is None:
         limit = settings.RATE_LIMIT_PER_MINUTE
@@ -54,34 +132,26 @@ async def check_rate_limit(
 
     # Normalise path to strip trailing slashes for consistent keys
     path = request.url.path.rstrip("/") or "/"
-    key = f"rl:{identity}:{path}"
+    key = f"rl:sw:{identity}:{path}"
 
     try:
-        redis = await get_redis()
-
-        current = await redis.get(key)
-        if current is not None and int(current) >= limit:
-            logger.warning(
-                "Rate limit hit: %s on %s (%s req/%ds)",
-                identity, path, limit, window,
-            )
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too many requests. Please slow down and try again.",
-                headers={"Retry-After": str(window)},
-            )
-
-        # Atomic increment + set expiry in a pipeline
-        pipe = redis.pipeline()
-        pipe.incr(key)
-        pipe.expire(key, window)
-        await pipe.execute()
-
-    except HTTPException:
-        raise
+        result = await sliding_window_hit(key, limit, window)
     except Exception as exc:
         # Redis outage → fail open (allow the request) but log it
         logger.error("Rate limiter Redis error (allowing request through): %s", exc)
+        return
+
+    request.state.rate_limit = result
+    if not result.allowed:
+        logger.warning(
+            "Rate limit hit: %s on %s (%s req/%ds)",
+            identity, path, limit, window,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please slow down and try again.",
+            headers={"Retry-After": str(result.reset), **rate_limit_headers(result)},
+        )
 
 
 # ── Convenience wrappers — call these directly inside route handlers ──────────
@@ -5,62 +5,190 @@ DDoS throttling, and 2FA support.
 
 import hashlib
 import os
+import re
 import time
 import uuid
+from collections import OrderedDict
+from urllib.parse import unquote_plus
 
-from fastapi import FastAPI, Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI, Response
 
 from app.core.config import get_settings
 from app.core.logging import get_logger
+from app.core.rate_limiter import rate_limit_headers
 
 logger = get_logger("security")
 _settings = get_settings()
 
 
-# ── Security Headers ─────────────────────────────────────────────────────────
+# ── Shared ASGI helpers ──────────────────────────────────────────────────────
+# The middleware below is plain ASGI rather than BaseHTTPMiddleware: no extra
+# task or body stream per layer, and streaming responses pass through as-is.
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Add security headers to every response."""
+def _json_error(status_code: int, detail: str, headers: dict[str, str] | None = None) -> Response:
+    """Pre-built rejection response (ASGI responses can be sent repeatedly)."""
+    return Response(
+        content=f'{{"detail":"{detail}"}}',
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
 
-    async def dispatch(self, request: Request, call_next):
-        response: Response = await call_next(request)
-
-        # Content Security Policy
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self' https://js.stripe.com; "
-            "frame-src https://js.stripe.com; "
-            "img-src 'self' data: https:; "
-            "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
-            "font-src 'self' https://fonts.gstatic.com; "
-            "connect-src 'self' https://api.stripe.com"
-        )
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = (
-            "camera=(), microphone=(), geolocation=(), payment=(self)"
-        )
 
-        # Unique request ID for tracing (added to both request and response)
-        req_id = request.state.__dict__.get("request_id", "")
-        if req_id:
-            response.headers["X-Request-ID"] = req_id
+def _header(scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
 
+def _trie_regex(patterns) -> str:
+    """
+    One regex for a set of literal substrings, factored on shared prefixes
+    (a trie), so each input position is tested against a single branch
+    point rather than every pattern in turn.
+    """
+    trie: dict = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        # A pattern ends here: whatever follows is optional
+        return group + "?" if "" in node else group
+
+    return build(trie)
+
+
+class PatternScanner:
+    """
+    Substring blocklist matched against lowercased text in a single pass.
+
+    The patterns are compiled once into one trie-factored regex. With `path`,
+    they are read from that file instead (one per line, `#` starts a comment
+    line, surrounding whitespace is significant) and re-read whenever the
+    file's mtime changes — checked at most every RELOAD_INTERVAL seconds.
+    """
+
+    RELOAD_INTERVAL = 5.0
+
+    def __init__(self, patterns, path: str = ""):
+        self.path = path
+        self._mtime: int | None = None
+        self._next_check = 0.0
+        self._compile(patterns)
+        if path:
+            self._maybe_reload()
+
+    def _compile(self, patterns) -> None:
+        self.patterns = tuple(sorted({p.lower() for p in patterns if p}))
+        self._regex = re.compile(_trie_regex(self.patterns)) if self.patterns else None
+
+    def search(self, text: str) -> str | None:
+        """The first blocked pattern found in (already lowercased) `text`."""
+        if self.path:
+            self._maybe_reload()
+        if self._regex is None:
+            return None
+        match = self._regex.search(text)
+        return match.group(0) if match else None
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.RELOAD_INTERVAL
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                lines = [line.rstrip("\r\n") for line in f]
+        except OSError as e:
+            if self._mtime != -1:  # log once per outage, not every check
+                logger.error("Blocklist %s unreadable, keeping current patterns: %s", self.path, e)
+                self._mtime = -1
+            return
+        self._compile(line for line in lines if line.strip() and not line.lstrip().startswith("#"))
+        self._mtime = mtime
+        logger.info("Loaded %d blocked patterns from %s", len(self.patterns), self.path)
+
+
+# ── Security Headers ─────────────────────────────────────────────────────────
+
+class SecurityHeadersMiddleware:
+    """Add security headers to every response."""
+
+    _HEADERS = [
+        (b"content-security-policy", (
+            b"default-src 'self'; "
+            b"script-src 'self' https://js.stripe.com; "
+            b"frame-src https://js.stripe.com; "
+            b"img-src 'self' data: https:; "
+            b"style-src 'self' 'unsafe-inline' https://fonts.googleapis.com; "
+            b"font-src 'self' https://fonts.gstatic.com; "
+            b"connect-src 'self' https://api.stripe.com"
+        )),
+        (b"x-content-type-options", b"nosniff"),
+        (b"x-frame-options", b"DENY"),
+        (b"x-xss-protection", b"1; mode=block"),
+        (b"referrer-policy", b"strict-origin-when-cross-origin"),
+        (b"permissions-policy", b"camera=(), microphone=(), geolocation=(), payment=(self)"),
+    ]
+
+    def __init__(self, app):
+        self.app = app
+        self.headers = list(self._HEADERS)
         # HSTS — production only
         if _settings.APP_ENV == "production":
-            response.headers["Strict-Transport-Security"] = (
-                "max-age=31536000; includeSubDomains; preload"
+            self.headers.append(
+                (b"strict-transport-security", b"max-age=31536000; includeSubDomains; preload")
             )
+        self._names = {name for name, _ in self.headers}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, self.wrap_send(scope, send))
+
+    def wrap_send(self, scope, send):
+        """Wrap `send` so the response start message carries the headers."""
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = [h for h in message.get("headers", ()) if h[0] not in self._names]
+                headers.extend(self.headers)
+                state = scope.get("state") or {}
+
+                # Unique request ID for tracing (set by RequestValidationMiddleware)
+                req_id = state.get("request_id")
+                if req_id:
+                    headers.append((b"x-request-id", req_id.encode("latin-1")))
+
+                # RateLimit-* headers when the route ran a rate-limit check
+                rate_limit = state.get("rate_limit")
+                if rate_limit is not None and not any(k == b"ratelimit-limit" for k, _ in headers):
+                    headers.extend(
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in rate_limit_headers(rate_limit).items()
+                    )
+                message = {**message, "headers": headers}
+            await send(message)
 
-        return response
+        return send_with_headers
 
 
 # ── Request Validation ───────────────────────────────────────────────────────
 
-class RequestValidationMiddleware(BaseHTTPMiddleware):
+class RequestValidationMiddleware:
     """
     Reject requests that contain obvious injection patterns or are structurally
     suspicious. This is a fast first-pass guard — Pydantic / endpoint-level
@@ -111,70 +239,131 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
 
     _ALL_BLOCKED = _SQL_PATTERNS + _XSS_PATTERNS + _INJECTION_PATTERNS
 
+    _PATH_SCANNER = PatternScanner(("../", "..\\", "%2e%2e", "%252e"))
+
     # Paths that are exempt from heavy validation (webhooks, health checks)
     _EXEMPT_PREFIXES = ("/api/v1/health", "/api/v1/ping", "/", "/docs", "/redoc")
 
-    async def dispatch(self, request: Request, call_next):
+    _BLOCKED = _json_error(400, "Request blocked")
+    _INVALID_PATH = _json_error(400, "Invalid path")
+    _TOO_LARGE = _json_error(413, "Request body too large")
+
+    def __init__(self, app, blocklist_file: str | None = None):
+        self.app = app
+        self.scanner = PatternScanner(
+            self._ALL_BLOCKED,
+            _settings.REQUEST_BLOCKLIST_FILE if blocklist_file is None else blocklist_file,
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rejection = self.reject(scope)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        await self.app(scope, receive, send)
+
+    def reject(self, scope) -> Response | None:
+        """The rejection response for a suspicious request, else None."""
         # Attach a unique request ID for tracing
-        request.state.request_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = str(uuid.uuid4())
 
-        path = request.url.path
+        path = scope["path"]
 
         # Skip validation for exempt paths
         for prefix in self._EXEMPT_PREFIXES:
             if path == prefix or (prefix != "/" and path.startswith(prefix)):
-                return await call_next(request)
+                return None
 
         # ── Query string injection check ──────────────────────────────────
-        raw_qs = (request.url.query or "").lower()
-        for pattern in self._ALL_BLOCKED:
-            if pattern in raw_qs:
+        # One pass over the query decoded once — what the route will see.
+        # Double-encoded payloads still match the literal %2e.. patterns.
+        raw_qs = scope.get("query_string", b"").decode("latin-1").lower()
+        if raw_qs:
+            text = raw_qs
+            if "%" in raw_qs or "+" in raw_qs:
+                text = unquote_plus(raw_qs).lower()
+            pattern = self.scanner.search(text)
+            if pattern is not None:
                 logger.warning(
                     "Blocked suspicious query string from %s: pattern=%r path=%s",
-                    request.client.host if request.client else "?",
+                    _client_ip(scope, "?"),
                     pattern,
                     path,
                 )
-                return Response(
-                    content='{"detail":"Request blocked"}',
-                    status_code=400,
-                    media_type="application/json",
-                )
+                return self._BLOCKED
 
         # ── Path traversal check ─────────────────────────────────────────
-        raw_path = request.url.path.lower()
-        for pattern in ("../", "..\\", "%2e%2e", "%252e"):
-            if pattern in raw_path:
-                logger.warning(
-                    "Blocked path traversal attempt from %s: %s",
-                    request.client.host if request.client else "?",
-                    path,
-                )
-                return Response(
-                    content='{"detail":"Invalid path"}',
-                    status_code=400,
-                    media_type="application/json",
-                )
+        if self._PATH_SCANNER.search(path.lower()) is not None:
+            logger.warning(
+                "Blocked path traversal attempt from %s: %s",
+                _client_ip(scope, "?"),
+                path,
+            )
+            return self._INVALID_PATH
 
         # ── Content-Length cap (10 MB — Pydantic/routes enforce stricter limits) ─
-        content_length = request.headers.get("content-length")
+        content_length = _header(scope, b"content-length")
         if content_length:
             try:
                 if int(content_length) > 10 * 1024 * 1024:
-                    return Response(
-                        content='{"detail":"Request body too large"}',
-                        status_code=413,
-                        media_type="application/json",
-                    )
+                    return self._TOO_LARGE
             except ValueError:
                 pass  # malformed header — let it through, route will reject
 
-        return await call_next(request)
+        return None
+
+
+def _client_ip(scope, default: str = "unknown") -> str:
+    client = scope.get("client")
+    return client[0] if client else default
 
 
 # ── IP-level DDoS throttle ────────────────────────────────────────────────────
 
-class IPThrottleMiddleware(BaseHTTPMiddleware):
+class IPTokenBuckets:
+    """
+    One token bucket per client IP, O(1) per check.
+
+    Each IP gets `rate` tokens per second up to a burst of `burst`. Buckets
+    live in an LRU capped at `max_ips`: the least recently seen IP is evicted
+    first, which only forgets an idle (and therefore refilled) bucket.
+    """
+
+    __slots__ = ("rate", "burst", "max_ips", "_buckets")
+
+    def __init__(self, rate: float, burst: float | None = None, max_ips: int = 100_000):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.max_ips = max_ips
+        # ip -> [tokens, last refill time]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def allow(self, ip: str, now: float) -> bool:
+        """Take one token for `ip` if available."""
+        bucket = self._buckets.get(ip)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[ip] = bucket
+            if len(self._buckets) > self.max_ips:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(ip)
+            elapsed = now - bucket[1]
+            if elapsed > 0:
+                bucket[0] = min(self.burst, bucket[0] + elapsed * self.rate)
+                bucket[1] = now
+
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class IPThrottleMiddleware:
     """
     Fast in-memory IP-level throttle.
     Caps sustained burst rate before Redis-backed per-user limiting kicks in.
@@ -183,47 +372,56 @@ class IPThrottleMiddleware(BaseHTTPMiddleware):
 
     _SKIP_PATHS = {"/api/v1/health", "/api/v1/ping", "/"}
 
-    def __init__(self, app, requests_per_second: int = 30):
-        super().__init__(app)
+    _THROTTLED = _json_error(429, "Too many requests", {"Retry-After": "1"})
+
+    def __init__(self, app, requests_per_second: int = 30, max_tracked_ips: int = 100_000):
+        self.app = app
         self.rps = requests_per_second
-        self._buckets: dict[str, list[float]] = {}
+        self._buckets = IPTokenBuckets(requests_per_second, max_ips=max_tracked_ips)
 
-    async def dispatch(self, request: Request, call_next):
-        if request.url.path in self._SKIP_PATHS:
-            return await call_next(request)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rejection = self.reject(scope)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        await self.app(scope, receive, send)
 
-        ip = request.client.host if request.client else "unknown"
-        now = time.time()
+    def reject(self, scope) -> Response | None:
+        """429 when the client IP is over its burst rate, else None."""
+        if scope["path"] in self._SKIP_PATHS:
+            return None
 
-        bucket = self._buckets.setdefault(ip, [])
-        # Slide the window
-        self._buckets[ip] = [t for t in bucket if now - t < 1.0]
+        ip = _client_ip(scope)
+        if not self._buckets.allow(ip, time.monotonic()):
+            logger.warning("IP burst throttle triggered: %s (cap=%d req/s)", ip, self.rps)
+            return self._THROTTLED
+        return None
 
-        if len(self._buckets[ip]) >= self.rps:
-            logger.warning(
-                "IP burst throttle triggered: %s (%d req/s, cap=%d)",
-                ip, len(self._buckets[ip]), self.rps,
-            )
-            return Response(
-                content='{"detail":"Too many requests"}',
-                status_code=429,
-                media_type="application/json",
-                headers={"Retry-After": "1"},
-            )
 
-        self._buckets[ip].append(now)
+# ── Combined pass ────────────────────────────────────────────────────────────
 
-        # Periodic cleanup to prevent unbounded memory growth
-        total = sum(len(v) for v in self._buckets.values())
-        if total > 10_000:
-            self._cleanup(now)
+class SecurityMiddleware:
+    """
+    Throttle, validation and security headers in a single ASGI layer.
+    Same checks as stacking the three middleware above, in the same order,
+    without a hop per layer; rejections get the security headers too.
+    """
 
-        return await call_next(request)
+    def __init__(self, app, requests_per_second: int = 30, max_tracked_ips: int = 100_000):
+        self.app = app
+        self.throttle = IPThrottleMiddleware(app, requests_per_second, max_tracked_ips)
+        self.validation = RequestValidationMiddleware(app)
+        self.headers = SecurityHeadersMiddleware(app)
 
-    def _cleanup(self, now: float) -> None:
-        stale = [ip for ip, ts in self._buckets.items() if not ts or now - ts[-1] > 60]
-        for ip in stale:
-            del self._buckets[ip]
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        send = self.headers.wrap_send(scope, send)
+        rejection = self.throttle.reject(scope) or self.validation.reject(scope)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        await self.app(scope, receive, send)
 
 
 # ── 2FA (TOTP) ───────────────────────────────────────────────────────────────
@@ -282,7 +480,5 @@ def validate_image_upload(content_type: str, file_size: int) -> tuple[bool, str]
 
 def apply_security_middleware(app: FastAPI) -> None:
     """Register all security middleware on the FastAPI application."""
-    app.add_middleware(SecurityHeadersMiddleware)
-    app.add_middleware(RequestValidationMiddleware)
-    app.add_middleware(IPThrottleMiddleware, requests_per_second=30)
+    app.add_middleware(SecurityMiddleware, requests_per_second=30)
     logger.info("Security middleware applied (headers / validation / IP throttle)")
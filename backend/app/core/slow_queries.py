@@ -0,0 +1,185 @@
+"""
+Slow-query log — opt-in recorder for statements over SLOW_QUERY_MS.
+
+Each slow statement is recorded with its normalized SQL, the shape of its
+parameters (types only, never values), the route that ran it and — for
+SELECT / DML — an `EXPLAIN (ANALYZE false, FORMAT JSON)` plan captured on a
+separate connection after the fact, so the request that was slow is not made
+slower. Entries go to a capped Redis list shared by all workers (a ring
+buffer of the newest SLOW_QUERY_BUFFER_SIZE), with a per-worker copy as a
+fallback, and are read from GET /api/v1/metrics/slow-queries.
+
+ANALYZE stays off: the plan is estimated, the statement is never run again.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from app.core import query_stats
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.redis import get_redis
+
+logger = get_logger("slow_queries")
+settings = get_settings()
+
+BUFFER_KEY = "ks:slow_queries"
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE false, FORMAT JSON) "
+# Plans of one statement shape are captured at most once per interval, and
+# never more than MAX_CONCURRENT_EXPLAINS at a time, so a query that is slow
+# because the database is overloaded does not pile EXPLAINs on top of it.
+EXPLAIN_INTERVAL = 300.0
+MAX_CONCURRENT_EXPLAINS = 2
+MAX_SQL_LENGTH = 4000
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_recent: deque[dict] = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+_explained_at: dict[str, float] = {}
+_explains_in_flight = 0
+_engine = None
+_capture_tasks: set[asyncio.Task] = set()
+
+
+def parameters_shape(parameters, executemany: bool = False):
+    """Parameter types without their values (they may hold personal data)."""
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "row": parameters_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def recent() -> list[dict]:
+    """This worker's slow queries, newest first."""
+    return list(reversed(_recent))
+
+
+async def read(limit: int | None = None) -> list[dict]:
+    """Slow queries across all workers, newest first (this worker's on Redis failure)."""
+    limit = limit or settings.SLOW_QUERY_BUFFER_SIZE
+    try:
+        redis = await get_redis()
+        entries = await redis.lrange(BUFFER_KEY, 0, limit - 1)
+        return [json.loads(entry) for entry in entries]
+    except Exception as e:
+        logger.warning("Slow-query log: reading buffer failed: %s", str(e))
+        return recent()[:limit]
+
+
+# ── Engine instrumentation ───────────────────────────────────────────────────
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+_handle_error = query_stats.pop_start_on_error("slow_query_start")
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("slow_query_start")
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    if elapsed_ms < settings.SLOW_QUERY_MS or statement.startswith(EXPLAIN_PREFIX):
+        return
+
+    stats = query_stats.current()
+    shape = query_stats.statement_shape(statement)
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "duration_ms": round(elapsed_ms, 1),
+        "sql": shape[:MAX_SQL_LENGTH],
+        "parameters": parameters_shape(parameters, executemany),
+        "route": stats.route if stats is not None else None,
+        "plan": None,
+    }
+    logger.warning(
+        "Slow query (%.0fms) on %s: %s", elapsed_ms, entry["route"] or "-", shape[:300]
+    )
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:  # sync engine outside the event loop (scripts, workers)
+        _recent.append(entry)
+        return
+    explain = not executemany and _should_explain(shape)
+    # A fresh context: the side connection's queries must not count
+    # towards the request's QueryStats.
+    task = loop.create_task(
+        _capture(entry, statement, parameters if explain else None, explain),
+        context=contextvars.Context(),
+    )
+    _capture_tasks.add(task)
+    task.add_done_callback(_capture_tasks.discard)
+
+
+def _should_explain(shape: str) -> bool:
+    global _explains_in_flight
+    if not settings.SLOW_QUERY_EXPLAIN or _engine is None:
+        return False
+    if not shape.lstrip("( ").upper().startswith(_EXPLAINABLE):
+        return False
+    if _explains_in_flight >= MAX_CONCURRENT_EXPLAINS:
+        return False
+    now = time.monotonic()
+    if now - _explained_at.get(shape, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+        return False
+    if len(_explained_at) > 1000:
+        _explained_at.clear()
+    _explained_at[shape] = now
+    _explains_in_flight += 1
+    return True
+
+
+async def _capture(entry: dict, statement: str, parameters, explain: bool) -> None:
+    global _explains_in_flight
+    if explain:
+        try:
+            async with _engine.connect() as conn:
+                result = await conn.exec_driver_sql(
+                    EXPLAIN_PREFIX + statement,
+                    tuple(parameters) if isinstance(parameters, list) else parameters,
+                )
+                plan = result.scalar()
+                entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+        except Exception as e:
+            entry["plan_error"] = str(e)[:500]
+        finally:
+            _explains_in_flight -= 1
+
+    _recent.append(entry)
+    try:
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        pipe.lpush(BUFFER_KEY, json.dumps(entry, default=str))
+        pipe.ltrim(BUFFER_KEY, 0, settings.SLOW_QUERY_BUFFER_SIZE - 1)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("Slow-query log: storing entry failed: %s", str(e))
+
+
+def install_slow_query_log(engine) -> bool:
+    """
+    Record slow statements run on `engine` (an AsyncEngine; its plans are
+    captured on its own pool). No-op unless SLOW_QUERY_MS is set.
+    """
+    global _engine
+    if settings.SLOW_QUERY_MS <= 0:
+        return False
+    _engine = engine
+    target = getattr(engine, "sync_engine", engine)
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target, "handle_error", _handle_error)
+    logger.info("Slow-query log enabled (threshold %dms)", settings.SLOW_QUERY_MS)
+    return True
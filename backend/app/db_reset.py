@@ -9,13 +9,16 @@ import sys
 
 from app.core.database import async_session_factory, engine, Base
 from app.core.logging import setup_logging, get_logger
+from app.services.analytics_partition_service import AnalyticsPartitionService
 
 # Import ALL models so SQLAlchemy knows about them
 from app.models.user import User  # noqa: F401
 from app.models.audit_log import AuditLog  # noqa: F401
 from app.models.product import Product, ProductVariant, StockAdjustment  # noqa: F401
 from app.models.order import Order, OrderItem, Payment  # noqa: F401
-from app.models.analytics import AnalyticsEvent, DailyRevenue  # noqa: F401
+from app.models.analytics import (  # noqa: F401
+    AnalyticsEvent, DailyEventStats, DailyProductSales, DailyRevenue,
+)
 from app.models.business import ScheduleCapacity, CakeDeposit  # noqa: F401
 from app.models.ml import (  # noqa: F401
     CakePricePrediction, ServingEstimate, CustomCake, ProcessedImage, MLModelVersion,
@@ -41,6 +44,7 @@ async def reset_database():
     logger.info("🔨 Recreating all tables...")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(AnalyticsPartitionService.ensure_partitions)
     logger.info("✅ All tables created")
 
     # Run the seed script
@@ -48,6 +48,7 @@ async def lifespan(app: FastAPI):
     # Auto-create tables and seed if database is empty
     try:
         from app.core.database import engine, Base, async_session_factory
+        from app.services.analytics_partition_service import AnalyticsPartitionService
         from sqlalchemy import text
 
         # Import ALL models so Base.metadata knows about them
@@ -55,7 +56,9 @@ async def lifespan(app: FastAPI):
         from app.models.audit_log import AuditLog  # noqa: F401
         from app.models.product import Product, ProductVariant, StockAdjustment  # noqa: F401
         from app.models.order import Order, OrderItem, Payment  # noqa: F401
-        from app.models.analytics import AnalyticsEvent, DailyRevenue  # noqa: F401
+        from app.models.analytics import (  # noqa: F401
+            AnalyticsEvent, DailyEventStats, DailyProductSales, DailyRevenue,
+        )
         from app.models.business import ScheduleCapacity, CakeDeposit  # noqa: F401
         from app.models.ml import (  # noqa: F401
             CakePricePrediction, ServingEstimate, CustomCake, ProcessedImage, MLModelVersion,
@@ -69,6 +72,7 @@ async def lifespan(app: FastAPI):
             async with engine.begin() as conn:
                 await conn.run_sync(Base.metadata.create_all)
                 await conn.execute(text(ORDER_STATUS_ENUM_SYNC_SQL))
+                await conn.run_sync(AnalyticsPartitionService.ensure_partitions)
             logger.info("✅ Database tables verified (dev mode — create_all)")
 
         # Check if database needs seeding (no users = empty DB)
@@ -89,10 +93,25 @@ async def lifespan(app: FastAPI):
         logger.error("Database setup error: %s", str(e))
         logger.info("💡 Make sure PostgreSQL is running: docker compose up -d")
 
+    # Keep this worker's in-process cache tier in sync with the others
+    from app.services.cache_service import CacheService
+    CacheService.start_invalidation_listener()
+
+    # Share this worker's request metrics with the /metrics endpoint
+    from app.core.metrics import start_metrics_publisher, stop_metrics_publisher
+    start_metrics_publisher()
+
+    # Drain buffered analytics events into the database in batches
+    from app.services.analytics_ingest_service import AnalyticsIngestService
+    AnalyticsIngestService.start()
+
     yield
 
     # ── Shutdown ─────────────────────────────────────────────────────────
     logger.info("Shutting down %s...", settings.APP_NAME)
+    await AnalyticsIngestService.stop()
+    await stop_metrics_publisher()
+    await CacheService.stop_invalidation_listener()
     await close_redis()
     logger.info("Goodbye! 🍰")
 
@@ -131,6 +150,18 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # ── Per-request SQL stats (query count / DB time / N+1 warnings) ─────
+    from app.core.database import engine
+    from app.core.query_stats import QueryStatsMiddleware, instrument_engine
+    from app.core.slow_queries import install_slow_query_log
+    instrument_engine(engine)
+    install_slow_query_log(engine)
+    app.add_middleware(QueryStatsMiddleware)
+
+    # ── Request Metrics (outermost, so it times the whole stack) ─────────
+    from app.core.metrics import MetricsMiddleware
+    app.add_middleware(MetricsMiddleware)
+
     # ── Routes ───────────────────────────────────────────────────────────
     app.include_router(api_v1_router, prefix=settings.API_PREFIX)
 
@@ -6,7 +6,17 @@ Tracks user actions, page views, conversions, and business metrics.
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Integer, Numeric, String, Text, Date
+from sqlalchemy import (
+    BigInteger,
+    Date,
+    DateTime,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -14,9 +24,35 @@ from app.core.database import Base
 
 
 class AnalyticsEvent(Base):
-    """Tracks user/system events for analytics."""
+    """
+    Tracks user/system events for analytics.
+
+    Range-partitioned by month of created_at on PostgreSQL (partitions are
+    managed by AnalyticsPartitionService); created_at is part of the
+    primary key because a partitioned table's keys must include it.
+    """
 
     __tablename__ = "analytics_events"
+    __table_args__ = (
+        # Event-type time series (visits per day, product page views);
+        # session_id included so unique-visitor counts are index-only
+        Index(
+            "ix_analytics_events_type_created_at",
+            "event_type",
+            "created_at",
+            postgresql_include=["session_id"],
+        ),
+        # Views / events per product (resource_id is the product id for
+        # resource_type 'product'); event_type included for index-only counts
+        Index(
+            "ix_analytics_events_resource_created_at",
+            "resource_type",
+            "resource_id",
+            "created_at",
+            postgresql_include=["event_type"],
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -42,9 +78,17 @@ class AnalyticsEvent(Base):
     user_agent: Mapped[str | None] = mapped_column(Text, nullable=True)
     ip_address: Mapped[str | None] = mapped_column(String(45), nullable=True)
 
+    # Derived at ingestion (EventEnrichmentService) for cheap breakdowns
+    # mobile, tablet, desktop or bot
+    device_type: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    browser: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    os: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    country: Mapped[str | None] = mapped_column(String(2), nullable=True)  # ISO 3166-1 alpha-2
+    city: Mapped[str | None] = mapped_column(String(100), nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
-        nullable=False, index=True,
+        primary_key=True, index=True,
     )
 
     def __repr__(self) -> str:
@@ -87,3 +131,79 @@ class DailyRevenue(Base):
 
     def __repr__(self) -> str:
         return f"<DailyRevenue {self.date}: ${self.total_revenue}>"
+
+
+class DailyProductSales(Base):
+    """
+    Paid sales per day, product and variant — the rollup sales reports read
+    instead of re-aggregating order_items ⋈ orders.
+
+    Kept current by SalesRollupService as orders move in and out of the paid
+    statuses, and reconciled nightly from the raw orders.
+    """
+
+    __tablename__ = "daily_product_sales"
+    __table_args__ = (
+        # One row per (date, product, variant); a product without variants
+        # has variant_id NULL, which must still be unique
+        UniqueConstraint(
+            "date", "product_id", "variant_id",
+            name="uq_daily_product_sales_key",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
+    date: Mapped[datetime] = mapped_column(Date, nullable=False, index=True)
+    product_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), nullable=True, index=True
+    )
+    variant_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    # Latest names seen on the order items (snapshot, like OrderItem)
+    product_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    variant_name: Mapped[str | None] = mapped_column(String(100), nullable=True)
+
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+    order_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Share sold in orders containing a cake (popular cake sizes)
+    cake_quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cake_revenue: Mapped[float] = mapped_column(Numeric(12, 2), nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<DailyProductSales {self.date} {self.product_name}: {self.quantity}>"
+
+
+class DailyEventStats(Base):
+    """
+    Daily analytics event counts, kept for months whose raw
+    analytics_events partitions have passed retention and been dropped.
+
+    resource_id is NULL on the per-event-type day totals; events about a
+    product (resource_type 'product') also get one row per product, for
+    product view reports.
+    """
+
+    __tablename__ = "daily_event_stats"
+    __table_args__ = (
+        UniqueConstraint(
+            "date", "event_type", "resource_id",
+            name="uq_daily_event_stats_key",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True
+    )
+    date: Mapped[datetime] = mapped_column(Date, nullable=False, index=True)
+    event_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    resource_id: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    events: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unique_sessions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<DailyEventStats {self.date} {self.event_type}: {self.events}>"
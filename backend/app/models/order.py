@@ -13,10 +13,12 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
     Text,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -47,10 +49,24 @@ class PaymentStatus(str, enum.Enum):
     PARTIALLY_REFUNDED = "partially_refunded"
 
 
+# Statuses that count as a sale (stored by enum name); analytics and
+# dashboard queries filter on these, so the partial indexes below cover them.
+_PAID_STATUS_SQL = "status IN ('PAID', 'CONFIRMED', 'COMPLETED')"
+
+
 class Order(Base):
     """Order model — represents a customer order."""
 
     __tablename__ = "orders"
+    __table_args__ = (
+        # Revenue / items-sold by paid_at range, best sellers by created_at
+        Index("ix_orders_paid_at_paid", "paid_at", postgresql_where=text(_PAID_STATUS_SQL)),
+        Index("ix_orders_created_at_paid", "created_at", postgresql_where=text(_PAID_STATUS_SQL)),
+        # Dashboard counts per status over a date range
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        # Customer history / order velocity (risk analysis)
+        Index("ix_orders_customer_created_at", "customer_id", "created_at"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
@@ -122,6 +138,15 @@ class OrderItem(Base):
     """Individual line item in an order."""
 
     __tablename__ = "order_items"
+    __table_args__ = (
+        # Order → items joins that aggregate quantity / revenue per product
+        Index(
+            "ix_order_items_order_product",
+            "order_id",
+            "product_id",
+            postgresql_include=["quantity", "line_total"],
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
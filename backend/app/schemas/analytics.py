@@ -13,12 +13,30 @@ from pydantic import BaseModel, Field
 class AnalyticsEventCreate(BaseModel):
     """Record an analytics event."""
     event_type: str = Field(..., max_length=100)
-    resource_type: str | None = None
-    resource_id: str | None = None
+    resource_type: str | None = Field(None, max_length=50)
+    resource_id: str | None = Field(None, max_length=255)
     properties: dict | None = {}
-    page_url: str | None = None
-    referrer: str | None = None
-    session_id: str | None = None
+    page_url: str | None = Field(None, max_length=500)
+    referrer: str | None = Field(None, max_length=500)
+    session_id: str | None = Field(None, max_length=255)
+
+
+# Client contract for the batch endpoint: queue events in memory, send them
+# when MAX_EVENTS_PER_BATCH are waiting or a few seconds have passed, and
+# flush on page hide (navigator.sendBeacon). Events are stamped with the time
+# the batch arrives.
+MAX_EVENTS_PER_BATCH = 100
+
+
+class AnalyticsEventBatch(BaseModel):
+    """Several analytics events sent in one request."""
+    events: list[AnalyticsEventCreate] = Field(
+        ..., min_length=1, max_length=MAX_EVENTS_PER_BATCH
+    )
+
+
+class AnalyticsEventBatchResponse(BaseModel):
+    accepted: int
 
 
 class AnalyticsEventResponse(BaseModel):
@@ -66,6 +84,12 @@ class BestSellerResponse(BaseModel):
     total_revenue: Decimal
 
 
+class SalesRankingsResponse(BaseModel):
+    """Best and worst sellers over the same period."""
+    best_sellers: list[BestSellerResponse]
+    worst_sellers: list[BestSellerResponse]
+
+
 class PopularVariantResponse(BaseModel):
     """Popular cake size / product variant."""
     variant_id: uuid.UUID
@@ -0,0 +1,309 @@
+"""
+Analytics ingestion — buffered, batched event writes.
+
+Tracking endpoints only validate events, stamp them and append them to a
+bounded per-worker buffer, then answer 202 (a batch is accepted or refused
+as a whole). A background drainer bulk-inserts the buffer in batches of up
+to ANALYTICS_INGEST_BATCH_SIZE (one multi-row INSERT and one transaction per
+batch) every FLUSH_INTERVAL, or as soon as a full batch is waiting.
+
+Before a batch is written, product page views are tagged with
+resource_type 'product' and the product id (resolved from the slug in
+page_url), so product reports can use an index instead of matching URLs,
+and every event gets its device / browser / OS / location columns (see
+event_enrichment_service). Written page views are also counted into the
+unique-visitor HyperLogLogs (see visitor_counter_service), product views
+under their resolved product id.
+
+Values longer than their column are cut to fit at build time. If a batch
+still fails with a DataError, it is split in halves until the offending
+rows are isolated, so a bad event costs only itself, never the events of
+other clients that share its batch.
+
+When the buffer is full, new events are refused and counted as dropped,
+and the endpoint answers 503 with Retry-After so clients back off.
+Accepted / dropped / inserted / failed counts and the buffer depth are
+exported with the Prometheus metrics.
+
+Events still buffered when a worker is killed are lost; analytics is
+best-effort by design (a clean shutdown flushes them).
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError
+
+from app.core.config import get_settings
+from app.core.database import async_session_factory
+from app.core.logging import get_logger
+from app.core.metrics import registry
+from app.core.security import decode_token
+from app.models.analytics import AnalyticsEvent
+from app.models.product import Product
+from app.services.event_enrichment_service import EventEnrichmentService
+from app.services.visitor_counter_service import VisitorCounter
+
+logger = get_logger("analytics_ingest")
+settings = get_settings()
+
+FLUSH_INTERVAL = 0.5
+RETRY_DELAY = 1.0
+TOKEN_CACHE_SIZE = 4096
+PRODUCT_CACHE_TTL = 300.0
+PRODUCT_CACHE_SIZE = 10000
+
+_buffer: deque[dict] = deque()
+_wakeup: asyncio.Event | None = None
+_drainer: asyncio.Task | None = None
+# token → (user_id, expires_at): a returning visitor's JWT is verified once
+_token_users: OrderedDict[str, tuple[uuid.UUID | None, float]] = OrderedDict()
+# product slug → (product_id or None, expires_at on the monotonic clock)
+_product_ids: dict[str, tuple[uuid.UUID | None, float]] = {}
+# column → max length, for the bounded string columns of analytics_events
+_LENGTHS = {
+    column.name: column.type.length
+    for column in AnalyticsEvent.__table__.columns
+    if getattr(column.type, "length", None)
+}
+
+
+def product_slug_from_url(page_url: str | None) -> str | None:
+    """Product slug of a /products/<slug> page URL (None for other pages)."""
+    if not page_url or "/products/" not in page_url:
+        return None
+    slug = page_url.rstrip("/").split("/products/")[-1].split("?")[0]
+    return slug or None
+
+
+class AnalyticsIngestService:
+    """Buffers analytics events and writes them in bulk."""
+
+    # ── Request side ─────────────────────────────────────────────────────
+    @staticmethod
+    def user_id_from_authorization(authorization: str | None) -> uuid.UUID | None:
+        """User id from an optional "Bearer <jwt>" header (None if absent or invalid)."""
+        if not authorization or not authorization[:7].lower() == "bearer ":
+            return None
+        token = authorization[7:].strip()
+        now = time.time()
+        cached = _token_users.get(token)
+        if cached is not None and cached[1] > now:
+            _token_users.move_to_end(token)
+            return cached[0]
+
+        payload = decode_token(token) or {}
+        try:
+            user_id = uuid.UUID(payload["sub"]) if payload.get("sub") else None
+        except ValueError:
+            user_id = None
+        # Invalid tokens are remembered briefly too, so they cost one decode
+        _token_users[token] = (user_id, float(payload.get("exp") or now + 60))
+        if len(_token_users) > TOKEN_CACHE_SIZE:
+            _token_users.popitem(last=False)
+        return user_id
+
+    @staticmethod
+    def build_row(
+        data,
+        user_id: uuid.UUID | None = None,
+        user_agent: str | None = None,
+        ip_address: str | None = None,
+        created_at: datetime | None = None,
+    ) -> dict:
+        """
+        An analytics_events row from a validated AnalyticsEventCreate, with
+        strings cut to their column's length.
+        """
+        row = {
+            "id": uuid.uuid4(),
+            "event_type": data.event_type,
+            "user_id": user_id,
+            "session_id": data.session_id,
+            "resource_type": data.resource_type,
+            "resource_id": data.resource_id,
+            "properties": data.properties or {},
+            "page_url": data.page_url,
+            "referrer": data.referrer,
+            "user_agent": user_agent,
+            "ip_address": ip_address,
+            # Filled in by the drainer (EventEnrichmentService)
+            "device_type": None,
+            "browser": None,
+            "os": None,
+            "country": None,
+            "city": None,
+            "created_at": created_at or datetime.now(timezone.utc),
+        }
+        for name, length in _LENGTHS.items():
+            value = row.get(name)
+            if isinstance(value, str) and len(value) > length:
+                row[name] = value[:length]
+        return row
+
+    @classmethod
+    def build_rows(
+        cls,
+        events,
+        user_id: uuid.UUID | None = None,
+        user_agent: str | None = None,
+        ip_address: str | None = None,
+    ) -> list[dict]:
+        """Rows for a batch of events, sharing one set of server-side fields."""
+        created_at = datetime.now(timezone.utc)
+        return [
+            cls.build_row(data, user_id, user_agent, ip_address, created_at)
+            for data in events
+        ]
+
+    @classmethod
+    def enqueue(cls, *rows: dict) -> bool:
+        """
+        Buffer rows for the drainer. All-or-nothing: returns False (and
+        counts them as dropped) when they do not fit.
+        """
+        if len(_buffer) + len(rows) > settings.ANALYTICS_INGEST_QUEUE_SIZE:
+            registry.inc("analytics_events_dropped_total", len(rows))
+            return False
+        _buffer.extend(rows)
+        registry.inc("analytics_events_accepted_total", len(rows))
+        registry.set_gauge("analytics_ingest_buffer_depth", len(_buffer))
+        if _wakeup is not None and len(_buffer) >= settings.ANALYTICS_INGEST_BATCH_SIZE:
+            _wakeup.set()
+        return True
+
+    # ── Drainer ──────────────────────────────────────────────────────────
+    @staticmethod
+    def _take_batch() -> list[dict]:
+        size = min(len(_buffer), settings.ANALYTICS_INGEST_BATCH_SIZE)
+        batch = [_buffer.popleft() for _ in range(size)]
+        registry.set_gauge("analytics_ingest_buffer_depth", len(_buffer))
+        return batch
+
+    @staticmethod
+    async def _resolve_products(db, batch: list[dict]) -> None:
+        """
+        Tag product page views with resource_type 'product' and the
+        product's id, looked up by the slug in their page_url.
+        """
+        now = time.monotonic()
+        pending: dict[str, list[dict]] = {}
+        for row in batch:
+            if row["event_type"] != "page_view" or row["resource_type"] is not None:
+                continue
+            slug = product_slug_from_url(row["page_url"])
+            if slug:
+                pending.setdefault(slug, []).append(row)
+
+        missing = [
+            slug for slug in pending
+            if slug not in _product_ids or _product_ids[slug][1] <= now
+        ]
+        if missing:
+            result = await db.execute(
+                select(Product.slug, Product.id).where(Product.slug.in_(missing))
+            )
+            found = dict(result.all())
+            for slug in missing:  # unknown slugs are cached too
+                _product_ids[slug] = (found.get(slug), now + PRODUCT_CACHE_TTL)
+            if len(_product_ids) > PRODUCT_CACHE_SIZE:
+                _product_ids.clear()
+
+        for slug, rows in pending.items():
+            product_id = _product_ids.get(slug, (None, 0))[0]
+            if product_id is None:
+                continue
+            for row in rows:
+                row["resource_type"] = "product"
+                row["resource_id"] = str(product_id)
+
+    @classmethod
+    async def _insert(cls, batch: list[dict]) -> None:
+        async with async_session_factory() as db:
+            await cls._resolve_products(db, batch)
+            EventEnrichmentService.enrich(batch)
+            await db.execute(insert(AnalyticsEvent.__table__).values(batch))
+            await db.commit()
+
+    @classmethod
+    async def _insert_isolating(cls, batch: list[dict]) -> list[dict]:
+        """
+        Insert `batch`, splitting it on DataError until the rows that cannot
+        be stored are isolated and dropped. Returns the rows written.
+        """
+        try:
+            await cls._insert(batch)
+            return batch
+        except DataError as e:
+            if len(batch) == 1:
+                registry.inc("analytics_events_failed_total")
+                logger.error("Dropping an analytics event: %s", str(e))
+                return []
+        middle = len(batch) // 2
+        return (
+            await cls._insert_isolating(batch[:middle])
+            + await cls._insert_isolating(batch[middle:])
+        )
+
+    @classmethod
+    async def flush(cls) -> int:
+        """Write everything currently buffered. Returns the number of events inserted."""
+        inserted = 0
+        while _buffer:
+            batch = cls._take_batch()
+            for attempt in (1, 2):
+                try:
+                    try:
+                        await cls._insert(batch)
+                        written = batch
+                    except DataError:
+                        written = await cls._insert_isolating(batch)
+                    inserted += len(written)
+                    registry.inc("analytics_events_inserted_total", len(written))
+                    await VisitorCounter.record(written)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if attempt == 2:
+                        registry.inc("analytics_events_failed_total", len(batch))
+                        logger.error("Dropping %d analytics events: %s", len(batch), str(e))
+                    else:
+                        await asyncio.sleep(RETRY_DELAY)
+        return inserted
+
+    @classmethod
+    async def _drain_forever(cls) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), FLUSH_INTERVAL)
+            except TimeoutError:
+                pass
+            _wakeup.clear()
+            await cls.flush()
+
+    @classmethod
+    def start(cls) -> None:
+        """Start this worker's drainer (called at app startup)."""
+        global _wakeup, _drainer
+        if _drainer is None or _drainer.done():
+            _wakeup = asyncio.Event()
+            _drainer = asyncio.create_task(cls._drain_forever())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Stop the drainer and flush what is left (called at app shutdown)."""
+        global _wakeup, _drainer
+        if _drainer is not None:
+            _drainer.cancel()
+            try:
+                await _drainer
+            except asyncio.CancelledError:
+                pass
+            _drainer = None
+        _wakeup = None
+        await cls.flush()
@@ -0,0 +1,161 @@
+"""
+Analytics partition service — monthly partitions of analytics_events.
+
+analytics_events is range-partitioned by created_at, one partition per UTC
+month (analytics_events_YYYY_MM), so date-bounded visitor queries only touch
+the months they cover. A daily Celery job creates the next
+ANALYTICS_PARTITIONS_AHEAD months in advance and retires months older than
+ANALYTICS_RETENTION_MONTHS: each is summarized into daily_event_stats, then
+detached and dropped in the same transaction, so reports see every day
+exactly once — raw or rolled up.
+
+Methods take a sync Connection (a Celery session's, or an async engine's
+through run_sync).
+"""
+
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import delete, text
+
+from app.core.config import get_settings
+from app.models.analytics import DailyEventStats
+
+settings = get_settings()
+
+PARENT = "analytics_events"
+_PARTITION_NAME = re.compile(rf"^{PARENT}_(\d{{4}})_(\d{{2}})$")
+
+# Day of an event in UTC, matching the partition bounds
+_EVENT_DATE = "CAST(created_at AT TIME ZONE 'UTC' AS DATE)"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+
+def partition_month(name: str) -> date | None:
+    """Month a partition covers, from its name (None for foreign tables)."""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+class AnalyticsPartitionService:
+    """Creates, summarizes and retires analytics_events partitions."""
+
+    @staticmethod
+    def is_partitioned(connection) -> bool:
+        if connection.dialect.name != "postgresql":
+            return False
+        return bool(connection.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass(:parent))"
+            ),
+            {"parent": PARENT},
+        ).scalar())
+
+    @staticmethod
+    def partition_months(connection) -> list[date]:
+        """Months that currently have an attached partition, oldest first."""
+        names = connection.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:parent)"
+            ),
+            {"parent": PARENT},
+        ).scalars()
+        return sorted(month for month in map(partition_month, names) if month)
+
+    @staticmethod
+    def retention_cutoff(today: date, retention_months: int) -> date | None:
+        """First month kept raw; earlier months are retired (None = keep all)."""
+        if retention_months <= 0:
+            return None
+        return add_months(month_start(today), -retention_months)
+
+    @classmethod
+    def ensure_partitions(
+        cls, connection, today: date | None = None, ahead: int | None = None
+    ) -> list[date]:
+        """Create partitions for this month and the next `ahead` months; returns those created."""
+        if not cls.is_partitioned(connection):
+            return []
+        today = today or datetime.now(timezone.utc).date()
+        ahead = settings.ANALYTICS_PARTITIONS_AHEAD if ahead is None else ahead
+        existing = set(cls.partition_months(connection))
+        created = []
+        for offset in range(ahead + 1):
+            month = add_months(month_start(today), offset)
+            if month in existing:
+                continue
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF {PARENT} FOR VALUES "
+                f"FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')"
+            ))
+            created.append(month)
+        return created
+
+    @staticmethod
+    def summarize_month(connection, month: date) -> int:
+        """(Re)build daily_event_stats for one month from its partition. Returns rows written."""
+        table = DailyEventStats.__table__
+        connection.execute(
+            delete(table).where(table.c.date >= month, table.c.date < add_months(month, 1))
+        )
+        partition = partition_name(month)
+        totals = connection.execute(text(f"""
+            INSERT INTO daily_event_stats (date, event_type, resource_id, events, unique_sessions)
+            SELECT {_EVENT_DATE}, event_type, NULL, count(*), count(DISTINCT session_id)
+            FROM {partition}
+            GROUP BY {_EVENT_DATE}, event_type
+        """))
+        products = connection.execute(text(f"""
+            INSERT INTO daily_event_stats (date, event_type, resource_id, events, unique_sessions)
+            SELECT {_EVENT_DATE}, event_type, resource_id, count(*), count(DISTINCT session_id)
+            FROM {partition}
+            WHERE resource_type = 'product' AND resource_id IS NOT NULL
+            GROUP BY {_EVENT_DATE}, event_type, resource_id
+        """))
+        return totals.rowcount + products.rowcount
+
+    @classmethod
+    def expire_partitions(
+        cls,
+        connection,
+        today: date | None = None,
+        retention_months: int | None = None,
+        drop: bool | None = None,
+    ) -> list[date]:
+        """
+        Summarize, detach and (unless `drop` is False) drop every partition
+        older than the retention. Returns the months retired.
+        """
+        retention_months = (
+            settings.ANALYTICS_RETENTION_MONTHS if retention_months is None else retention_months
+        )
+        drop = settings.ANALYTICS_DROP_EXPIRED_PARTITIONS if drop is None else drop
+        cutoff = cls.retention_cutoff(today or datetime.now(timezone.utc).date(), retention_months)
+        if cutoff is None or not cls.is_partitioned(connection):
+            return []
+
+        expired = [month for month in cls.partition_months(connection) if month < cutoff]
+        for month in expired:
+            cls.summarize_month(connection, month)
+            connection.execute(
+                text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition_name(month)}")
+            )
+            if drop:
+                connection.execute(text(f"DROP TABLE {partition_name(month)}"))
+        return expired
@@ -4,102 +4,160 @@ Revenue tracking, best sellers, inventory turnover, and dashboard data.
 """
 
 import uuid
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 
-from sqlalchemy import Date, case, cast, desc, func, select
+from sqlalchemy import Date, String, case, cast, desc, func, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.database import async_session_factory
 from app.core.logging import get_logger
-from app.models.analytics import AnalyticsEvent, DailyRevenue
+from app.models.analytics import AnalyticsEvent, DailyEventStats, DailyProductSales, DailyRevenue
 from app.models.order import Order, OrderItem, OrderStatus
 from app.models.product import Product, ProductVariant
 from app.models.user import User, UserRole
+from app.services.cache_service import CACHE_TTL, CacheService
+from app.services.sales_rollup_service import SalesRollupService
+from app.services.visitor_counter_service import VisitorCounter
 
 logger = get_logger("analytics_service")
 
 
+DASHBOARD_AMOUNTS = ("revenue_today", "revenue_this_week", "revenue_this_month")
+
+
+def _dashboard_from_cache(summary: dict) -> dict:
+    """Dashboard summary as read from the cache, with its amounts as Decimals."""
+    return {
+        name: Decimal(value) if name in DASHBOARD_AMOUNTS else value
+        for name, value in summary.items()
+    }
+
+
 class AnalyticsService:
     """Handles analytics queries and aggregations."""
 
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    # ── Event Tracking ───────────────────────────────────────────────────
-    async def record_event(
-        self,
-        event_type: str,
-        user_id: uuid.UUID | None = None,
-        session_id: str | None = None,
-        resource_type: str | None = None,
-        resource_id: str | None = None,
-        properties: dict | None = None,
-        page_url: str | None = None,
-        referrer: str | None = None,
-        user_agent: str | None = None,
-        ip_address: str | None = None,
-    ) -> AnalyticsEvent:
-        """Record an analytics event."""
-        event = AnalyticsEvent(
-            event_type=event_type,
-            user_id=user_id,
-            session_id=session_id,
-            resource_type=resource_type,
-            resource_id=resource_id,
-            properties=properties or {},
-            page_url=page_url,
-            referrer=referrer,
-            user_agent=user_agent,
-            ip_address=ip_address,
+    # ── Revenue Tracking ─────────────────────────────────────────────────
+    @staticmethod
+    def revenue_by_day_query(start_dt: datetime, end_dt: datetime):
+        """
+        Paid revenue, orders, items and cake orders per day of paid_at in
+        [start_dt, end_dt] — the aggregation behind DailyRevenue.
+        """
+        day = func.date(Order.paid_at, type_=Date)
+        items = (
+            select(
+                OrderItem.order_id,
+                func.sum(OrderItem.quantity).label("quantity"),
+            ).group_by(OrderItem.order_id).subquery()
         )
-        self.db.add(event)
-        await self.db.flush()
-        return event
+        return select(
+            day.label("date"),
+            func.coalesce(func.sum(Order.total), 0).label("total_revenue"),
+            func.count(Order.id).label("total_orders"),
+            func.coalesce(func.sum(items.c.quantity), 0).label("total_items_sold"),
+            func.sum(case((Order.has_cake.is_(True), 1), else_=0)).label("cake_orders"),
+        ).outerjoin(
+            items, items.c.order_id == Order.id
+        ).where(
+            Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
+            Order.paid_at >= start_dt,
+            Order.paid_at <= end_dt,
+        ).group_by(day)
+
+    @staticmethod
+    def category_revenue_by_day_query(start_dt: datetime, end_dt: datetime):
+        """Paid line-item revenue per day and product category (category_breakdown)."""
+        day = func.date(Order.paid_at, type_=Date)
+        return select(
+            day.label("date"),
+            Product.category,
+            func.sum(OrderItem.line_total).label("revenue"),
+        ).join(
+            Order, OrderItem.order_id == Order.id
+        ).join(
+            Product, OrderItem.product_id == Product.id
+        ).where(
+            Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
+            Order.paid_at >= start_dt,
+            Order.paid_at <= end_dt,
+        ).group_by(day, Product.category)
+
+    async def _revenue_days(self, start_date: date, end_date: date) -> dict[date, dict]:
+        """
+        Revenue per day for start_date..end_date. Closed days come from the
+        DailyRevenue rollup, which has a row for every day since the first
+        sale, so days before its first row had no sales. Today, and each run
+        of closed days the rollup is still missing, are aggregated live from
+        orders (one bounded query per run).
+        """
+        today = datetime.now(timezone.utc).date()
+        days: dict[date, dict] = {}
+        live_from = start_date
+
+        closed_end = min(end_date, today - timedelta(days=1))
+        if start_date <= closed_end:
+            rollup = await self.db.execute(
+                select(DailyRevenue).where(
+                    DailyRevenue.date >= start_date,
+                    DailyRevenue.date <= closed_end,
+                )
+            )
+            for row in rollup.scalars().all():
+                days[row.date] = {
+                    "total_revenue": Decimal(str(row.total_revenue)),
+                    "total_orders": row.total_orders,
+                    "total_items_sold": row.total_items_sold,
+                    "cake_orders": row.cake_orders,
+                }
+            if start_date not in days:
+                first_row = (await self.db.execute(select(func.min(DailyRevenue.date)))).scalar()
+                if first_row is not None and first_row > start_date:
+                    live_from = min(first_row, closed_end + timedelta(days=1))
+
+        last = min(end_date, today)
+        runs: list[list[date]] = []
+        for day in (live_from + timedelta(days=i) for i in range((last - live_from).days + 1)):
+            if day in days:
+                continue
+            if runs and runs[-1][-1] == day - timedelta(days=1):
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        for run in runs:
+            start_dt = datetime.combine(run[0], datetime.min.time()).replace(tzinfo=timezone.utc)
+            end_dt = datetime.combine(run[-1], datetime.max.time()).replace(tzinfo=timezone.utc)
+            result = await self.db.execute(self.revenue_by_day_query(start_dt, end_dt))
+            for row in result.all():
+                days[row.date] = {
+                    "total_revenue": Decimal(str(row.total_revenue)),
+                    "total_orders": row.total_orders,
+                    "total_items_sold": row.total_items_sold,
+                    "cake_orders": row.cake_orders or 0,
+                }
+        return days
 
-    # ── Revenue Tracking ─────────────────────────────────────────────────
     async def get_revenue_summary(
         self,
         start_date: date,
         end_date: date,
     ) -> dict:
         """Get revenue summary for a date range."""
-        start_dt = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=timezone.utc)
-        end_dt = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=timezone.utc)
-
-        result = await self.db.execute(
-            select(
-                func.coalesce(func.sum(Order.total), 0).label("total_revenue"),
-                func.count(Order.id).label("total_orders"),
-                func.coalesce(func.avg(Order.total), 0).label("average_order_value"),
-                func.sum(case((Order.has_cake == True, 1), else_=0)).label("cake_orders"),
-            ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.paid_at >= start_dt,
-                Order.paid_at <= end_dt,
-            )
-        )
-        row = result.one()
-
-        # Total items sold
-        items_result = await self.db.execute(
-            select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(
-                OrderItem.order_id.in_(
-                    select(Order.id).where(
-                        Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                        Order.paid_at >= start_dt,
-                        Order.paid_at <= end_dt,
-                    )
-                )
-            )
-        )
-        total_items = items_result.scalar() or 0
+        days = (await self._revenue_days(start_date, end_date)).values()
+        total_revenue = sum((d["total_revenue"] for d in days), Decimal("0"))
+        total_orders = sum(d["total_orders"] for d in days)
 
         return {
-            "total_revenue": Decimal(str(row.total_revenue)),
-            "total_orders": row.total_orders,
-            "total_items_sold": total_items,
-            "cake_orders": row.cake_orders or 0,
-            "average_order_value": Decimal(str(row.average_order_value)).quantize(Decimal("0.01")),
+            "total_revenue": total_revenue,
+            "total_orders": total_orders,
+            "total_items_sold": sum(d["total_items_sold"] for d in days),
+            "cake_orders": sum(d["cake_orders"] for d in days),
+            "average_order_value": (
+                total_revenue / total_orders if total_orders else Decimal("0")
+            ).quantize(Decimal("0.01")),
             "period_start": start_date,
             "period_end": end_date,
         }
@@ -110,176 +168,125 @@ class AnalyticsService:
         end_date: date,
     ) -> list[dict]:
         """Get daily revenue breakdown for charting."""
-        start_dt = datetime.combine(start_date, datetime.min.time()).replace(tzinfo=timezone.utc)
-        end_dt = datetime.combine(end_date, datetime.max.time()).replace(tzinfo=timezone.utc)
-
-        result = await self.db.execute(
-            select(
-                cast(Order.paid_at, Date).label("date"),
-                func.coalesce(func.sum(Order.total), 0).label("total_revenue"),
-                func.count(Order.id).label("total_orders"),
-                func.sum(case((Order.has_cake == True, 1), else_=0)).label("cake_orders"),
-            ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.paid_at >= start_dt,
-                Order.paid_at <= end_dt,
-            ).group_by(
-                cast(Order.paid_at, Date)
-            ).order_by(
-                cast(Order.paid_at, Date)
-            )
-        )
-
+        days = await self._revenue_days(start_date, end_date)
         return [
             {
-                "date": row.date,
-                "total_revenue": Decimal(str(row.total_revenue)),
-                "total_orders": row.total_orders,
-                "cake_orders": row.cake_orders or 0,
+                "date": day,
+                "total_revenue": data["total_revenue"],
+                "total_orders": data["total_orders"],
+                "cake_orders": data["cake_orders"],
             }
-            for row in result.all()
+            for day, data in sorted(days.items())
+            if data["total_orders"]
         ]
 
     # ── Best / Worst Sellers ─────────────────────────────────────────────
-    async def get_best_sellers(self, days: int = 30, limit: int = 10) -> list[dict]:
-        """Get best-selling products by quantity in the last N days."""
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-
+    async def _rank_sales(
+        self,
+        days: int,
+        limit: int,
+        by_variant: bool = False,
+        cakes_only: bool = False,
+    ) -> tuple[list[dict], list[dict]]:
+        """
+        Sum the daily_product_sales rollup over the last N days per product
+        (or per variant) and return the top and bottom `limit` by quantity,
+        ranked with window functions in one query.
+        """
+        sales = DailyProductSales
+        quantity = func.sum(sales.cake_quantity if cakes_only else sales.quantity)
+        revenue = func.sum(sales.cake_revenue if cakes_only else sales.revenue)
+
+        if by_variant:
+            keys = (sales.variant_id,)
+            name = func.max(sales.product_name)
+            columns = (
+                func.max(sales.variant_name).label("variant_name"),
+                name.label("product_name"),
+            )
+        else:
+            keys = (sales.product_id, Product.name, Product.category)
+            name = Product.name
+            columns = (Product.name.label("product_name"), Product.category)
+        query = select(
+            keys[0],
+            *columns,
+            quantity.label("total_quantity_sold"),
+            revenue.label("total_revenue"),
+            func.row_number().over(order_by=(quantity.desc(), name)).label("top_rank"),
+            func.row_number().over(order_by=(quantity.asc(), name)).label("bottom_rank"),
+        ).where(
+            sales.date >= SalesRollupService.first_day(days),
+        ).group_by(*keys).having(quantity > 0)
+
+        if by_variant:
+            query = query.where(sales.variant_id.isnot(None))
+        else:
+            query = query.join(Product, sales.product_id == Product.id)
+
+        ranked = query.subquery()
         result = await self.db.execute(
-            select(
-                OrderItem.product_id,
-                OrderItem.product_name,
-                func.sum(OrderItem.quantity).label("total_quantity_sold"),
-                func.sum(OrderItem.line_total).label("total_revenue"),
-            ).join(
-                Order, OrderItem.order_id == Order.id
-            ).join(
-                Product, OrderItem.product_id == Product.id
-            ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.created_at >= since,
-                OrderItem.product_id.isnot(None),
-            ).group_by(
-                OrderItem.product_id, OrderItem.product_name
-            ).order_by(
-                desc("total_quantity_sold")
-            ).limit(limit)
+            select(ranked).where(
+                (ranked.c.top_rank <= limit) | (ranked.c.bottom_rank <= limit)
+            )
         )
+        rows = result.all()
+
+        def _item(row) -> dict:
+            if by_variant:
+                item = {
+                    "variant_id": row.variant_id,
+                    "variant_name": row.variant_name,
+                    "product_name": row.product_name,
+                }
+            else:
+                item = {
+                    "product_id": row.product_id,
+                    "product_name": row.product_name,
+                    "category": row.category.value
+                    if hasattr(row.category, "value") else str(row.category),
+                }
+            item["total_quantity_sold"] = row.total_quantity_sold
+            item["total_revenue"] = Decimal(str(row.total_revenue))
+            return item
 
-        items = []
-        for row in result.all():
-            # Skip if product_id is explicitly None (sanity check)
-            if not row.product_id:
-                continue
+        top = sorted((r for r in rows if r.top_rank <= limit), key=lambda r: r.top_rank)
+        bottom = sorted((r for r in rows if r.bottom_rank <= limit), key=lambda r: r.bottom_rank)
+        return [_item(r) for r in top], [_item(r) for r in bottom]
 
-            # Get product category
-            prod = await self.db.execute(select(Product.category).where(Product.id == row.product_id))
-            cat = prod.scalar() or "other"
+    async def get_sales_rankings(self, days: int = 30, limit: int = 10) -> dict:
+        """Best and worst sellers from a single aggregation."""
+        best, worst = await self._rank_sales(days, limit)
+        return {"best_sellers": best, "worst_sellers": worst}
 
-            items.append({
-                "product_id": row.product_id,
-                "product_name": row.product_name,
-                "category": cat.value if hasattr(cat, "value") else str(cat),
-                "total_quantity_sold": row.total_quantity_sold,
-                "total_revenue": Decimal(str(row.total_revenue)),
-            })
-        return items
+    async def get_best_sellers(self, days: int = 30, limit: int = 10) -> list[dict]:
+        """Get best-selling products by quantity in the last N days."""
+        best, _ = await self._rank_sales(days, limit)
+        return best
 
     async def get_worst_sellers(self, days: int = 30, limit: int = 10) -> list[dict]:
         """Get worst-selling products (lowest quantity sold)."""
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-
-        result = await self.db.execute(
-            select(
-                OrderItem.product_id,
-                OrderItem.product_name,
-                func.sum(OrderItem.quantity).label("total_quantity_sold"),
-                func.sum(OrderItem.line_total).label("total_revenue"),
-            ).join(
-                Order, OrderItem.order_id == Order.id
-            ).join(
-                Product, OrderItem.product_id == Product.id
-            ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.created_at >= since,
-                OrderItem.product_id.isnot(None),
-            ).group_by(
-                OrderItem.product_id, OrderItem.product_name
-            ).order_by(
-                "total_quantity_sold"  # ascending = worst sellers first
-            ).limit(limit)
-        )
-
-        items = []
-        for row in result.all():
-            if not row.product_id:
-                continue
-
-            prod = await self.db.execute(select(Product.category).where(Product.id == row.product_id))
-            cat = prod.scalar() or "other"
-            items.append({
-                "product_id": row.product_id,
-                "product_name": row.product_name,
-                "category": cat.value if hasattr(cat, "value") else str(cat),
-                "total_quantity_sold": row.total_quantity_sold,
-                "total_revenue": Decimal(str(row.total_revenue)),
-            })
-        return items
+        _, worst = await self._rank_sales(days, limit)
+        return worst
 
     # ── Popular Cake Sizes ───────────────────────────────────────────────
     async def get_popular_cake_sizes(self, days: int = 30, limit: int = 10) -> list[dict]:
         """Track most popular cake sizes/variants."""
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-
-        result = await self.db.execute(
-            select(
-                OrderItem.variant_id,
-                OrderItem.variant_name,
-                OrderItem.product_name,
-                func.sum(OrderItem.quantity).label("total_quantity_sold"),
-                func.sum(OrderItem.line_total).label("total_revenue"),
-            ).join(
-                Order, OrderItem.order_id == Order.id
-            ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.has_cake == True,
-                Order.created_at >= since,
-                OrderItem.variant_id.isnot(None),
-            ).group_by(
-                OrderItem.variant_id, OrderItem.variant_name, OrderItem.product_name
-            ).order_by(
-                desc("total_quantity_sold")
-            ).limit(limit)
-        )
-
-        return [
-            {
-                "variant_id": row.variant_id,
-                "variant_name": row.variant_name,
-                "product_name": row.product_name,
-                "total_quantity_sold": row.total_quantity_sold,
-                "total_revenue": Decimal(str(row.total_revenue)),
-            }
-            for row in result.all()
-        ]
+        top, _ = await self._rank_sales(days, limit, by_variant=True, cakes_only=True)
+        return top
 
     # ── Inventory Turnover ───────────────────────────────────────────────
     async def get_inventory_turnover(self, days: int = 30) -> list[dict]:
         """Calculate inventory turnover rate per variant."""
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-
-        # Get sales per variant in last N days
+        # Get sales per variant in last N days (from the daily rollup)
         sales = await self.db.execute(
             select(
-                OrderItem.variant_id,
-                func.sum(OrderItem.quantity).label("total_sold"),
-            ).join(
-                Order, OrderItem.order_id == Order.id
+                DailyProductSales.variant_id,
+                func.sum(DailyProductSales.quantity).label("total_sold"),
             ).where(
-                Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]),
-                Order.created_at >= since,
-                OrderItem.variant_id.isnot(None),
-            ).group_by(OrderItem.variant_id)
+                DailyProductSales.date >= SalesRollupService.first_day(days),
+                DailyProductSales.variant_id.isnot(None),
+            ).group_by(DailyProductSales.variant_id)
         )
         sales_map = {row.variant_id: row.total_sold for row in sales.all()}
 
@@ -324,59 +331,102 @@ class AnalyticsService:
 
     # ── Dashboard Summary ────────────────────────────────────────────────
     async def get_dashboard_summary(self) -> dict:
-        """Get admin dashboard summary metrics."""
+        """
+        Get admin dashboard summary metrics.
+        Cached for CACHE_TTL["dashboard"]; order writes invalidate it.
+        """
+        return await CacheService.get_or_set(
+            CacheService._make_key("dashboard"),
+            self._load_dashboard_summary,
+            ttl=CACHE_TTL["dashboard"],
+            tags=("dashboard",),
+            loader=_dashboard_from_cache,
+        )
+
+    @classmethod
+    async def _load_dashboard_summary(cls) -> dict:
+        """
+        Cache factory for the dashboard summary (JSON-ready: amounts as
+        strings). Uses its own session because it may run as a coalesced or
+        background refresh outside the request that triggered it.
+        """
+        async with async_session_factory() as db:
+            summary = await cls(db)._compute_dashboard_summary()
+        return {
+            name: str(value) if name in DASHBOARD_AMOUNTS else value
+            for name, value in summary.items()
+        }
+
+    async def _compute_dashboard_summary(self) -> dict:
+        """All dashboard metrics in one round trip (FILTER aggregates over orders)."""
         now = datetime.now(timezone.utc)
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         week_start = today_start - timedelta(days=now.weekday())
         month_start = today_start.replace(day=1)
+        # The week can start in the previous month
+        window_start = min(week_start, month_start)
 
-        paid_statuses = [OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]
+        paid = Order.status.in_([OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED])
+        open_statuses = [OrderStatus.PENDING, OrderStatus.PENDING_APPROVAL, OrderStatus.PREPARING]
 
-        async def _revenue_since(since: datetime) -> Decimal:
-            r = await self.db.execute(
-                select(func.coalesce(func.sum(Order.total), 0)).where(
-                    Order.status.in_(paid_statuses), Order.paid_at >= since
-                )
+        def _revenue_since(since: datetime):
+            return func.coalesce(
+                func.sum(Order.total).filter(paid, Order.paid_at >= since), 0
             )
-            return Decimal(str(r.scalar() or 0))
-
-        async def _count_orders(status=None, since=None) -> int:
-            q = select(func.count(Order.id))
-            if status:
-                q = q.where(Order.status == status)
-            if since:
-                q = q.where(Order.created_at >= since)
-            r = await self.db.execute(q)
-            return r.scalar() or 0
-
-        # Low stock count
-        low_stock = await self.db.execute(
-            select(func.count(ProductVariant.id)).where(
+
+        low_stock = (
+            select(func.count(ProductVariant.id))
+            .where(
                 ProductVariant.stock_quantity <= ProductVariant.low_stock_threshold,
                 ProductVariant.is_active == True,
             )
+            .scalar_subquery()
+        )
+        customers = (
+            select(func.count(User.id))
+            .where(User.role == UserRole.CUSTOMER)
+            .scalar_subquery()
         )
 
-        # Total customers
-        customers = await self.db.execute(
-            select(func.count(User.id)).where(User.role == UserRole.CUSTOMER)
+        result = await self.db.execute(
+            select(
+                _revenue_since(today_start).label("revenue_today"),
+                _revenue_since(week_start).label("revenue_this_week"),
+                _revenue_since(month_start).label("revenue_this_month"),
+                func.count().filter(Order.created_at >= today_start).label("orders_today"),
+                func.count().filter(Order.status == OrderStatus.PENDING).label("orders_pending"),
+                func.count()
+                .filter(Order.status == OrderStatus.PENDING_APPROVAL)
+                .label("orders_pending_approval"),
+                func.count()
+                .filter(Order.status == OrderStatus.PREPARING)
+                .label("orders_preparing"),
+                func.count()
+                .filter(Order.has_cake.is_(True), Order.created_at >= today_start)
+                .label("cake_orders_today"),
+                low_stock.label("low_stock_count"),
+                customers.label("total_customers"),
+            ).where(
+                # Only rows some metric can count, so the status / created_at /
+                # partial paid_at indexes bound the scan instead of all orders
+                (Order.status.in_(open_statuses))
+                | (Order.created_at >= window_start)
+                | (paid & (Order.paid_at >= window_start))
+            )
         )
+        row = result.one()
 
         return {
-            "revenue_today": await _revenue_since(today_start),
-            "revenue_this_week": await _revenue_since(week_start),
-            "revenue_this_month": await _revenue_since(month_start),
-            "orders_today": await _count_orders(since=today_start),
-            "orders_pending": await _count_orders(status=OrderStatus.PENDING),
-            "orders_pending_approval": await _count_orders(status=OrderStatus.PENDING_APPROVAL),
-            "orders_preparing": await _count_orders(status=OrderStatus.PREPARING),
-            "cake_orders_today": (await self.db.execute(
-                select(func.count(Order.id)).where(
-                    Order.has_cake == True, Order.created_at >= today_start
-                )
-            )).scalar() or 0,
-            "low_stock_count": low_stock.scalar() or 0,
-            "total_customers": customers.scalar() or 0,
+            "revenue_today": Decimal(str(row.revenue_today)),
+            "revenue_this_week": Decimal(str(row.revenue_this_week)),
+            "revenue_this_month": Decimal(str(row.revenue_this_month)),
+            "orders_today": row.orders_today,
+            "orders_pending": row.orders_pending,
+            "orders_pending_approval": row.orders_pending_approval,
+            "orders_preparing": row.orders_preparing,
+            "cake_orders_today": row.cake_orders_today,
+            "low_stock_count": row.low_stock_count or 0,
+            "total_customers": row.total_customers or 0,
         }
 
     async def get_weekly_order_status_mix(self) -> dict:
@@ -422,87 +472,189 @@ class AnalyticsService:
         }
 
     # ── Visitor Analytics ────────────────────────────────────────────────
-    async def get_visitor_analytics(self, days: int = 30) -> dict:
-        """Get visitor analytics (visits over time, by location)."""
-        since = datetime.now(timezone.utc) - timedelta(days=days)
-
-        # Daily visits
+    async def get_visitor_analytics(self, days: int = 30, exact: bool = False) -> dict:
+        """
+        Get visitor analytics (visits over time, by location).
+
+        Unique visitors come from the Redis HyperLogLogs for every day they
+        cover (approximate, constant time); `exact` forces COUNT(DISTINCT)
+        over the raw events instead.
+        """
+        now = datetime.now(timezone.utc)
+        since = now - timedelta(days=days)
+
+        sketched_from = None if exact else await VisitorCounter.tracked_since()
+        sketched = {}
+        unique_visitors = None
+        if sketched_from is not None and sketched_from <= now.date():
+            first = max(sketched_from, since.date())
+            try:
+                sketched = await VisitorCounter.daily(first, now.date())
+                if sketched_from <= since.date():  # whole period sketched
+                    unique_visitors = await VisitorCounter.unique(first, now.date())
+            except Exception as e:
+                logger.warning("Unique visitor sketches unavailable: %s", str(e))
+                sketched_from = None
+        else:
+            sketched_from = None
+
+        # Sessions are only counted in SQL for days without a sketch
+        sessions = AnalyticsEvent.session_id
+        if sketched_from is not None:
+            sketch_start = datetime.combine(sketched_from, time.min, tzinfo=timezone.utc)
+            sessions = case((AnalyticsEvent.created_at < sketch_start, sessions))
+
+        # Daily visits: raw events, plus the daily_event_stats rollup for
+        # months whose partitions have been retired (the two never overlap)
+        day = cast(AnalyticsEvent.created_at, Date)
+        raw = select(
+            day.label("date"),
+            func.count(AnalyticsEvent.id).label("visits"),
+            func.count(func.distinct(sessions)).label("unique_visitors"),
+        ).where(
+            AnalyticsEvent.created_at >= since,
+            AnalyticsEvent.event_type == "page_view"
+        ).group_by(day)
+        rolled_up = select(
+            DailyEventStats.date,
+            DailyEventStats.events,
+            DailyEventStats.unique_sessions,
+        ).where(
+            DailyEventStats.date >= since.date(),
+            DailyEventStats.event_type == "page_view",
+            DailyEventStats.resource_id.is_(None),
+        )
+        visits = union_all(raw, rolled_up).subquery()
         daily = await self.db.execute(
             select(
-                cast(AnalyticsEvent.created_at, Date).label("date"),
-                func.count(AnalyticsEvent.id).label("visits"),
-                func.count(func.distinct(AnalyticsEvent.session_id)).label("unique_visitors"),
-            ).where(
-                AnalyticsEvent.created_at >= since,
-                AnalyticsEvent.event_type == "page_view"
-            ).group_by(
-                cast(AnalyticsEvent.created_at, Date)
-            ).order_by(
-                cast(AnalyticsEvent.created_at, Date)
-            )
+                visits.c.date,
+                func.sum(visits.c.visits).label("visits"),
+                func.sum(visits.c.unique_visitors).label("unique_visitors"),
+            ).group_by(visits.c.date).order_by(visits.c.date)
         )
         
         visits_over_time = [
-            {"date": row.date, "visits": row.visits, "unique_visitors": row.unique_visitors}
+            {
+                "date": row.date,
+                "visits": row.visits,
+                "unique_visitors": sketched.get(row.date, row.unique_visitors),
+            }
             for row in daily.all()
         ]
 
-        # By Location (Simulated by IP for now as we don't have geoip setup)
-        # In a real app, we'd enrichment IP to City/Country
-        # Here we just return empty or dummy data if no IP enrichment
-        locations = []
-        
-        # By Device
-        devices = await self.db.execute(
-             select(
-                AnalyticsEvent.user_agent, 
-                func.count(AnalyticsEvent.id)
+        if exact:
+            unique_visitors = (await self.db.execute(
+                select(func.count(func.distinct(AnalyticsEvent.session_id))).where(
+                    AnalyticsEvent.created_at >= since,
+                    AnalyticsEvent.event_type == "page_view",
+                )
+            )).scalar()
+
+        # Device / browser / OS / country breakdowns of page views in one
+        # pass over the enriched columns (GROUPING SETS, one set per column)
+        dimensions = {
+            "device": AnalyticsEvent.device_type,
+            "browser": AnalyticsEvent.browser,
+            "os": AnalyticsEvent.os,
+            "location": AnalyticsEvent.country,
+        }
+        breakdowns = await self.db.execute(
+            select(
+                *(column.label(name) for name, column in dimensions.items()),
+                *(
+                    func.grouping(column).label(f"{name}_grouping")
+                    for name, column in dimensions.items()
+                ),
+                func.count().label("visits"),
             ).where(
-                AnalyticsEvent.created_at >= since
-            ).group_by(AnalyticsEvent.user_agent).limit(10)
+                AnalyticsEvent.created_at >= since,
+                AnalyticsEvent.event_type == "page_view",
+            ).group_by(func.grouping_sets(*dimensions.values()))
         )
-        # Simplified parser
-        device_stats = [] # Placeholder
+        breakdown = {name: [] for name in dimensions}
+        for row in breakdowns.all():
+            name = next(name for name in dimensions if getattr(row, f"{name}_grouping") == 0)
+            breakdown[name].append({name: getattr(row, name) or "unknown", "visits": row.visits})
+        for entries in breakdown.values():
+            entries.sort(key=lambda entry: entry["visits"], reverse=True)
 
         return {
             "visits_over_time": visits_over_time,
-            "top_locations": locations,
-            "device_breakdown": device_stats
+            # Over the whole period (approximate unless exact; without
+            # sketches and not exact, unknown)
+            "unique_visitors": unique_visitors,
+            "unique_visitors_approximate": not exact and unique_visitors is not None,
+            "top_locations": breakdown["location"][:10],
+            "device_breakdown": breakdown["device"],
+            "browser_breakdown": breakdown["browser"][:10],
+            "os_breakdown": breakdown["os"][:10],
         }
 
     async def get_product_page_views(self, days: int = 30, limit: int = 10) -> list[dict]:
         """Get most visited product pages from tracked page_view events."""
         since = datetime.now(timezone.utc) - timedelta(days=days)
 
+        # Product page views are resolved to resource_type 'product' at
+        # ingestion, so this is an index-only scan of
+        # ix_analytics_events_resource_created_at
+        raw = select(
+            AnalyticsEvent.resource_id,
+            func.count().label("visits"),
+        ).where(
+            AnalyticsEvent.resource_type == "product",
+            AnalyticsEvent.resource_id.is_not(None),
+            AnalyticsEvent.created_at >= since,
+            AnalyticsEvent.event_type == "page_view",
+        ).group_by(AnalyticsEvent.resource_id)
+        # Months retired from analytics_events live on in daily_event_stats
+        rolled_up = select(
+            DailyEventStats.resource_id,
+            DailyEventStats.events,
+        ).where(
+            DailyEventStats.date >= since.date(),
+            DailyEventStats.event_type == "page_view",
+            DailyEventStats.resource_id.is_not(None),
+        )
+        views = union_all(raw, rolled_up).subquery()
+        top = select(
+            views.c.resource_id,
+            func.sum(views.c.visits).label("visits"),
+        ).group_by(
+            views.c.resource_id
+        ).order_by(
+            desc("visits")
+        ).limit(limit).subquery()
         result = await self.db.execute(
-            select(
-                AnalyticsEvent.page_url,
-                func.count(AnalyticsEvent.id).label("visits"),
-            ).where(
-                AnalyticsEvent.created_at >= since,
-                AnalyticsEvent.event_type == "page_view",
-                AnalyticsEvent.page_url.is_not(None),
-                AnalyticsEvent.page_url.ilike("%/products/%"),
-            ).group_by(
-                AnalyticsEvent.page_url
-            ).order_by(
-                desc("visits")
-            ).limit(limit)
+            select(top.c.resource_id, top.c.visits, Product.slug, Product.name)
+            .join(Product, cast(Product.id, String) == top.c.resource_id)
+            .order_by(top.c.visits.desc())
         )
 
-        rows = []
-        for row in result.all():
-            page_url = row.page_url or ""
-            slug = page_url.rstrip("/").split("/products/")[-1].split("?")[0]
-            if not slug:
-                continue
-            rows.append(
-                {
-                    "product_slug": slug,
-                    "page_url": page_url,
-                    "visits": row.visits or 0,
-                }
-            )
+        rows = [
+            {
+                "product_id": row.resource_id,
+                "product_slug": row.slug,
+                "product_name": row.name,
+                "page_url": f"/products/{row.slug}",
+                "visits": row.visits or 0,
+                "unique_visitors": None,
+            }
+            for row in result.all()
+        ]
+
+        # Approximate unique visitors per product page, where sketched
+        sketched_from = await VisitorCounter.tracked_since(products=True)
+        if rows and sketched_from is not None and sketched_from <= since.date():
+            try:
+                uniques = await VisitorCounter.unique_by_product(
+                    since.date(), datetime.now(timezone.utc).date(),
+                    [row["product_id"] for row in rows],
+                )
+            except Exception as e:
+                logger.warning("Unique visitor sketches unavailable: %s", str(e))
+            else:
+                for row in rows:
+                    row["unique_visitors"] = uniques[row["product_id"]]
 
         return rows
 
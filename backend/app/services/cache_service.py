@@ -1,17 +1,42 @@
 """
 Caching service — Phase 10.
 Redis-based caching for products, homepage data, and query results.
+
+Reads go through two tiers: a small in-process LRU in each API worker, then
+Redis. Invalidations are applied locally and broadcast over Redis pub/sub so
+every worker drops its copy at the same time.
+
+Tag invalidation deletes the keys recorded in each tag's set and advances
+the tag's generation counter. `get_or_set` entries are stamped with the
+generations they were computed under, so an entry whose tag set was evicted
+(Redis runs allkeys-lru) is still treated as a miss once its tag moves on.
 """
 
+import asyncio
+import copy
+import gzip
 import json
 import hashlib
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
 from functools import wraps
 from typing import Any
 
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.core.config import get_settings
 from app.core.logging import get_logger
+from app.core.rate_limiter import sliding_window_hit
 from app.core.redis import get_redis
+from app.models.order import Order
 
 logger = get_logger("cache_service")
+settings = get_settings()
 
 # Cache TTLs (seconds)
 CACHE_TTL = {
@@ -22,8 +47,244 @@ CACHE_TTL = {
     "category_products": 300,  # 5 min
     "ai_query": 3600,          # 1 hour
     "dashboard": 60,           # 1 min
+    "catalog_snapshot": 86400, # 1 day — rebuilt on every product write
 }
 
+# How long an expired entry may still be served while it is refreshed in the
+# background (see CacheService.get_or_set)
+CACHE_STALE_TTL = {
+    "product_list": 60,
+    "product_detail": 120,
+}
+
+INVALIDATION_CHANNEL = "ks:cache:invalidate"
+TAG_PREFIX = "ks:cache:tag:"
+# Per-tag generation counters, advanced by every invalidate_tags
+TAG_GENERATION_PREFIX = "ks:cache:taggen:"
+VERSION_PREFIX = "ks:cache:version:"
+
+# Stampede protection (see CacheService.get_or_set)
+LOCK_TIMEOUT_MS = 5000
+LOCK_POLL_INTERVAL = 0.05
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Identifies this worker's own broadcasts so the listener can skip them.
+_WORKER_ID = uuid.uuid4().hex
+
+# Session.info key holding invalidations deferred until commit (see CacheService.on_commit)
+_ON_COMMIT_KEY = "ks_cache_on_commit"
+
+
+class _LocalCache:
+    """
+    Size-bounded, per-worker LRU with a per-entry expiry and tag index.
+
+    Values are copied in and out, so callers can never mutate a cached
+    value in place (immutable values such as CachedResponse are shared).
+    Every invalidation advances `epoch`; a write made with `since=` an
+    epoch taken before its value was read or computed is dropped when the
+    key, one of its tags or a matching prefix was invalidated after that.
+    """
+
+    def __init__(self, max_entries: int, max_ttl: int):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: OrderedDict[str, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[str]] = {}
+        self.epoch = 0
+        # "key:…" / "tag:…" → epoch of its last invalidation (bounded LRU)
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._prefixes: dict[str, int] = {}
+        # Newest epoch no longer tracked per key (pruned, or a clear())
+        self._forgotten = 0
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: float,
+        tags: tuple[str, ...] = (),
+        since: int | None = None,
+    ) -> None:
+        ttl = min(ttl, self.max_ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        if since is not None and self._invalidated_since(key, tags, since):
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(value), tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _invalidated_since(self, key: str, tags: tuple[str, ...], since: int) -> bool:
+        if since < self._forgotten:
+            return True
+        names = [f"key:{key}", *(f"tag:{tag}" for tag in tags)]
+        if any(self._invalidated.get(name, 0) > since for name in names):
+            return True
+        return any(
+            epoch > since and key.startswith(prefix) for prefix, epoch in self._prefixes.items()
+        )
+
+    def _mark(self, name: str) -> None:
+        self.epoch += 1
+        self._invalidated[name] = self.epoch
+        self._invalidated.move_to_end(name)
+        while len(self._invalidated) > self.max_entries * 4:
+            _, epoch = self._invalidated.popitem(last=False)
+            self._forgotten = max(self._forgotten, epoch)
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            members = self._tags.get(tag)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._tags[tag]
+
+    def delete(self, key: str) -> None:
+        self._mark(f"key:{key}")
+        self._remove(key)
+
+    def delete_tags(self, tags) -> int:
+        removed = 0
+        for tag in tags:
+            self._mark(f"tag:{tag}")
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def delete_prefix(self, prefix: str) -> int:
+        self.epoch += 1
+        self._prefixes[prefix] = self.epoch
+        stale = [k for k in self._entries if k.startswith(prefix)]
+        for key in stale:
+            self._remove(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        self.epoch += 1
+        self._forgotten = self.epoch
+        self._invalidated.clear()
+        self._prefixes.clear()
+        self._entries.clear()
+        self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_local = _LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_TTL_SECONDS)
+_listener_task: asyncio.Task | None = None
+_inflight: dict[str, asyncio.Future] = {}
+_refreshing: set[str] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _envelope_loader(loader):
+    """Lift a value loader to the get_or_set envelope format."""
+    if loader is None:
+        return None
+
+    def _load(envelope):
+        if isinstance(envelope, dict) and "v" in envelope:
+            return {**envelope, "v": loader(envelope["v"])}
+        return envelope
+
+    return _load
+
+
+def _tags_of(value: Any) -> tuple[str, ...]:
+    """Tags a `put` entry was stamped with (none for other values)."""
+    if isinstance(value, dict) and "g" in value:
+        return tuple(value["t"])
+    return ()
+
+
+def _is_current(value: Any, generations: dict[str, int] | None) -> bool:
+    """Whether no tag of a stamped entry was invalidated after it was computed."""
+    tags = _tags_of(value)
+    if not tags:
+        return True
+    if generations is None:
+        return False
+    return [generations[tag] for tag in tags] == value["g"]
+
+
+class CachedResponse:
+    """
+    A JSON response body cached as final bytes.
+
+    Redis holds the JSON text and its ETag; each worker keeps the encoded
+    bytes (and a gzipped copy for large bodies) in memory, so a cache hit is
+    sent as-is — no Pydantic validation, json.loads or re-encoding.
+    """
+
+    __slots__ = ("body", "etag", "gzipped", "last_modified")
+
+    GZIP_MIN_SIZE = 500  # matches the app's GZipMiddleware threshold
+
+    def __init__(self, body: bytes, etag: str, last_modified: str | None = None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.gzipped = (
+            gzip.compress(body, compresslevel=6) if len(body) >= self.GZIP_MIN_SIZE else None
+        )
+
+    def __deepcopy__(self, memo):
+        return self  # never mutated, so worker memory can share it
+
+    @staticmethod
+    def payload(content: Any, last_modified: str | None = None) -> dict:
+        """Serialize `content` once into the form stored in Redis."""
+        text = json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=str)
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()[:20]
+        payload = {"body": text, "etag": f'"{digest}"'}
+        if last_modified:
+            payload["last_modified"] = last_modified
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: dict | None) -> "CachedResponse | None":
+        if payload is None:  # cached "not found"
+            return None
+        return cls(payload["body"].encode("utf-8"), payload["etag"], payload.get("last_modified"))
+
+    def to_response(self, request, etag: str | None = None) -> Response:
+        """Build the HTTP response, pre-gzipped when the client accepts it."""
+        headers = {"ETag": etag or self.etag, "Vary": "Accept-Encoding"}
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        body = self.body
+        if self.gzipped is not None and "gzip" in request.headers.get("accept-encoding", ""):
+            body = self.gzipped
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
 
 class CacheService:
     """Redis-based caching with automatic invalidation."""
@@ -36,49 +297,182 @@ class CacheService:
         return f"ks:cache:{raw}"
 
     @staticmethod
-    async def get(key: str) -> Any | None:
-        """Get a cached value."""
+    async def get(key: str, loader=None) -> Any | None:
+        """
+        Get a cached value (worker memory first, then Redis).
+
+        `loader` converts the JSON-decoded value into the form kept in worker
+        memory (e.g. pre-encoded bytes), so that conversion runs once per
+        worker rather than on every hit.
+        """
+        value = _local.get(key)
+        if value is not None:
+            return value
+
         redis = await get_redis()
         if not redis:
             return None
+        since = _local.epoch
         try:
-            data = await redis.get(key)
+            pipe = redis.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            data, pttl = await pipe.execute()
             if data:
-                return json.loads(data)
+                value = json.loads(data)
+                generations = await CacheService._current_generations([value])
+                if not _is_current(value, generations):
+                    return None
+                if loader is not None:
+                    value = loader(value)
+                if pttl and pttl > 0:
+                    _local.set(key, value, pttl / 1000, _tags_of(value), since=since)
+                return value
             return None
         except Exception as e:
             logger.warning("Cache get failed for %s: %s", key, str(e))
             return None
 
     @staticmethod
-    async def set(key: str, value: Any, ttl: int = 300) -> bool:
-        """Set a cached value with TTL."""
+    async def get_many(keys: list[str], loader=None) -> list[Any | None]:
+        """
+        Get several cached values at once, aligned with `keys` (None = miss).
+        Whatever worker memory lacks is fetched with a single MGET round trip.
+        """
+        values = [_local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        redis = await get_redis()
+        if not redis:
+            return values
+        since = _local.epoch
+        try:
+            pipe = redis.pipeline(transaction=False)
+            pipe.mget([keys[i] for i in missing])
+            for i in missing:
+                pipe.pttl(keys[i])
+            found, *pttls = await pipe.execute()
+            decoded = {i: json.loads(data) for i, data in zip(missing, found) if data}
+            generations = await CacheService._current_generations(list(decoded.values()))
+            for i, pttl in zip(missing, pttls):
+                value = decoded.get(i)
+                if value is None or not _is_current(value, generations):
+                    continue
+                if loader is not None:
+                    value = loader(value)
+                if pttl and pttl > 0:
+                    _local.set(keys[i], value, pttl / 1000, _tags_of(value), since=since)
+                values[i] = value
+        except Exception as e:
+            logger.warning("Cache multi-get failed for %d keys: %s", len(missing), str(e))
+        return values
+
+    @staticmethod
+    async def set(
+        key: str,
+        value: Any,
+        ttl: int = 300,
+        tags: tuple[str, ...] = (),
+        local_value: Any = None,
+        broadcast: bool = False,
+        since: int | None = None,
+    ) -> bool:
+        """
+        Set a cached value with TTL.
+
+        `tags` register the key for group invalidation via `invalidate_tags`,
+        e.g. ("products", "category:cake"). `local_value` is what worker
+        memory keeps instead of `value` (see `get(loader=...)`). Set
+        `broadcast` when replacing a value in place so other workers drop
+        their copies. `since` is the local cache epoch from before `value`
+        was computed (defaults to now); worker memory skips the value if it
+        was invalidated after that.
+        """
         redis = await get_redis()
         if not redis:
             return False
+        if since is None:
+            since = _local.epoch
+        tags = tuple(tags)
         try:
-            await redis.setex(key, ttl, json.dumps(value, default=str))
+            pipe = redis.pipeline(transaction=False)
+            pipe.setex(key, ttl, json.dumps(value, default=str))
+            for tag in tags:
+                tag_key = f"{TAG_PREFIX}{tag}"
+                pipe.sadd(tag_key, key)
+                # The tag set must outlive every member: set a TTL if it has
+                # none, otherwise only ever extend it.
+                pipe.expire(tag_key, ttl, nx=True)
+                pipe.expire(tag_key, ttl, gt=True)
+            await pipe.execute()
+            _local.set(
+                key, value if local_value is None else local_value, ttl, tags, since=since
+            )
+            if broadcast:
+                await CacheService._broadcast(keys=[key])
             return True
         except Exception as e:
             logger.warning("Cache set failed for %s: %s", key, str(e))
             return False
 
-    @staticmethod
-    async def delete(key: str) -> bool:
+    @classmethod
+    async def delete(cls, key: str) -> bool:
         """Delete a cached value."""
+        _local.delete(key)
         redis = await get_redis()
         if not redis:
             return False
         try:
             await redis.delete(key)
+            await cls._broadcast(keys=[key])
             return True
         except Exception as e:
             logger.warning("Cache delete failed for %s: %s", key, str(e))
             return False
 
-    @staticmethod
-    async def delete_pattern(pattern: str) -> int:
-        """Delete all keys matching a pattern."""
+    @classmethod
+    async def invalidate_tags(cls, *tags: str) -> int:
+        """
+        Delete every key registered under any of `tags`.
+        Cost is proportional to the number of tagged keys, not the keyspace.
+        """
+        if not tags:
+            return 0
+        _local.delete_tags(tags)
+        redis = await get_redis()
+        if not redis:
+            return 0
+        try:
+            tag_keys = [f"{TAG_PREFIX}{tag}" for tag in tags]
+            pipe = redis.pipeline(transaction=False)
+            # Generations first: a value computed before this point and
+            # stored after the members are read is caught by `put`
+            for tag in tags:
+                pipe.incr(f"{TAG_GENERATION_PREFIX}{tag}")
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = (await pipe.execute())[len(tags):]
+            keys = set().union(*members)
+            await redis.delete(*keys, *tag_keys)
+            # Copies read back from Redis are kept in worker memory untagged
+            for key in keys:
+                _local.delete(key)
+            await cls._broadcast(keys=sorted(keys), tags=list(tags))
+            logger.info("Invalidated %d cache keys for tags: %s", len(keys), ", ".join(tags))
+            return len(keys)
+        except Exception as e:
+            logger.warning("Cache tag invalidation failed for %s: %s", tags, str(e))
+            return 0
+
+    @classmethod
+    async def delete_pattern(cls, pattern: str) -> int:
+        """
+        Delete all keys matching a pattern.
+        Walks the whole keyspace with SCAN — prefer `invalidate_tags` on hot paths.
+        """
+        _local.delete_prefix(f"ks:cache:{pattern}")
         redis = await get_redis()
         if not redis:
             return 0
@@ -88,46 +482,432 @@ class CacheService:
                 keys.append(key)
             if keys:
                 await redis.delete(*keys)
+            await cls._broadcast(prefixes=[f"ks:cache:{pattern}"])
             logger.info("Invalidated %d cache keys matching: %s", len(keys), pattern)
             return len(keys)
         except Exception as e:
             logger.warning("Cache pattern delete failed: %s", str(e))
             return 0
 
+    @staticmethod
+    async def _tag_generations(tags: tuple[str, ...]) -> list[int] | None:
+        """
+        Current generation of each tag (None if Redis is unavailable).
+        Missing counters start at the current time in ms, as versions do, so
+        a lost counter never repeats a generation a value was stamped with.
+        """
+        if not tags:
+            return []
+        try:
+            redis = await get_redis()
+            keys = [f"{TAG_GENERATION_PREFIX}{tag}" for tag in tags]
+            pipe = redis.pipeline(transaction=False)
+            pipe.mget(keys)
+            (values,) = await pipe.execute()
+            if None in values:
+                start = int(time.time() * 1000)
+                for key, value in zip(keys, values):
+                    if value is None:
+                        await redis.set(key, start, nx=True)
+                pipe = redis.pipeline(transaction=False)
+                pipe.mget(keys)
+                (values,) = await pipe.execute()
+            return [int(value) for value in values]
+        except Exception as e:
+            logger.warning("Cache tag generation read failed for %s: %s", tags, str(e))
+            return None
+
+    @classmethod
+    async def _current_generations(cls, values: list) -> dict[str, int] | None:
+        """Current generation of every tag the stamped `values` were stored under."""
+        tags = tuple(sorted({tag for value in values for tag in _tags_of(value)}))
+        if not tags:
+            return {}
+        generations = await cls._tag_generations(tags)
+        return None if generations is None else dict(zip(tags, generations))
+
+    # ── Content versions (for ETags) ─────────────────────────────────────
+    @staticmethod
+    async def get_version(name: str) -> int:
+        """
+        Current generation of a content namespace (e.g. "catalog").
+        Missing counters start at the current time in ms so a lost key can
+        never hand out a version a client has already seen.
+        """
+        key = f"{VERSION_PREFIX}{name}"
+        version = _local.get(key)
+        if version is not None:
+            return version
+        since = _local.epoch
+        try:
+            redis = await get_redis()
+            version = await redis.get(key)
+            if version is None:
+                await redis.set(key, int(time.time() * 1000), nx=True)
+                version = await redis.get(key)
+            version = int(version)
+            _local.set(key, version, _local.max_ttl, since=since)
+            return version
+        except Exception as e:
+            logger.warning("Cache version read failed for %s: %s", name, str(e))
+            return 0
+
+    @classmethod
+    async def bump_version(cls, name: str) -> None:
+        """Advance a namespace generation; every ETag derived from it changes."""
+        key = f"{VERSION_PREFIX}{name}"
+        _local.delete(key)
+        try:
+            redis = await get_redis()
+            if not await redis.exists(key):
+                await redis.set(key, int(time.time() * 1000), nx=True)
+            await redis.incr(key)
+            await cls._broadcast(keys=[key])
+        except Exception as e:
+            logger.warning("Cache version bump failed for %s: %s", name, str(e))
+
+    # ── Cross-worker invalidation ────────────────────────────────────────
+    @staticmethod
+    async def _broadcast(
+        keys: list[str] | None = None,
+        prefixes: list[str] | None = None,
+        tags: list[str] | None = None,
+    ) -> None:
+        """Tell the other workers to drop local copies of these keys/prefixes/tags."""
+        redis = await get_redis()
+        message = json.dumps({
+            "origin": _WORKER_ID,
+            "keys": keys or [],
+            "prefixes": prefixes or [],
+            "tags": tags or [],
+        })
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, message)
+        except Exception as e:
+            logger.warning("Cache invalidation broadcast failed: %s", str(e))
+
+    @staticmethod
+    def _apply_invalidation(message: dict) -> None:
+        """Apply an invalidation received from another worker."""
+        if message.get("origin") == _WORKER_ID:
+            return
+        for key in message.get("keys", []):
+            _local.delete(key)
+        for prefix in message.get("prefixes", []):
+            _local.delete_prefix(prefix)
+        _local.delete_tags(message.get("tags", []))
+
+    @classmethod
+    async def _listen_for_invalidations(cls) -> None:
+        """Subscribe to the invalidation channel, reconnecting on failure."""
+        backoff = 1.0
+        while True:
+            pubsub = None
+            try:
+                redis = await get_redis()
+                pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached while we were disconnected may have been
+                # invalidated elsewhere — start from a clean slate.
+                _local.clear()
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        cls._apply_invalidation(json.loads(message["data"]))
+                    except (TypeError, ValueError):
+                        logger.warning("Ignoring malformed cache invalidation message")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation listener error: %s — retrying", str(e))
+                _local.clear()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    @classmethod
+    def start_invalidation_listener(cls) -> None:
+        """Start the per-worker pub/sub listener (called at app startup)."""
+        global _listener_task
+        if _listener_task is None or _listener_task.done():
+            _listener_task = asyncio.create_task(cls._listen_for_invalidations())
+
+    @staticmethod
+    async def stop_invalidation_listener() -> None:
+        """Stop the pub/sub listener (called at app shutdown)."""
+        global _listener_task
+        if _listener_task is not None:
+            _listener_task.cancel()
+            try:
+                await _listener_task
+            except asyncio.CancelledError:
+                pass
+            _listener_task = None
+        _local.clear()
+
     # ── Convenience Methods ──────────────────────────────────────────────
     @classmethod
-    async def get_or_set(cls, key: str, factory, ttl: int = 300):
-        """Get from cache or compute and cache the result."""
-        cached = await cls.get(key)
-        if cached is not None:
-            return cached
+    async def get_or_set(
+        cls,
+        key: str,
+        factory,
+        ttl: int = 300,
+        *,
+        tags: tuple[str, ...] = (),
+        stale_ttl: int = 0,
+        early_beta: float = 0.0,
+        loader=None,
+    ):
+        """
+        Get from cache or compute and cache the result.
+
+        Concurrent misses for the same key are coalesced into one `factory()`
+        call — per worker through a shared future, across workers through a
+        short Redis lock. With `stale_ttl`, a value older than `ttl` keeps
+        being served for up to `stale_ttl` more seconds while one caller
+        refreshes it in the background. `early_beta` > 0 enables probabilistic
+        early refresh (XFetch) so hot keys are usually renewed before expiry.
+
+        `factory` may run after the request has finished, so it must not
+        depend on request-scoped resources such as the `get_db` session.
+        A value whose tags are invalidated while `factory` runs is returned
+        but not kept. `loader` is applied to the cached value as in `get`.
+        """
+        envelope = await cls.get(key, loader=_envelope_loader(loader))
+        if isinstance(envelope, dict) and "e" in envelope:
+            now = time.time()
+            due = now >= envelope["e"]
+            if not due and early_beta > 0:
+                # XFetch: the closer to expiry and the slower the factory,
+                # the more likely a reader volunteers to refresh early.
+                jitter = -envelope.get("d", 0) * early_beta * math.log(random.random() or 1e-12)
+                due = now + jitter >= envelope["e"]
+            if due:
+                cls._refresh_in_background(key, factory, ttl, tags, stale_ttl, loader)
+            return envelope["v"]
+
+        return await cls._compute_coalesced(key, factory, ttl, tags, stale_ttl, loader)
+
+    @classmethod
+    async def _compute_coalesced(cls, key, factory, ttl, tags, stale_ttl, loader=None):
+        """Run `factory` at most once per worker for concurrent misses on `key`."""
+        pending = _inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            value = await cls._compute_locked(key, factory, ttl, tags, stale_ttl, loader)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise; make sure the exception is marked retrieved.
+            future.exception()
+            raise
+        finally:
+            _inflight.pop(key, None)
+
+    @classmethod
+    async def _compute_locked(
+        cls, key, factory, ttl, tags, stale_ttl, loader=None, wait: bool = True
+    ):
+        """
+        Compute and store a value while holding the cross-worker lock.
+        Workers that lose the race wait for the winner's value instead of
+        hitting the database; if it never shows up they compute it themselves.
+        """
+        lock_key = f"ks:lock:{key}"
+        token = uuid.uuid4().hex
+        redis = None
+        locked = False
+        try:
+            redis = await get_redis()
+            locked = bool(await redis.set(lock_key, token, nx=True, px=LOCK_TIMEOUT_MS))
+        except Exception as e:
+            # Redis unavailable — fall back to computing without coordination
+            logger.warning("Cache lock failed for %s: %s", key, str(e))
+            redis = None
+
+        if redis is not None and not locked:
+            if not wait:
+                return None
+            deadline = time.monotonic() + LOCK_TIMEOUT_MS / 1000
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                envelope = await cls.get(key, loader=_envelope_loader(loader))
+                if isinstance(envelope, dict) and "e" in envelope:
+                    return envelope["v"]
+
+        try:
+            since = _local.epoch
+            generations = await cls._tag_generations(tuple(tags))
+            started = time.monotonic()
+            value = await factory()
+            return await cls.put(
+                key, value, ttl, tags=tags, stale_ttl=stale_ttl, loader=loader,
+                duration=time.monotonic() - started, generations=generations, since=since,
+            )
+        finally:
+            if locked:
+                try:
+                    await redis.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception:
+                    pass  # the lock expires on its own
+
+    @classmethod
+    async def put(
+        cls,
+        key: str,
+        value: Any,
+        ttl: int = 300,
+        *,
+        tags: tuple[str, ...] = (),
+        stale_ttl: int = 0,
+        loader=None,
+        duration: float = 0.0,
+        broadcast: bool = False,
+        generations: list[int] | None = None,
+        since: int | None = None,
+    ):
+        """
+        Store a value in the `get_or_set` format, for callers that compute
+        entries themselves (in bulk, or ahead of reads). Returns the value
+        after `loader`.
+
+        `generations` are the tags' generations read before the value was
+        computed (read now if not given). If any tag was invalidated since,
+        the value may predate that write, so it is dropped again right after
+        being stored. The entry is stamped with them as well: reads from
+        Redis ignore it once a tag has moved on, even if the tag set that
+        should have led `invalidate_tags` to it was evicted.
+        """
+        tags = tuple(tags)
+        if generations is None and tags:
+            generations = await cls._tag_generations(tags)
+        envelope = {"v": value, "e": time.time() + ttl, "d": duration}
+        if tags and generations is not None:
+            envelope.update(t=list(tags), g=generations)
+        local_envelope = None
+        if loader is not None:
+            value = loader(value)
+            local_envelope = {**envelope, "v": value}
+        stored = await cls.set(
+            key, envelope, ttl + stale_ttl, tags,
+            local_value=local_envelope, broadcast=broadcast, since=since,
+        )
+        if stored and generations is not None and tags:
+            if await cls._tag_generations(tuple(tags)) != generations:
+                _local.delete(key)
+                try:
+                    await (await get_redis()).delete(key)
+                except Exception as e:
+                    logger.warning("Cache delete failed for %s: %s", key, str(e))
+                logger.info("Discarded %s: its tags were invalidated while computing", key)
+        return value
+
+    @staticmethod
+    def unwrap(envelope: Any) -> Any | None:
+        """Value of a `get_or_set` entry read through `get`/`get_many` (None if absent)."""
+        if isinstance(envelope, dict) and "e" in envelope:
+            return envelope["v"]
+        return None
+
+    @staticmethod
+    def envelope_loader(loader):
+        """Adapt a `get_or_set` loader for reading its entries with `get`/`get_many`."""
+        return _envelope_loader(loader)
+
+    @staticmethod
+    def on_commit(session, key: str, factory, replace: bool = True) -> None:
+        """
+        Run the coroutine `factory()` once `session` commits; dropped on rollback.
+        Calls with the same `key` in one transaction collapse into one, so a
+        write path can register its invalidation without double-firing (the
+        last registration wins unless `replace` is False).
+        """
+        pending = session.info.setdefault(_ON_COMMIT_KEY, {})
+        if replace or key not in pending:
+            pending[key] = factory
+
+    @staticmethod
+    def _spawn(coro) -> None:
+        task = asyncio.create_task(coro)
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    @classmethod
+    def _refresh_in_background(cls, key, factory, ttl, tags, stale_ttl, loader=None) -> None:
+        """Refresh a stale key without blocking the caller (one refresher per key)."""
+        if key in _inflight or key in _refreshing:
+            return
+        _refreshing.add(key)
+
+        async def _refresh():
+            try:
+                await cls._compute_locked(key, factory, ttl, tags, stale_ttl, loader, wait=False)
+            except Exception as e:
+                logger.warning("Background cache refresh failed for %s: %s", key, str(e))
+            finally:
+                _refreshing.discard(key)
 
-        result = await factory()
-        await cls.set(key, result, ttl)
-        return result
+        cls._spawn(_refresh())
 
     # ── Product-specific ─────────────────────────────────────────────────
     @classmethod
-    async def invalidate_product(cls, product_id: str = None):
-        """Invalidate all product-related caches."""
-        await cls.delete_pattern("product")
-        await cls.delete_pattern("homepage")
-        await cls.delete_pattern("category")
+    def invalidate_product_on_commit(cls, session, product_id) -> None:
+        """Invalidate a product's caches after `session` commits (see `on_commit`)."""
+        cls.on_commit(
+            session,
+            f"product:{product_id}",
+            lambda: cls.invalidate_product(str(product_id)),
+        )
+
+    @staticmethod
+    def product_tags(product_id: str | None = None, category: str | None = None) -> tuple[str, ...]:
+        """Tags for a cached entry that depends on product data."""
+        tags = ["products"]
+        if category:
+            tags.append(f"category:{category}")
         if product_id:
-            await cls.delete(cls._make_key("product_detail", product_id))
+            tags.append(f"product:{product_id}")
+        return tuple(tags)
+
+    @classmethod
+    async def invalidate_product(cls, product_id: str = None, categories: list[str] | None = None):
+        """Invalidate all product-related caches (lists, homepage, category and detail)."""
+        tags = ["products"]
+        tags += [f"category:{c}" for c in categories or []]
+        if product_id:
+            tags.append(f"product:{product_id}")
+        await cls.invalidate_tags(*tags)
+        # Bump after dropping the entries so a new ETag never labels old content
+        await cls.bump_version("catalog")
         logger.info("Product caches invalidated")
 
+    @classmethod
+    def invalidate_order_on_commit(cls, session) -> None:
+        """Invalidate order-derived caches once `session` commits."""
+        cls.on_commit(session, "orders", cls.invalidate_order)
+
     @classmethod
     async def invalidate_order(cls):
         """Invalidate order-related caches (dashboard, analytics)."""
-        await cls.delete_pattern("dashboard")
-        await cls.delete_pattern("analytics")
+        await cls.invalidate_tags("dashboard", "analytics")
         logger.info("Order caches invalidated")
 
 
 # ── Rate Limiter (enhanced from Phase 2) ─────────────────────────────────────
 class RateLimiter:
-    """Token bucket rate limiter for public endpoints."""
+    """Sliding-window rate limiter for public endpoints (see app.core.rate_limiter)."""
 
     @staticmethod
     async def check(
@@ -138,22 +918,52 @@ class RateLimiter:
         """
         Check rate limit. Returns (allowed, remaining).
         """
-        redis = await get_redis()
-        if not redis:
-            return True, limit  # Allow if Redis unavailable
-
-        full_key = f"ks:ratelimit:{key}"
         try:
-            current = await redis.incr(full_key)
-            if current == 1:
-                await redis.expire(full_key, window)
-
-            remaining = max(0, limit - current)
-            return current <= limit, remaining
+            result = await sliding_window_hit(f"ks:rl:{key}", limit, window)
+            return result.allowed, result.remaining
         except Exception:
-            return True, limit
+            return True, limit  # Allow if Redis unavailable
 
     @staticmethod
     async def check_ai_endpoint(ip: str) -> tuple[bool, int]:
         """Rate limit for AI queries — stricter (10/min)."""
         return await RateLimiter.check(f"ai:{ip}", limit=10, window=60)
+
+
+# ── Deferred invalidation hooks ──────────────────────────────────────────────
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session) -> None:
+    pending = session.info.pop(_ON_COMMIT_KEY, None)
+    if not pending:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Sync (e.g. Celery) sessions have no loop to schedule on
+        logger.warning("Skipping %d cache invalidations outside an event loop", len(pending))
+        return
+    for factory in pending.values():
+        CacheService._spawn(factory())
+
+
+@event.listens_for(Session, "after_flush")
+def _track_order_writes(session: Session, flush_context) -> None:
+    # Orders change status in many places (checkout, webhooks, admin, Telegram);
+    # any flushed Order write drops the dashboard / analytics caches on commit.
+    if session.info.get(_ON_COMMIT_KEY, {}).get("orders"):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Order):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return  # sync (Celery) session — the dashboard TTL covers it
+            CacheService.invalidate_order_on_commit(session)
+            return
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_on_rollback(session: Session, transaction) -> None:
+    # Runs after after_commit, so anything left here belonged to a rollback
+    if transaction.parent is None:
+        session.info.pop(_ON_COMMIT_KEY, None)
@@ -0,0 +1,224 @@
+"""
+Catalog service — precomputed storefront catalog snapshots.
+
+Builds one denormalized document per category, plus "featured" and "popular"
+views, from Product and ProductVariant. Each document is stored as final JSON
+bytes (see CachedResponse) and versioned by its content hash, which doubles
+as the ETag, so storefront browsing is served from Redis / worker memory
+without SQL.
+
+ProductService writes call `refresh_for_product` after commit, which rebuilds
+only the documents the product appears in (its old and new category, and
+featured/popular when it is listed there) and swaps them in place. Variant
+stock also changes outside ProductService (order checkout reserves it,
+cancellation restores it), so any flushed stock change schedules the same
+refresh — and the product's cache invalidation — for its product.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import desc, event, func, inspect, select
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.database import async_session_factory
+from app.core.logging import get_logger
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product, ProductCategory, ProductVariant
+from app.schemas.product import ProductListResponse
+from app.services.cache_service import CACHE_TTL, CachedResponse, CacheService
+
+logger = get_logger("catalog_service")
+
+POPULAR_DAYS = 30
+POPULAR_LIMIT = 12
+POPULAR_STATUSES = [OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]
+
+
+class CatalogService:
+    """Materializes and serves the storefront catalog snapshots."""
+
+    FEATURED = "featured"
+    POPULAR = "popular"
+
+    @staticmethod
+    def category_document(category: ProductCategory | str) -> str:
+        value = category.value if isinstance(category, ProductCategory) else category
+        return f"category:{value}"
+
+    @classmethod
+    def document_names(cls) -> list[str]:
+        return [cls.category_document(c) for c in ProductCategory] + [cls.FEATURED, cls.POPULAR]
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return CacheService._make_key("catalog", name)
+
+    @staticmethod
+    def _ids_key(name: str) -> str:
+        return CacheService._make_key("catalog_ids", name)
+
+    @classmethod
+    def _ttl(cls, name: str) -> int:
+        # Sales move without product writes, so "popular" also ages out.
+        if name == cls.POPULAR:
+            return CACHE_TTL["homepage_popular"]
+        return CACHE_TTL["catalog_snapshot"]
+
+    # ── Reads ────────────────────────────────────────────────────────────
+    @classmethod
+    async def get_document(cls, name: str) -> CachedResponse:
+        """Snapshot bytes for `name`; built on first use if missing."""
+        ttl = cls._ttl(name)
+        return await CacheService.get_or_set(
+            cls._key(name),
+            lambda: cls._build(name),
+            ttl=ttl,
+            stale_ttl=ttl,
+            loader=CachedResponse.from_payload,
+        )
+
+    # ── Builds ───────────────────────────────────────────────────────────
+    @classmethod
+    async def rebuild(cls, *names: str) -> None:
+        """Rebuild documents and swap them in for every worker."""
+        for name in names:
+            ttl = cls._ttl(name)
+            payload = await cls._build(name)
+            await CacheService.put(
+                cls._key(name),
+                payload,
+                ttl,
+                stale_ttl=ttl,
+                loader=CachedResponse.from_payload,
+                broadcast=True,
+            )
+        if names:
+            logger.info("Catalog snapshots rebuilt: %s", ", ".join(names))
+
+    @classmethod
+    async def rebuild_all(cls) -> None:
+        await cls.rebuild(*cls.document_names())
+
+    @classmethod
+    async def refresh_for_product(cls, product_id: uuid.UUID, categories=()) -> None:
+        """
+        Rebuild the snapshots a write to one product can affect.
+        `categories` lists categories the product was in before the write
+        (a deleted or re-categorized product is no longer found under them).
+        """
+        names = {cls.category_document(c) for c in categories}
+        async with async_session_factory() as db:
+            row = (
+                await db.execute(
+                    select(Product.category, Product.is_featured).where(Product.id == product_id)
+                )
+            ).one_or_none()
+        if row is not None:
+            names.add(cls.category_document(row.category))
+            if row.is_featured:
+                names.add(cls.FEATURED)
+        for name in (cls.FEATURED, cls.POPULAR):
+            if name not in names and await cls._lists_product(name, product_id):
+                names.add(name)
+        try:
+            await cls.rebuild(*sorted(names))
+        except Exception as e:
+            logger.error("Catalog rebuild failed for product %s: %s", product_id, str(e))
+
+    @classmethod
+    async def _lists_product(cls, name: str, product_id: uuid.UUID) -> bool:
+        ids = await CacheService.get(cls._ids_key(name))
+        return bool(ids) and str(product_id) in ids
+
+    @classmethod
+    async def _build(cls, name: str) -> dict:
+        """Query and serialize one document (the only place SQL runs)."""
+        async with async_session_factory() as db:
+            if name == cls.POPULAR:
+                products = await cls._popular_products(db)
+            else:
+                query = (
+                    select(Product)
+                    .options(selectinload(Product.variants))
+                    .where(Product.is_active.is_(True))
+                    .order_by(Product.sort_order, Product.created_at.desc())
+                )
+                if name == cls.FEATURED:
+                    query = query.where(Product.is_featured.is_(True))
+                elif name.startswith("category:"):
+                    query = query.where(Product.category == ProductCategory(name.split(":", 1)[1]))
+                else:
+                    raise ValueError(f"Unknown catalog document: {name}")
+                products = list((await db.execute(query)).scalars().all())
+
+        # Imported here: product_service triggers catalog refreshes on write
+        from app.services.product_service import ProductService
+
+        for product in products:
+            ProductService._normalize_variant_stock(product)
+        ids = [str(p.id) for p in products]
+        await CacheService.set(cls._ids_key(name), ids, cls._ttl(name) * 2)
+        return CachedResponse.payload(
+            [ProductListResponse.model_validate(p).model_dump(mode="json") for p in products]
+        )
+
+    @staticmethod
+    async def _popular_products(db) -> list[Product]:
+        """Active best sellers by quantity over the last POPULAR_DAYS."""
+        since = datetime.now(timezone.utc) - timedelta(days=POPULAR_DAYS)
+        ranked = await db.execute(
+            select(OrderItem.product_id)
+            .join(Order, OrderItem.order_id == Order.id)
+            .where(
+                Order.status.in_(POPULAR_STATUSES),
+                Order.created_at >= since,
+                OrderItem.product_id.isnot(None),
+            )
+            .group_by(OrderItem.product_id)
+            .order_by(desc(func.sum(OrderItem.quantity)))
+            .limit(POPULAR_LIMIT * 2)  # headroom for inactive products
+        )
+        ids = [row.product_id for row in ranked.all()]
+        if not ids:
+            return []
+        result = await db.execute(
+            select(Product)
+            .options(selectinload(Product.variants))
+            .where(Product.id.in_(ids), Product.is_active.is_(True))
+        )
+        by_id = {p.id: p for p in result.scalars().all()}
+        return [by_id[i] for i in ids if i in by_id][:POPULAR_LIMIT]
+
+
+def _stock_changed(obj) -> bool:
+    attrs = inspect(obj).attrs
+    return attrs.stock_quantity.history.has_changes() or attrs.is_in_stock.history.has_changes()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_stock_writes(session: Session, flush_context) -> None:
+    # Snapshots and product detail responses embed variant stock; orders
+    # reserve and restore it without going through ProductService, so drop the
+    # product's cached detail and refresh its documents on commit.
+    product_ids = {
+        obj.product_id
+        for obj in session.dirty
+        if isinstance(obj, ProductVariant) and _stock_changed(obj)
+    }
+    if not product_ids:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return  # sync (Celery) session — the snapshot TTL covers it
+    for product_id in product_ids:
+        CacheService.invalidate_product_on_commit(session, product_id)
+        # ProductService registers its own refresh (with previous categories)
+        CacheService.on_commit(
+            session,
+            f"catalog:{product_id}",
+            lambda product_id=product_id: CatalogService.refresh_for_product(product_id),
+            replace=False,
+        )
@@ -0,0 +1,141 @@
+"""
+Event enrichment — device, browser, OS and location for analytics events.
+
+User agents are classified once, at ingestion, into the compact
+device_type / browser / os columns, so device breakdowns group a few
+low-cardinality values instead of raw user-agent text. Traffic is dominated
+by a few hundred distinct user agents, so results are memoized in an LRU
+keyed by a short hash of the user agent.
+
+Location (country / city) comes from an offline MaxMind GeoIP2 / GeoLite2
+City database when GEOIP_DATABASE_PATH points at one and the `geoip2`
+package is installed; otherwise it is left empty.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger("event_enrichment")
+settings = get_settings()
+
+try:
+    import geoip2.database
+    import geoip2.errors
+
+    GEOIP_AVAILABLE = True
+except ImportError:
+    GEOIP_AVAILABLE = False
+
+USER_AGENT_CACHE_SIZE = 4096
+
+_BOT = re.compile(
+    r"bot|crawl|spider|slurp|preview|facebookexternalhit|headless|lighthouse"
+    r"|python-requests|curl|wget"
+)
+_TABLET = re.compile(r"ipad|tablet|kindle|silk|playbook")
+_MOBILE = re.compile(r"mobi|iphone|ipod|android|windows phone|blackberry|opera mini")
+# First match wins: in-app and Chromium-based browsers also claim to be
+# Chrome and Safari
+_BROWSERS = (
+    ("Instagram", re.compile(r"instagram")),
+    ("Facebook", re.compile(r"fban|fbav")),
+    ("Edge", re.compile(r"edg(e|a|ios)?/")),
+    ("Opera", re.compile(r"opr/|opera")),
+    ("Samsung Internet", re.compile(r"samsungbrowser")),
+    ("Firefox", re.compile(r"firefox|fxios")),
+    ("Chrome", re.compile(r"chrome|crios|chromium")),
+    ("Safari", re.compile(r"safari")),
+)
+_SYSTEMS = (
+    ("iOS", re.compile(r"iphone|ipad|ipod")),
+    ("Android", re.compile(r"android")),
+    ("Windows", re.compile(r"windows")),
+    ("ChromeOS", re.compile(r"cros")),
+    ("macOS", re.compile(r"mac os x|macintosh")),
+    ("Linux", re.compile(r"linux")),
+)
+
+
+class ClientInfo(NamedTuple):
+    device_type: str | None
+    browser: str | None
+    os: str | None
+
+
+_UNKNOWN_CLIENT = ClientInfo(None, None, None)
+_user_agents: OrderedDict[bytes, ClientInfo] = OrderedDict()
+_geoip_reader = None
+_geoip_failed = False
+
+
+def _classify(user_agent: str) -> ClientInfo:
+    ua = user_agent.lower()
+    if _BOT.search(ua):
+        device_type = "bot"
+    elif _TABLET.search(ua) or ("android" in ua and "mobile" not in ua):
+        device_type = "tablet"
+    elif _MOBILE.search(ua):
+        device_type = "mobile"
+    else:
+        device_type = "desktop"
+    browser = next((name for name, pattern in _BROWSERS if pattern.search(ua)), "Other")
+    os = next((name for name, pattern in _SYSTEMS if pattern.search(ua)), "Other")
+    return ClientInfo(device_type, browser, os)
+
+
+def _geoip():
+    global _geoip_reader, _geoip_failed
+    if _geoip_reader is None and not _geoip_failed:
+        try:
+            _geoip_reader = geoip2.database.Reader(settings.GEOIP_DATABASE_PATH)
+        except Exception as e:
+            _geoip_failed = True
+            logger.warning("GeoIP database unavailable — locations disabled: %s", str(e))
+    return _geoip_reader
+
+
+class EventEnrichmentService:
+    """Derives client and location columns for analytics events."""
+
+    @staticmethod
+    def parse_user_agent(user_agent: str | None) -> ClientInfo:
+        """Device type, browser and OS of a user agent (memoized)."""
+        if not user_agent:
+            return _UNKNOWN_CLIENT
+        key = hashlib.blake2b(user_agent.encode(), digest_size=8).digest()
+        info = _user_agents.get(key)
+        if info is not None:
+            _user_agents.move_to_end(key)
+            return info
+        info = _classify(user_agent)
+        _user_agents[key] = info
+        if len(_user_agents) > USER_AGENT_CACHE_SIZE:
+            _user_agents.popitem(last=False)
+        return info
+
+    @staticmethod
+    def locate(ip_address: str | None) -> tuple[str | None, str | None]:
+        """(ISO country code, city) of an IP address, or (None, None)."""
+        if not ip_address or not GEOIP_AVAILABLE or not settings.GEOIP_DATABASE_PATH:
+            return None, None
+        reader = _geoip()
+        if reader is None:
+            return None, None
+        try:
+            response = reader.city(ip_address)
+        except (geoip2.errors.AddressNotFoundError, ValueError):
+            return None, None
+        city = response.city.name
+        return response.country.iso_code, city[:100] if city else None
+
+    @classmethod
+    def enrich(cls, rows: list[dict]) -> None:
+        """Fill device_type / browser / os / country / city on analytics_events rows."""
+        for row in rows:
+            row["device_type"], row["browser"], row["os"] = cls.parse_user_agent(row["user_agent"])
+            row["country"], row["city"] = cls.locate(row["ip_address"])
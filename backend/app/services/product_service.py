@@ -18,6 +18,8 @@ from app.schemas.product import (
     VariantCreate,
     VariantUpdate,
 )
+from app.services.cache_service import CacheService
+from app.services.catalog_service import CatalogService
 
 logger = get_logger("product_service")
 
@@ -35,6 +37,7 @@ class ProductService:
 
     def __init__(self, db: AsyncSession):
         self.db = db
+        self._previous_categories: dict[uuid.UUID, set[str]] = {}
 
     @staticmethod
     def _normalize_variant_stock(product: Product | None) -> Product | None:
@@ -58,6 +61,21 @@ class ProductService:
 
         return product
 
+    def _invalidate_cache(self, product_id: uuid.UUID, *previous_categories) -> None:
+        """
+        Once the current transaction commits, drop cached copies of a product
+        and rebuild the catalog snapshots it appears in. `previous_categories`
+        are categories it may have left (re-categorized or deleted).
+        """
+        CacheService.invalidate_product_on_commit(self.db, product_id)
+        categories = self._previous_categories.setdefault(product_id, set())
+        categories.update(ProductCategory(c).value for c in previous_categories)
+        CacheService.on_commit(
+            self.db,
+            f"catalog:{product_id}",
+            lambda: CatalogService.refresh_for_product(product_id, sorted(categories)),
+        )
+
     # ── Product CRUD ─────────────────────────────────────────────────────
     async def create_product(self, data: ProductCreate) -> Product:
         """Create a product with optional variants."""
@@ -107,6 +125,7 @@ class ProductService:
 
         await self.db.flush()
         await self.db.refresh(product)
+        self._invalidate_cache(product.id)
         logger.info("Product created: %s (%s)", product.name, product.slug)
         return product
 
@@ -130,6 +149,25 @@ class ProductService:
         product = result.scalar_one_or_none()
         return self._normalize_variant_stock(product)
 
+    async def get_product_id_by_slug(self, slug: str) -> uuid.UUID | None:
+        """Resolve a slug to a product ID without loading the product."""
+        result = await self.db.execute(select(Product.id).where(Product.slug == slug))
+        return result.scalar_one_or_none()
+
+    async def get_products(self, product_ids: list[uuid.UUID]) -> list[Product]:
+        """Get several products by ID with variants, in one query."""
+        if not product_ids:
+            return []
+        result = await self.db.execute(
+            select(Product)
+            .options(selectinload(Product.variants))
+            .where(Product.id.in_(product_ids))
+        )
+        products = list(result.scalars().all())
+        for product in products:
+            self._normalize_variant_stock(product)
+        return products
+
     async def list_products(
         self,
         category: str | None = None,
@@ -180,6 +218,7 @@ class ProductService:
         if not product:
             return None
 
+        previous_category = product.category
         update_fields = data.model_dump(exclude_unset=True)
         for field, value in update_fields.items():
             if field == "category" and value is not None:
@@ -189,6 +228,7 @@ class ProductService:
 
         await self.db.flush()
         await self.db.refresh(product)
+        self._invalidate_cache(product_id, previous_category)
         logger.info("Product updated: %s", product.name)
         return product
 
@@ -198,6 +238,7 @@ class ProductService:
         if not product:
             return False
         await self.db.delete(product)
+        self._invalidate_cache(product_id, product.category)
         logger.info("Product deleted: %s", product.name)
         return True
 
@@ -223,6 +264,7 @@ class ProductService:
         self.db.add(variant)
         await self.db.flush()
         await self.db.refresh(variant)
+        self._invalidate_cache(product_id)
         logger.info("Variant added to %s: %s", product.name, variant.name)
         return variant
 
@@ -241,6 +283,7 @@ class ProductService:
 
         await self.db.flush()
         await self.db.refresh(variant)
+        self._invalidate_cache(variant.product_id)
         return variant
 
     async def delete_variant(self, variant_id: uuid.UUID) -> bool:
@@ -252,6 +295,7 @@ class ProductService:
         if not variant:
             return False
         await self.db.delete(variant)
+        self._invalidate_cache(variant.product_id)
         return True
 
     # ── Inventory Management ─────────────────────────────────────────────
@@ -293,6 +337,7 @@ class ProductService:
         self.db.add(adjustment)
         await self.db.flush()
         await self.db.refresh(adjustment)
+        self._invalidate_cache(variant.product_id)
 
         logger.info(
             "Stock adjusted for variant %s: %d → %d (%s)",
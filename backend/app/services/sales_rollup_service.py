@@ -0,0 +1,182 @@
+"""
+Sales rollup service — maintains the daily_product_sales table.
+
+Whenever a flush moves an order into or out of the paid statuses, that
+order's items are added to (or subtracted from) the rollup in the same
+transaction, so reports never see a status change without its sales. A
+nightly Celery task rebuilds recent days from the raw orders to correct
+anything the deltas cannot see (bulk SQL updates, deleted orders, edited
+items).
+
+Sales are dated by payment (created_at when an order has no paid_at). An
+order that gets its paid_at while already paid (deposit orders are confirmed
+first and fully paid later) moves its sales to the new day, and a reversal
+is subtracted from the day the sales were added to, so deltas always land
+on the rows the nightly rebuild would produce.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import Date, DateTime, case, delete, event, func, insert, inspect, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.analytics import DailyProductSales
+from app.models.order import Order, OrderItem, OrderStatus
+
+PAID_STATUSES = (OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED)
+RECONCILE_DAYS = 7
+
+_COLUMNS = (
+    "date",
+    "product_id",
+    "variant_id",
+    "product_name",
+    "variant_name",
+    "quantity",
+    "revenue",
+    "order_count",
+    "cake_quantity",
+    "cake_revenue",
+)
+
+
+class SalesRollupService:
+    """Builds and queries the per-day, per-product sales rollup."""
+
+    @staticmethod
+    def sale_date():
+        """SQL expression for the day an order's sales count towards."""
+        # date() rather than CAST: same result on PostgreSQL, and SQLite
+        # (tests) has no real DATE type to cast to
+        return func.date(func.coalesce(Order.paid_at, Order.created_at), type_=Date)
+
+    @staticmethod
+    def first_day(days: int) -> date:
+        """First rollup day covered by a "last N days" report."""
+        return (datetime.now(timezone.utc) - timedelta(days=days)).date()
+
+    @classmethod
+    def _aggregate(cls, negate: bool = False, dated: datetime | None = None):
+        """
+        order_items ⋈ orders summed per (day, product, variant), in _COLUMNS
+        order. `dated` pins the day to that timestamp's date instead of the
+        order's current sale date.
+        """
+        day = cls.sale_date()
+        if dated is not None:
+            # Same date() conversion as sale_date(); a constant, so not grouped
+            day = func.date(literal(dated, DateTime(timezone=True)), type_=Date)
+        cake = Order.has_cake.is_(True)
+        sums = [
+            func.sum(OrderItem.quantity),
+            func.sum(OrderItem.line_total),
+            func.count(func.distinct(OrderItem.order_id)),
+            func.sum(case((cake, OrderItem.quantity), else_=0)),
+            func.sum(case((cake, OrderItem.line_total), else_=0)),
+        ]
+        if negate:
+            sums = [-value for value in sums]
+        return (
+            select(
+                day,
+                OrderItem.product_id,
+                OrderItem.variant_id,
+                func.max(OrderItem.product_name),
+                func.max(OrderItem.variant_name),
+                *sums,
+            )
+            .join(Order, OrderItem.order_id == Order.id)
+            .group_by(
+                *(() if dated is not None else (day,)), OrderItem.product_id, OrderItem.variant_id
+            )
+        )
+
+    @classmethod
+    def apply_order(
+        cls, connection, order_id, negate: bool = False, dated: datetime | None = None
+    ) -> None:
+        """
+        Add (or with `negate`, subtract) one order's items to the rollup, on
+        its current sale date or on the date of `dated`.
+        """
+        table = DailyProductSales.__table__
+        stmt = pg_insert(table).from_select(
+            _COLUMNS, cls._aggregate(negate, dated).where(OrderItem.order_id == order_id)
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_daily_product_sales_key",
+            set_={
+                "product_name": stmt.excluded.product_name,
+                "variant_name": stmt.excluded.variant_name,
+                **{
+                    name: table.c[name] + stmt.excluded[name]
+                    for name in _COLUMNS[5:]
+                },
+            },
+        )
+        connection.execute(stmt)
+
+    @classmethod
+    def reconcile(cls, session: Session, start: date, end: date) -> int:
+        """Rebuild the rollup for days start..end (inclusive) from raw orders."""
+        table = DailyProductSales.__table__
+        day = cls.sale_date()
+        session.execute(delete(table).where(table.c.date >= start, table.c.date <= end))
+        result = session.execute(
+            insert(table).from_select(
+                _COLUMNS,
+                cls._aggregate().where(
+                    Order.status.in_(PAID_STATUSES), day >= start, day <= end
+                ),
+            )
+        )
+        return result.rowcount
+
+
+# ── Incremental maintenance ──────────────────────────────────────────────────
+def _previous(obj, name: str):
+    """An attribute's value before the pending flush."""
+    history = getattr(inspect(obj).attrs, name).history
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+def _paid_transitions(session: Session) -> list[tuple]:
+    """
+    (order_id, negate, dated) for every flushed order entering or leaving the
+    paid set, or changing its sale date while paid. Subtractions are `dated`
+    by the timestamp the sales were added under; additions use the order's
+    current sale date (None).
+    """
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Order) and obj.status in PAID_STATUSES:
+            changes.append((obj.id, False, None))
+    for obj in session.dirty:
+        if not isinstance(obj, Order):
+            continue
+        attrs = inspect(obj).attrs
+        if not attrs.status.history.deleted and not attrs.paid_at.history.deleted:
+            continue
+        was_paid = _previous(obj, "status") in PAID_STATUSES
+        is_paid = obj.status in PAID_STATUSES
+        sold_at = _previous(obj, "paid_at") or obj.created_at
+        if was_paid and (not is_paid or sold_at != (obj.paid_at or obj.created_at)):
+            changes.append((obj.id, True, sold_at))
+        if is_paid and (not was_paid or sold_at != (obj.paid_at or obj.created_at)):
+            changes.append((obj.id, False, None))
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _track_paid_transitions(session: Session, flush_context) -> None:
+    # Deleted paid orders are left to the nightly reconciliation: their
+    # items are already gone by the time this runs.
+    changes = _paid_transitions(session)
+    if not changes:
+        return
+    connection = session.connection()
+    if connection.dialect.name != "postgresql":
+        return
+    for order_id, negate, dated in changes:
+        SalesRollupService.apply_order(connection, order_id, negate, dated)
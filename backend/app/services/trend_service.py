@@ -3,14 +3,15 @@ AI Trend Detection Service.
 Compares week-over-week sales data to detect rising/falling product trends.
 """
 
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 
 from sqlalchemy import Date, case, cast, desc, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import get_logger
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.analytics import DailyProductSales
+from app.models.order import Order, OrderStatus
 
 logger = get_logger("trend_service")
 
@@ -30,10 +31,11 @@ class TrendService:
         Returns trending up, trending down, and new products.
         """
         now = datetime.now(timezone.utc)
-        current_start = now - timedelta(days=days)
+        # Whole days from the daily rollup: the last `days` days including today
+        current_start = now.date() - timedelta(days=days - 1)
         previous_start = current_start - timedelta(days=days)
 
-        current_sales = await self._get_product_sales(current_start, now)
+        current_sales = await self._get_product_sales(current_start, now.date() + timedelta(days=1))
         previous_sales = await self._get_product_sales(previous_start, current_start)
 
         trending_up = []
@@ -143,23 +145,19 @@ class TrendService:
             "revenue_trend": "up" if revenue_change > 5 else "down" if revenue_change < -5 else "stable",
         }
 
-    async def _get_product_sales(
-        self, start: datetime, end: datetime
-    ) -> dict[str, dict]:
-        """Get quantity and revenue per product in a time range."""
+    async def _get_product_sales(self, start: date, end: date) -> dict[str, dict]:
+        """Get quantity and revenue per product for days start..end (exclusive)."""
         result = await self.db.execute(
             select(
-                OrderItem.product_name,
-                func.sum(OrderItem.quantity).label("total_qty"),
-                func.sum(OrderItem.line_total).label("total_revenue"),
+                DailyProductSales.product_name,
+                func.sum(DailyProductSales.quantity).label("total_qty"),
+                func.sum(DailyProductSales.revenue).label("total_revenue"),
             )
-            .join(Order, OrderItem.order_id == Order.id)
             .where(
-                Order.status.in_(PAID_STATUSES),
-                Order.paid_at >= start,
-                Order.paid_at < end,
+                DailyProductSales.date >= start,
+                DailyProductSales.date < end,
             )
-            .group_by(OrderItem.product_name)
+            .group_by(DailyProductSales.product_name)
         )
 
         return {
@@ -0,0 +1,141 @@
+"""
+Unique visitor counters — Redis HyperLogLogs fed by analytics ingestion.
+
+Every page_view the ingest drainer writes also PFADDs its session id into a
+per-day sketch and, for product pages (once ingestion has resolved them to
+a product id), a per-product-per-day sketch keyed by product id, so renaming
+a slug keeps its counts. Unique
+visitors for any range are a PFCOUNT over that range's day keys (Redis
+merges the sketches on the fly): constant time and ~12KB per key however
+much traffic is logged, at ~0.81% standard error. Exact COUNT(DISTINCT)
+in SQL only runs when a report explicitly asks for it.
+
+Sketches only exist from the day counting started (TRACKED_SINCE_KEY, and
+PRODUCTS_TRACKED_SINCE_KEY for product sketches) and until they expire or
+are evicted; reports fall back to SQL for any day not covered (see
+`VisitorCounter.tracked_since`).
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.redis import get_redis
+
+logger = get_logger("visitor_counter")
+settings = get_settings()
+
+KEY_PREFIX = "ks:hll:visitors"
+TRACKED_SINCE_KEY = f"{KEY_PREFIX}:since"
+PRODUCTS_TRACKED_SINCE_KEY = f"{KEY_PREFIX}:product_id:since"
+
+
+def day_key(day: date, product_id: str | None = None) -> str:
+    if product_id:
+        return f"{KEY_PREFIX}:product_id:{product_id}:{day.isoformat()}"
+    return f"{KEY_PREFIX}:{day.isoformat()}"
+
+
+def _days(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class VisitorCounter:
+    """Approximate unique visitors per day, range and product page."""
+
+    @staticmethod
+    async def record(rows: list[dict]) -> None:
+        """
+        Add the sessions of a batch of analytics_events rows to the sketches
+        (after product page views were resolved to their product).
+        """
+        sessions: dict[str, set[str]] = defaultdict(set)
+        first_day = first_product_day = None
+        for row in rows:
+            if row["event_type"] != "page_view" or not row["session_id"]:
+                continue
+            day = row["created_at"].astimezone(timezone.utc).date()
+            first_day = min(first_day or day, day)
+            sessions[day_key(day)].add(row["session_id"])
+            if row["resource_type"] == "product" and row["resource_id"]:
+                first_product_day = min(first_product_day or day, day)
+                sessions[day_key(day, row["resource_id"])].add(row["session_id"])
+        if not sessions:
+            return
+
+        ttl = settings.ANALYTICS_HLL_TTL_DAYS * 86400
+        try:
+            redis = await get_redis()
+            pipe = redis.pipeline(transaction=False)
+            pipe.setnx(TRACKED_SINCE_KEY, first_day.isoformat())
+            if first_product_day:
+                pipe.setnx(PRODUCTS_TRACKED_SINCE_KEY, first_product_day.isoformat())
+            for key, members in sessions.items():
+                pipe.pfadd(key, *members)
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warning("Visitor counter: PFADD failed: %s", str(e))
+
+    @staticmethod
+    async def tracked_since(products: bool = False) -> date | None:
+        """
+        First day from which every day through today is covered by sketches
+        (per-product sketches with `products`); None if counting never
+        started or Redis is down.
+
+        That is the day after counting started, moved past any closed day
+        whose sketch is gone: expired (ANALYTICS_HLL_TTL_DAYS) or evicted.
+        Product sketches are written with their day's sketch, so the day
+        sketch stands in for them. A day without any page view has no
+        sketch either and is counted in SQL too, which is merely slower.
+        """
+        try:
+            redis = await get_redis()
+            value = await redis.get(PRODUCTS_TRACKED_SINCE_KEY if products else TRACKED_SINCE_KEY)
+            if not value:
+                return None
+            today = datetime.now(timezone.utc).date()
+            first = max(
+                date.fromisoformat(value) + timedelta(days=1),
+                today - timedelta(days=settings.ANALYTICS_HLL_TTL_DAYS - 1),
+            )
+            closed = _days(first, today - timedelta(days=1))
+            pipe = redis.pipeline(transaction=False)
+            for day in closed:
+                pipe.exists(day_key(day))
+            missing = [day for day, found in zip(closed, await pipe.execute()) if not found]
+        except Exception as e:
+            logger.warning("Visitor counter: reading start day failed: %s", str(e))
+            return None
+        if missing:
+            logger.info("Visitor counter: no sketch for %s; counting in SQL", missing[-1])
+            return missing[-1] + timedelta(days=1)
+        return first
+
+    @staticmethod
+    async def daily(start: date, end: date, product_id: str | None = None) -> dict[date, int]:
+        """Approximate unique visitors for each day of start..end."""
+        days = _days(start, end)
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        for day in days:
+            pipe.pfcount(day_key(day, product_id))
+        return dict(zip(days, await pipe.execute()))
+
+    @staticmethod
+    async def unique(start: date, end: date, product_id: str | None = None) -> int:
+        """Approximate unique visitors over the whole of start..end."""
+        redis = await get_redis()
+        return await redis.pfcount(*(day_key(day, product_id) for day in _days(start, end)))
+
+    @staticmethod
+    async def unique_by_product(start: date, end: date, product_ids: list[str]) -> dict[str, int]:
+        """Approximate unique visitors over start..end for several products' pages at once."""
+        days = _days(start, end)
+        redis = await get_redis()
+        pipe = redis.pipeline(transaction=False)
+        for product_id in product_ids:
+            pipe.pfcount(*(day_key(day, product_id) for day in days))
+        return dict(zip(product_ids, await pipe.execute()))
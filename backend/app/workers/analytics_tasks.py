@@ -1,21 +1,26 @@
 """
 Analytics background tasks — periodic aggregation jobs.
-Daily revenue roll-up and low-stock alerts.
+Daily revenue roll-up, product sales reconciliation, analytics_events
+partition maintenance and low-stock alerts.
 """
 
 import logging
 import os
-from datetime import date, datetime, timedelta, timezone
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
-from sqlalchemy import Date, case, cast, create_engine, func, select
+from sqlalchemy import Date, create_engine, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
 from app.celery_app import celery_app
 from app.core.config import get_settings
 from app.models.analytics import DailyRevenue
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.order import Order, OrderStatus
 from app.models.product import ProductVariant
+from app.services.analytics_partition_service import AnalyticsPartitionService
+from app.services.analytics_service import AnalyticsService
+from app.services.sales_rollup_service import RECONCILE_DAYS, SalesRollupService
 
 logger = logging.getLogger("app.workers.analytics")
 settings = get_settings()
@@ -24,6 +29,11 @@ settings = get_settings()
 DATABASE_URL = os.getenv("DATABASE_URL", "").replace("+asyncpg", "+psycopg")
 _engine = None
 
+# Closed days re-aggregated on every run (late payments, refunds). Older
+# days are re-aggregated only when one of their orders changed this recently.
+REVENUE_REFRESH_DAYS = 3
+UPSERT_BATCH_SIZE = 500
+
 
 def _get_sync_engine():
     global _engine
@@ -36,77 +46,169 @@ def _get_sync_engine():
     name="app.workers.analytics_tasks.aggregate_daily_revenue",
     max_retries=2,
 )
-def aggregate_daily_revenue():
+def aggregate_daily_revenue(refresh_days: int = REVENUE_REFRESH_DAYS):
     """
-    Aggregate yesterday's revenue into the daily_revenue table.
-    Runs daily via Celery Beat.
+    Upsert closed days into the daily_revenue table: the last `refresh_days`
+    days (late payments and refunds), any older day with an order updated in
+    the last `refresh_days` days (e.g. a refund weeks after the sale), plus
+    any day since the first sale that has no row yet. Idempotent — safe to
+    re-run or run more often. Runs daily via Celery Beat.
+
+    Hard-deleted orders and bulk SQL updates that skip updated_at are not
+    seen; run it with a larger `refresh_days` to rebuild a longer window.
     """
     engine = _get_sync_engine()
     if not engine:
         logger.warning("Database not configured — skipping revenue aggregation")
         return
 
-    yesterday = date.today() - timedelta(days=1)
-    start = datetime.combine(yesterday, datetime.min.time()).replace(tzinfo=timezone.utc)
-    end = datetime.combine(yesterday, datetime.max.time()).replace(tzinfo=timezone.utc)
-
+    yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
     paid_statuses = [OrderStatus.PAID, OrderStatus.CONFIRMED, OrderStatus.COMPLETED]
 
     with Session(engine) as session:
-        # Check if already aggregated
-        existing = session.execute(
-            select(DailyRevenue).where(DailyRevenue.date == yesterday)
-        ).scalar_one_or_none()
-
-        if existing:
-            logger.info("Daily revenue for %s already aggregated", yesterday)
+        first_day = session.execute(
+            select(func.min(Order.paid_at)).where(Order.status.in_(paid_statuses))
+        ).scalar()
+        if first_day is None:
+            logger.info("No paid orders yet — nothing to aggregate")
             return
+        first_day = first_day.astimezone(timezone.utc).date()
 
-        # Aggregate order data
-        result = session.execute(
-            select(
-                func.coalesce(func.sum(Order.total), 0).label("total_revenue"),
-                func.count(Order.id).label("total_orders"),
-                func.coalesce(func.avg(Order.total), 0).label("avg_order_value"),
-                func.sum(case((Order.has_cake == True, 1), else_=0)).label("cake_orders"),
-            ).where(
-                Order.status.in_(paid_statuses),
-                Order.paid_at >= start,
-                Order.paid_at <= end,
+        existing = set(
+            session.execute(
+                select(DailyRevenue.date).where(DailyRevenue.date >= first_day)
+            ).scalars()
+        )
+        refresh_from = yesterday - timedelta(days=refresh_days - 1)
+        paid_day = func.date(Order.paid_at, type_=Date)
+        changed = set(
+            session.execute(
+                select(paid_day).distinct().where(
+                    Order.updated_at >= datetime.combine(
+                        refresh_from, datetime.min.time()
+                    ).replace(tzinfo=timezone.utc),
+                    Order.paid_at.isnot(None),
+                    paid_day < refresh_from,
+                )
+            ).scalars()
+        )
+        pending = [
+            day
+            for day in (
+                first_day + timedelta(days=i) for i in range((yesterday - first_day).days + 1)
             )
-        ).one()
-
-        # Count items sold
-        items_count = session.execute(
-            select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(
-                OrderItem.order_id.in_(
-                    select(Order.id).where(
-                        Order.status.in_(paid_statuses),
-                        Order.paid_at >= start,
-                        Order.paid_at <= end,
-                    )
+            if day not in existing or day >= refresh_from or day in changed
+        ]
+        if not pending:
+            logger.info("Daily revenue up to %s already aggregated", yesterday)
+            return
+
+        start = datetime.combine(pending[0], datetime.min.time()).replace(tzinfo=timezone.utc)
+        end = datetime.combine(pending[-1], datetime.max.time()).replace(tzinfo=timezone.utc)
+        totals = {
+            row.date: row
+            for row in session.execute(AnalyticsService.revenue_by_day_query(start, end))
+        }
+        breakdown: dict = {}
+        for row in session.execute(AnalyticsService.category_revenue_by_day_query(start, end)):
+            category = row.category.value if hasattr(row.category, "value") else str(row.category)
+            breakdown.setdefault(row.date, {})[category] = float(row.revenue or 0)
+
+        rows = []
+        for day in pending:
+            total = totals.get(day)
+            revenue = Decimal(str(total.total_revenue)) if total else Decimal("0")
+            orders = total.total_orders if total else 0
+            rows.append({
+                "date": day,
+                "total_revenue": revenue,
+                "total_orders": orders,
+                "total_items_sold": int(total.total_items_sold) if total else 0,
+                "cake_orders": int(total.cake_orders or 0) if total else 0,
+                "average_order_value": (
+                    (revenue / orders).quantize(Decimal("0.01")) if orders else 0
+                ),
+                "category_breakdown": breakdown.get(day, {}),
+            })
+
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            stmt = pg_insert(DailyRevenue).values(rows[i:i + UPSERT_BATCH_SIZE])
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[DailyRevenue.date],
+                    set_={
+                        name: stmt.excluded[name]
+                        for name in (
+                            "total_revenue",
+                            "total_orders",
+                            "total_items_sold",
+                            "cake_orders",
+                            "average_order_value",
+                            "category_breakdown",
+                        )
+                    },
                 )
             )
-        ).scalar() or 0
-
-        # Create daily revenue record
-        daily = DailyRevenue(
-            date=yesterday,
-            total_revenue=float(result.total_revenue),
-            total_orders=result.total_orders,
-            total_items_sold=items_count,
-            cake_orders=result.cake_orders or 0,
-            average_order_value=float(result.avg_order_value),
-        )
-        session.add(daily)
         session.commit()
 
         logger.info(
-            "✅ Daily revenue aggregated for %s: $%.2f (%d orders)",
-            yesterday, float(result.total_revenue), result.total_orders,
+            "✅ Daily revenue aggregated for %d day(s), %s..%s",
+            len(rows), pending[0], pending[-1],
         )
 
 
+@celery_app.task(
+    name="app.workers.analytics_tasks.reconcile_daily_product_sales",
+    max_retries=2,
+)
+def reconcile_daily_product_sales(days: int = RECONCILE_DAYS):
+    """
+    Rebuild the last N days of daily_product_sales from the raw orders,
+    correcting drift the incremental updates cannot see.
+    Runs nightly via Celery Beat.
+    """
+    engine = _get_sync_engine()
+    if not engine:
+        logger.warning("Database not configured — skipping product sales reconciliation")
+        return
+
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days)
+    with Session(engine) as session:
+        rows = SalesRollupService.reconcile(session, start, end)
+        session.commit()
+
+    logger.info("✅ Product sales reconciled for %s..%s (%d rows)", start, end, rows)
+
+
+@celery_app.task(
+    name="app.workers.analytics_tasks.maintain_analytics_partitions",
+    max_retries=2,
+)
+def maintain_analytics_partitions():
+    """
+    Create upcoming analytics_events partitions, and roll up then detach /
+    drop the ones past ANALYTICS_RETENTION_MONTHS.
+    Runs daily via Celery Beat.
+    """
+    engine = _get_sync_engine()
+    if not engine:
+        logger.warning("Database not configured — skipping analytics partition maintenance")
+        return
+
+    with Session(engine) as session:
+        connection = session.connection()
+        created = AnalyticsPartitionService.ensure_partitions(connection)
+        expired = AnalyticsPartitionService.expire_partitions(connection)
+        session.commit()
+
+    logger.info(
+        "✅ Analytics partitions: created %s, retired %s",
+        [f"{month:%Y-%m}" for month in created] or "none",
+        [f"{month:%Y-%m}" for month in expired] or "none",
+    )
+
+
 @celery_app.task(
     name="app.workers.analytics_tasks.check_low_stock_alerts",
     max_retries=1,
@@ -125,7 +227,7 @@ def check_low_stock_alerts():
         low_stock = session.execute(
             select(ProductVariant).where(
                 ProductVariant.stock_quantity <= ProductVariant.low_stock_threshold,
-                ProductVariant.is_active == True,
+                ProductVariant.is_active.is_(True),
             )
         ).scalars().all()
 
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+One-off backfill: tag existing product page views with their product.
+
+Events ingested since the `add_product_view_resources` migration are
+resolved at write time (resource_type 'product', resource_id = product id);
+this does the same for older page_view rows by matching the slug in their
+page_url. Runs one day at a time, newest first, committing after each day,
+so it can be stopped and re-run at any point — rows already tagged are
+skipped.
+
+    python scripts/backfill_product_views.py [--days 400]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Ensure backend root is in sys.path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import get_settings
+
+# Same rule as product_slug_from_url
+SLUG = "split_part(split_part(rtrim(e.page_url, '/'), '/products/', 2), '?', 1)"
+
+BACKFILL_DAY = f"""
+    UPDATE analytics_events e
+    SET resource_type = 'product', resource_id = p.id::text
+    FROM products p
+    WHERE e.created_at >= :start AND e.created_at < :end
+      AND e.event_type = 'page_view'
+      AND e.resource_type IS NULL
+      AND e.page_url LIKE '%/products/%'
+      AND p.slug = {SLUG}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--days", type=int, default=400, help="how far back to go")
+    args = parser.parse_args()
+
+    engine = create_engine(get_settings().sync_database_url)
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    total = 0
+    for offset in range(args.days + 1):
+        start = today - timedelta(days=offset)
+        with engine.begin() as conn:
+            updated = conn.execute(
+                text(BACKFILL_DAY), {"start": start, "end": start + timedelta(days=1)}
+            ).rowcount
+        total += updated
+        if updated:
+            print(f"{start:%Y-%m-%d}: {updated:,} product views tagged")
+    print(f"Done — {total:,} product views tagged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the analytics / order hot-path indexes.
+
+Seeds a scratch schema with a large synthetic dataset (orders, order items,
+analytics events), then times the dashboard and analytics queries twice:
+first with only the single-column indexes the models used to have, then
+after creating the composite and partial indexes from the
+`add_hot_path_indexes` migration. Prints median latency per query.
+
+Needs a PostgreSQL database with the schema migrated (the public tables are
+used as templates). Everything is written to the `bench_indexes` schema,
+which is dropped afterwards unless --keep is given.
+
+    python scripts/bench_dashboard_indexes.py [--orders 200000] [--events 1000000] [--rounds 5]
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+# Ensure backend root is in sys.path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from sqlalchemy import create_engine, text
+
+from app.core.config import get_settings
+
+SCHEMA = "bench_indexes"
+PAID = "status IN ('PAID', 'CONFIRMED', 'COMPLETED')"
+
+# Indexes the models had before the migration
+BASELINE_INDEXES = [
+    "CREATE INDEX ON orders (status)",
+    "CREATE INDEX ON orders (created_at)",
+    "CREATE INDEX ON orders (customer_id)",
+    "CREATE INDEX ON order_items (order_id)",
+    "CREATE INDEX ON analytics_events (event_type)",
+    "CREATE INDEX ON analytics_events (created_at)",
+    "CREATE INDEX ON analytics_events (session_id)",
+]
+
+# The query shapes AnalyticsService runs for the admin dashboard
+QUERIES = {
+    "revenue_this_month": f"""
+        SELECT coalesce(sum(total), 0) FROM orders
+        WHERE {PAID} AND paid_at >= now() - interval '30 days'
+    """,
+    "daily_revenue_30d": f"""
+        SELECT paid_at::date, sum(total), count(id) FROM orders
+        WHERE {PAID} AND paid_at >= now() - interval '30 days' AND paid_at <= now()
+        GROUP BY paid_at::date ORDER BY paid_at::date
+    """,
+    "items_sold_30d": f"""
+        SELECT coalesce(sum(quantity), 0) FROM order_items
+        WHERE order_id IN (
+            SELECT id FROM orders
+            WHERE {PAID} AND paid_at >= now() - interval '30 days'
+        )
+    """,
+    "best_sellers_30d": f"""
+        SELECT oi.product_id, sum(oi.quantity) AS qty, sum(oi.line_total)
+        FROM order_items oi JOIN orders o ON oi.order_id = o.id
+        WHERE o.{PAID} AND o.created_at >= now() - interval '30 days'
+        GROUP BY oi.product_id ORDER BY qty DESC LIMIT 10
+    """,
+    "orders_today": "SELECT count(id) FROM orders WHERE created_at >= date_trunc('day', now())",
+    "weekly_status_mix": """
+        SELECT status, count(id) FROM orders
+        WHERE created_at >= date_trunc('week', now()) AND created_at <= now()
+          AND status != 'DRAFT'
+        GROUP BY status
+    """,
+    "customer_velocity": """
+        SELECT count(id) FROM orders
+        WHERE customer_id = (SELECT customer_id FROM orders WHERE customer_id IS NOT NULL LIMIT 1)
+          AND created_at >= now() - interval '24 hours'
+    """,
+    "visits_per_day_30d": """
+        SELECT created_at::date, count(id), count(DISTINCT session_id)
+        FROM analytics_events
+        WHERE created_at >= now() - interval '30 days' AND event_type = 'page_view'
+        GROUP BY created_at::date ORDER BY created_at::date
+    """,
+    "add_to_cart_7d": """
+        SELECT count(id) FROM analytics_events
+        WHERE event_type = 'add_to_cart' AND created_at >= now() - interval '7 days'
+    """,
+}
+
+
+def _migration_indexes() -> dict[str, str]:
+    path = os.path.join(BASE_DIR, "alembic", "versions", "add_hot_path_indexes.py")
+    spec = importlib.util.spec_from_file_location("add_hot_path_indexes", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INDEXES
+
+
+def seed(conn, orders: int, events: int) -> None:
+    print(f"Seeding {orders:,} orders, ~{orders * 5 // 2:,} items, {events:,} events ...")
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+    for table in ("orders", "order_items", "analytics_events"):
+        conn.execute(text(f"CREATE TABLE {table} (LIKE public.{table} INCLUDING DEFAULTS)"))
+    conn.execute(text("ALTER TABLE orders ADD PRIMARY KEY (id)"))
+    conn.execute(text("ALTER TABLE order_items ADD PRIMARY KEY (id)"))
+    conn.execute(text("ALTER TABLE analytics_events ADD PRIMARY KEY (id)"))
+
+    # Two years of history; ~60% of orders are paid, the rest spread over
+    # the other statuses. 200 customers, 60 products.
+    conn.execute(text("""
+        INSERT INTO orders (
+            id, order_number, status, customer_id, customer_name, customer_email,
+            has_cake, subtotal, tax_amount, discount_amount, total,
+            created_at, updated_at, paid_at
+        )
+        SELECT
+            gen_random_uuid(), 'B' || g, s.status::orderstatus,
+            CASE WHEN g % 3 = 0 THEN NULL ELSE md5((g % 200)::text)::uuid END,
+            'Bench', 'bench@example.com', g % 7 = 0, t.total, 0, 0, t.total,
+            t.created, t.created,
+            CASE WHEN s.status IN ('PAID', 'CONFIRMED', 'COMPLETED')
+                 THEN t.created + interval '5 minutes' END
+        FROM generate_series(1, :orders) AS g
+        CROSS JOIN LATERAL (
+            SELECT now() - random() * interval '730 days' AS created,
+                   round((random() * 120 + 10)::numeric, 2) AS total
+        ) t
+        CROSS JOIN LATERAL (
+            SELECT (ARRAY['PAID','CONFIRMED','COMPLETED','COMPLETED','COMPLETED','COMPLETED',
+                          'PENDING','PREPARING','CANCELLED','DRAFT'])[1 + (g % 10)] AS status
+        ) s
+    """), {"orders": orders})
+    conn.execute(text("""
+        INSERT INTO order_items
+            (id, order_id, product_id, product_name, unit_price, quantity, line_total)
+        SELECT gen_random_uuid(), o.id,
+               md5('product' || (n + abs(hashtext(o.id::text))) % 60)::uuid,
+               'Bench item', 12.50, q.quantity, 12.50 * q.quantity
+        FROM orders o
+        CROSS JOIN LATERAL generate_series(1, 1 + abs(hashtext(o.id::text)) % 4) AS n
+        CROSS JOIN LATERAL (SELECT 1 + (n % 3) AS quantity) q
+    """))
+    conn.execute(text("""
+        INSERT INTO analytics_events (id, event_type, session_id, page_url, created_at)
+        SELECT gen_random_uuid(),
+               (ARRAY['page_view','page_view','page_view','page_view','page_view',
+                      'page_view','add_to_cart','search','checkout','purchase'])[1 + (g % 10)],
+               'session-' || (g / 8), '/products/item-' || (g % 60),
+               now() - random() * interval '365 days'
+        FROM generate_series(1, :events) AS g
+    """), {"events": events})
+    for statement in BASELINE_INDEXES:
+        conn.execute(text(statement))
+    conn.execute(text("ANALYZE orders"))
+    conn.execute(text("ANALYZE order_items"))
+    conn.execute(text("ANALYZE analytics_events"))
+
+
+def measure(conn, rounds: int) -> dict[str, float]:
+    timings = {}
+    for name, sql in QUERIES.items():
+        conn.execute(text(sql))  # warm the buffer cache
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            conn.execute(text(sql)).all()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema")
+    args = parser.parse_args()
+
+    engine = create_engine(get_settings().sync_database_url)
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            seed(conn, args.orders, args.events)
+            before = measure(conn, args.rounds)
+
+            print("Creating migration indexes ...")
+            for name, definition in _migration_indexes().items():
+                conn.execute(text(f"CREATE INDEX {name} ON {definition}"))
+            conn.execute(text("ANALYZE orders"))
+            conn.execute(text("ANALYZE order_items"))
+            conn.execute(text("ANALYZE analytics_events"))
+            after = measure(conn, args.rounds)
+        finally:
+            if not args.keep:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    print(f"\n{'query':<22} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(f"{name:<22} {b:>10.2f} {a:>10.2f} {b / a if a else float('inf'):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
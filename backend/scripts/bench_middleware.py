@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Requests/second through the security middleware: pure ASGI vs BaseHTTPMiddleware.
+
+Runs in-process over httpx's ASGI transport (no network, no database), so
+the difference between the rows is middleware overhead. "before" stacks the
+three checks as BaseHTTPMiddleware layers, as the app did previously;
+"after" is the single SecurityMiddleware pass the app now installs.
+
+Routes:
+  /api/v1/ping       the load-balancer ping (small JSON)
+  /api/v1/products/  a ~30 KB pre-serialized body, as the cached product list returns
+
+    python scripts/bench_middleware.py [--requests 3000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Ensure backend root is in sys.path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+from app.core.security_middleware import (
+    IPThrottleMiddleware,
+    RequestValidationMiddleware,
+    SecurityHeadersMiddleware,
+    SecurityMiddleware,
+)
+
+PRODUCT_LIST = json.dumps(
+    [{"id": str(i), "name": f"Product {i}", "description": "x" * 200} for i in range(100)]
+).encode()
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/ping")
+    async def ping():
+        return {"ping": "pong"}
+
+    @app.get("/api/v1/products/")
+    async def products():
+        return Response(PRODUCT_LIST, media_type="application/json")
+
+    return app
+
+
+def before() -> FastAPI:
+    """The previous layout: one BaseHTTPMiddleware per concern."""
+    app = _app()
+    headers = SecurityHeadersMiddleware(None)
+    validation = RequestValidationMiddleware(None)
+    throttle = IPThrottleMiddleware(None, requests_per_second=10**9)
+
+    class Headers(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            response = await call_next(request)
+            for name, value in headers.headers:
+                response.headers[name.decode()] = value.decode()
+            return response
+
+    class Validation(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            return validation.reject(request.scope) or await call_next(request)
+
+    class Throttle(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            return throttle.reject(request.scope) or await call_next(request)
+
+    app.add_middleware(Headers)
+    app.add_middleware(Validation)
+    app.add_middleware(Throttle)
+    return app
+
+
+def after() -> FastAPI:
+    app = _app()
+    app.add_middleware(SecurityMiddleware, requests_per_second=10**9)
+    return app
+
+
+async def rps(app: FastAPI, path: str, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(100):  # warm-up
+            await client.get(path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path)
+        return requests / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    print(f"{'path':<20} {'before req/s':>13} {'after req/s':>12} {'speedup':>8}")
+    for path in ("/api/v1/ping", "/api/v1/products/"):
+        old = await rps(before(), path, args.requests)
+        new = await rps(after(), path, args.requests)
+        print(f"{path:<20} {old:>13,.0f} {new:>12,.0f} {new / old:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the request-validation scanner.
+
+Compares the previous approach (one `in` scan per pattern over the query
+string) with PatternScanner (every pattern in one trie-factored regex, one
+pass over raw + decoded query) on realistic storefront query strings, as the
+pattern count grows. The scanner's cost should stay roughly flat.
+
+    python scripts/bench_request_scan.py [--rounds 2000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from urllib.parse import unquote_plus
+
+# Ensure backend root is in sys.path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from app.core.security_middleware import PatternScanner, RequestValidationMiddleware
+
+QUERIES = [
+    "category=cake&is_featured=true&skip=0&limit=50",
+    "search=pistachio%20baklava&limit=24",
+    "search=birthday+cake+chocolate&category=cake&skip=48&limit=24",
+    "ids=6f1c2b0e-1a7d-4c55-9a39-2f8e5c1d0b11&ids=0d2e6b7a-4f0c-4d0e-9c1b-7a8e3f2d1c00",
+    "utm_source=instagram&utm_medium=social&utm_campaign=eid_2026&fbclid=IwAR3xYz",
+    "redirect=%2Faccount%2Forders%3Fpage%3D2&lang=en",
+    "days=30&limit=10",
+    "",
+]
+
+
+def _legacy(patterns, query: str) -> bool:
+    raw = query.lower()
+    return any(p in raw for p in patterns)
+
+
+def _scanner(scanner: PatternScanner, query: str) -> bool:
+    raw = query.lower()
+    if not raw:
+        return False
+    text = raw
+    if "%" in raw or "+" in raw:
+        text = unquote_plus(raw).lower()
+    return scanner.search(text) is not None
+
+
+def _time(fn, rounds: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(rounds):
+        for query in QUERIES:
+            fn(query)
+    return (time.perf_counter_ns() - started) / (rounds * len(QUERIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    base = list(RequestValidationMiddleware._ALL_BLOCKED)
+    print(f"{'patterns':>9} {'legacy ns/req':>14} {'scanner ns/req':>15}")
+    for extra in (0, 300, 3000):
+        patterns = base + [
+            "".join(random.choices(string.ascii_lowercase + "();'=", k=random.randint(5, 12)))
+            for _ in range(extra)
+        ]
+        scanner = PatternScanner(patterns)
+        legacy_ns = _time(lambda q: _legacy(patterns, q), args.rounds)
+        scanner_ns = _time(lambda q: _scanner(scanner, q), args.rounds)
+        print(f"{len(patterns):>9,} {legacy_ns:>14,.0f} {scanner_ns:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
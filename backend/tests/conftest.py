@@ -0,0 +1,143 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+
+from app.core.query_stats import track_queries
+from app.services import cache_service
+from app.services.cache_service import _LocalCache
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Assert a SQL query budget for a block, including endpoint calls made
+    through TestClient (queries are counted process-wide)::
+
+        with max_queries(3):
+            client.get("/api/v1/analytics/best-sellers")
+
+    Requires the engine to be instrumented (`instrument_engine`), as the app
+    does at startup.
+    """
+
+    @contextmanager
+    def _max_queries(limit: int):
+        with track_queries(all_threads=True) as stats:
+            yield stats
+        assert stats.count <= limit, f"expected at most {limit} queries, got {stats.report()}"
+
+    return _max_queries
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    def get(self, key):
+        self._ops.append(("get", key))
+
+    def pttl(self, key):
+        self._ops.append(("pttl", key))
+
+    def mget(self, keys):
+        self._ops.append(("mget", tuple(keys)))
+
+    def setex(self, key, ttl, value):
+        self._ops.append(("setex", key, value))
+
+    def sadd(self, key, member):
+        self._ops.append(("sadd", key, member))
+
+    def expire(self, key, ttl, **kwargs):
+        self._ops.append(("expire", key))
+
+    def smembers(self, key):
+        self._ops.append(("smembers", key))
+
+    def incr(self, key):
+        self._ops.append(("incr", key))
+
+    async def execute(self):
+        out = []
+        for op, key, *args in self._ops:
+            if op == "get":
+                self._redis.get_calls += 1
+                out.append(self._redis.data.get(key))
+            elif op == "mget":
+                self._redis.get_calls += 1
+                out.append([self._redis.data.get(k) for k in key])
+            elif op == "pttl":
+                out.append(60_000 if key in self._redis.data else -2)
+            elif op == "setex":
+                self._redis.data[key] = args[0]
+                out.append(True)
+            elif op == "sadd":
+                self._redis.data.setdefault(key, set()).add(args[0])
+                out.append(1)
+            elif op == "smembers":
+                out.append(set(self._redis.data.get(key, set())))
+            elif op == "incr":
+                out.append(await self._redis.incr(key))
+            else:
+                out.append(True)
+        return out
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.published = []
+        self.get_calls = 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    In-memory Redis behind CacheService, with a fresh, small worker-local
+    cache. Records published invalidations and counts reads.
+    """
+    redis = _FakeRedis()
+
+    async def _get_redis():
+        return redis
+
+    monkeypatch.setattr(cache_service, "get_redis", _get_redis)
+    monkeypatch.setattr(cache_service, "_local", _LocalCache(max_entries=8, max_ttl=30))
+    return redis
@@ -0,0 +1,88 @@
+from datetime import date
+
+from app.services.analytics_partition_service import (
+    AnalyticsPartitionService,
+    add_months,
+    partition_month,
+    partition_name,
+)
+
+
+class _Dialect:
+    name = "postgresql"
+
+
+class _Result:
+    rowcount = 0
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def scalars(self):
+        return iter(self.value or ())
+
+
+class _Connection:
+    """Answers the catalog lookups and records every other statement."""
+
+    dialect = _Dialect()
+
+    def __init__(self, partitions):
+        self.partitions = partitions
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        sql = " ".join(str(statement).split())
+        if "pg_partitioned_table" in sql:
+            return _Result(True)
+        if "pg_inherits" in sql:
+            return _Result(self.partitions + ["analytics_events_archive"])
+        self.statements.append(sql)
+        return _Result()
+
+
+def test_partition_names_and_month_math():
+    assert partition_name(date(2026, 1, 1)) == "analytics_events_2026_01"
+    assert partition_month("analytics_events_2025_12") == date(2025, 12, 1)
+    assert partition_month("analytics_events_archive") is None
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+
+
+def test_missing_partitions_are_created_ahead():
+    connection = _Connection(["analytics_events_2026_10", "analytics_events_2026_11"])
+
+    created = AnalyticsPartitionService.ensure_partitions(
+        connection, today=date(2026, 10, 16), ahead=3
+    )
+
+    assert created == [date(2026, 12, 1), date(2027, 1, 1)]
+    assert connection.statements[-1] == (
+        "CREATE TABLE IF NOT EXISTS analytics_events_2027_01 PARTITION OF analytics_events "
+        "FOR VALUES FROM ('2027-01-01 00:00:00+00') TO ('2027-02-01 00:00:00+00')"
+    )
+
+
+def test_expired_partitions_are_rolled_up_before_they_are_dropped():
+    connection = _Connection([
+        "analytics_events_2025_08", "analytics_events_2025_09", "analytics_events_2026_10",
+    ])
+
+    expired = AnalyticsPartitionService.expire_partitions(
+        connection, today=date(2026, 10, 16), retention_months=13, drop=True
+    )
+
+    assert expired == [date(2025, 8, 1)]
+    kinds = [sql.split(" ")[0] for sql in connection.statements]
+    assert kinds == ["DELETE", "INSERT", "INSERT", "ALTER", "DROP"]
+    assert "FROM analytics_events_2025_08" in connection.statements[1]
+    assert connection.statements[3] == (
+        "ALTER TABLE analytics_events DETACH PARTITION analytics_events_2025_08"
+    )
+
+    assert AnalyticsPartitionService.expire_partitions(
+        _Connection(["analytics_events_2020_01"]), today=date(2026, 10, 16), retention_months=0
+    ) == []
@@ -0,0 +1,567 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.core.metrics import registry
+from app.core.query_stats import instrument_engine, track_queries
+from app.models.analytics import DailyProductSales, DailyRevenue
+from app.models.order import Order, OrderItem, OrderStatus, Payment
+from app.models.product import Product, ProductCategory, ProductVariant
+from app.models.user import User
+from app.schemas.analytics import AnalyticsEventCreate
+from app.services import (
+    analytics_ingest_service,
+    analytics_service,
+    cache_service,
+    visitor_counter_service,
+)
+from app.services.analytics_ingest_service import AnalyticsIngestService
+from app.services.analytics_service import AnalyticsService
+from app.services.sales_rollup_service import SalesRollupService, _paid_transitions
+from app.services.visitor_counter_service import VisitorCounter
+
+
+class _AsyncSession:
+    """Just enough of AsyncSession over a sync sqlite Session for the service."""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def execute(self, statement):
+        return self.sync_session.execute(statement)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            model.__table__
+            for model in (
+                User, Product, ProductVariant, Order, OrderItem, Payment,
+                DailyProductSales, DailyRevenue,
+            )
+        ],
+    )
+    with Session(engine) as session:
+        yield session
+
+
+def _order(number, status, total="10.00", paid_at=None, created_at=None, has_cake=False):
+    now = datetime.now(timezone.utc)
+    return Order(
+        order_number=number,
+        status=status,
+        customer_name="Test",
+        customer_email="test@example.com",
+        total=Decimal(total),
+        has_cake=has_cake,
+        paid_at=paid_at,
+        created_at=created_at or now,
+        updated_at=now,
+    )
+
+
+@pytest.mark.asyncio
+async def test_dashboard_summary_is_one_query_and_cached(session, fake_redis, monkeypatch):
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        _order("A1", OrderStatus.PAID, "25.00", paid_at=now, has_cake=True),
+        _order("A2", OrderStatus.COMPLETED, "15.00", paid_at=now - timedelta(days=40),
+               created_at=now - timedelta(days=40)),
+        _order("A3", OrderStatus.PENDING),
+        _order("A4", OrderStatus.PREPARING, created_at=now - timedelta(days=90)),
+        _order("A5", OrderStatus.CANCELLED, "99.00", paid_at=now),
+    ])
+    session.commit()
+    # The summary is computed in its own session, never the request's
+    monkeypatch.setattr(analytics_service, "async_session_factory", lambda: _AsyncSession(session))
+    service = AnalyticsService(None)
+
+    with track_queries() as stats:
+        summary = await service.get_dashboard_summary()
+        assert await service.get_dashboard_summary() == summary
+        cache_service._local.clear()
+        from_redis = await service.get_dashboard_summary()
+
+    assert stats.count == 1
+    assert from_redis == summary
+    assert isinstance(from_redis["revenue_today"], Decimal)
+    assert summary["revenue_today"] == Decimal("25.00")
+    assert summary["revenue_this_month"] == Decimal("25.00")
+    assert summary["orders_today"] == 3
+    assert summary["orders_pending"] == 1
+    assert summary["orders_preparing"] == 1
+    assert summary["cake_orders_today"] == 1
+    assert summary["low_stock_count"] == 0
+
+
+@pytest.mark.asyncio
+async def test_order_writes_invalidate_dashboard_after_commit(session, fake_redis):
+    session.add(_order("B1", OrderStatus.PENDING))
+    session.flush()
+    session.rollback()
+    await asyncio.gather(*cache_service._background_tasks)
+    assert fake_redis.published == []
+
+    order = _order("B2", OrderStatus.PENDING)
+    session.add(order)
+    session.commit()
+    order.status = OrderStatus.PAID
+    session.commit()
+    await asyncio.gather(*cache_service._background_tasks)
+
+    invalidations = [m["tags"] for _, m in fake_redis.published if "tags" in m]
+    assert invalidations == [["dashboard", "analytics"]] * 2
+
+
+@pytest.mark.asyncio
+async def test_sales_rankings_come_from_one_rollup_query(session):
+    now = datetime.now(timezone.utc)
+    products = [
+        Product(name=name, slug=name.lower(), category=category, base_price=Decimal("10.00"))
+        for name, category in (
+            ("Baklava", ProductCategory.PASTRY),
+            ("Sheer Pira", ProductCategory.SWEET),
+            ("Tres Leches", ProductCategory.CAKE),
+        )
+    ]
+    session.add_all(products)
+    order = _order("C1", OrderStatus.PAID, paid_at=now)
+    session.add(order)
+    session.flush()
+    for product, quantity in zip(products, (7, 1, 3)):
+        session.add(OrderItem(
+            order_id=order.id, product_id=product.id, product_name=product.name,
+            unit_price=Decimal("10.00"), quantity=quantity, line_total=Decimal(10 * quantity),
+        ))
+    refunded = _order("C2", OrderStatus.REFUNDED, paid_at=now)
+    session.add(refunded)
+    session.flush()
+    session.add(OrderItem(
+        order_id=refunded.id, product_id=products[1].id, product_name="Sheer Pira",
+        unit_price=Decimal("10.00"), quantity=50, line_total=Decimal(500),
+    ))
+    session.commit()
+    SalesRollupService.reconcile(session, now.date() - timedelta(days=30), now.date())
+    session.commit()
+    service = AnalyticsService(_AsyncSession(session))
+
+    with track_queries() as stats:
+        rankings = await service.get_sales_rankings(limit=2)
+
+    assert stats.count == 1
+    assert [(p["product_name"], p["total_quantity_sold"]) for p in rankings["best_sellers"]] == [
+        ("Baklava", 7), ("Tres Leches", 3),
+    ]
+    assert [p["product_name"] for p in rankings["worst_sellers"]] == ["Sheer Pira", "Tres Leches"]
+    assert rankings["best_sellers"][0]["category"] == "pastry"
+
+
+def test_paid_transitions_are_detected_on_flush(session):
+    order = _order("D1", OrderStatus.PENDING)
+    session.add(order)
+    session.flush()
+    assert _paid_transitions(session) == []
+
+    order.status = OrderStatus.PAID
+    session.flush()  # history is reset; inspect the next change in isolation
+    order.status = OrderStatus.CONFIRMED  # paid → paid: no delta
+    assert _paid_transitions(session) == []
+
+    order.status = OrderStatus.REFUNDED
+    assert _paid_transitions(session) == [(order.id, True, order.created_at)]
+
+    session.add(_order("D2", OrderStatus.PAID))
+    assert [negate for _, negate, _ in _paid_transitions(session)] == [False, True]
+
+
+def test_paid_at_set_after_confirmation_moves_the_sale(session):
+    # Deposit orders are confirmed without paid_at and fully paid days later
+    created_at = datetime.now(timezone.utc) - timedelta(days=3)
+    order = _order("D3", OrderStatus.CONFIRMED, created_at=created_at)
+    session.add(order)
+    session.flush()
+    created_at = order.created_at
+
+    paid_at = datetime.now(timezone.utc)
+    order.status = OrderStatus.PAID
+    order.paid_at = paid_at
+    # Subtracted from the day it was added to, then added on the paid day
+    assert _paid_transitions(session) == [(order.id, True, created_at), (order.id, False, None)]
+    session.flush()
+
+    order.status = OrderStatus.REFUNDED
+    assert _paid_transitions(session) == [(order.id, True, paid_at)]
+
+
+def test_dated_deltas_pin_the_rollup_day():
+    dated = datetime(2026, 3, 1, 12, tzinfo=timezone.utc)
+    query = SalesRollupService._aggregate(negate=True, dated=dated)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "GROUP BY order_items.product_id, order_items.variant_id" in sql
+    assert "coalesce" not in sql
+
+
+@pytest.mark.asyncio
+async def test_revenue_reads_closed_days_from_rollup_and_today_live(session):
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    session.add_all([
+        # Before the first rollup row there were no sales: never scanned
+        _order("E0", OrderStatus.PAID, "500.00", paid_at=now - timedelta(days=6)),
+        DailyRevenue(date=today - timedelta(days=4), total_revenue=0, total_orders=0,
+                     total_items_sold=0, cake_orders=0, average_order_value=0),
+        # Closed day with a rollup row: the raw order must not be re-read
+        DailyRevenue(date=today - timedelta(days=1), total_revenue=100, total_orders=4,
+                     total_items_sold=9, cake_orders=1, average_order_value=25),
+        _order("E1", OrderStatus.PAID, "999.00", paid_at=now - timedelta(days=1)),
+        # Closed days the rollup has not caught up with yet
+        _order("E2", OrderStatus.PAID, "30.00", paid_at=now - timedelta(days=2)),
+        _order("E3", OrderStatus.COMPLETED, "20.00", paid_at=now, has_cake=True),
+    ])
+    session.commit()
+    service = AnalyticsService(_AsyncSession(session))
+
+    with track_queries() as stats:
+        summary = await service.get_revenue_summary(today - timedelta(days=7), today)
+    daily = await service.get_daily_revenue(today - timedelta(days=7), today)
+
+    # Rollup, its first day, then days -3..-2 and today as separate runs
+    assert stats.count == 4
+
+    assert summary["total_revenue"] == Decimal("150.00")
+    assert summary["total_orders"] == 6
+    assert summary["cake_orders"] == 2
+    assert summary["average_order_value"] == Decimal("25.00")
+    assert [(d["date"], d["total_revenue"]) for d in daily] == [
+        (today - timedelta(days=2), Decimal("30.00")),
+        (today - timedelta(days=1), Decimal("100")),
+        (today, Decimal("20.00")),
+    ]
+
+
+class _Rows:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class _RecordingSessionFactory:
+    """
+    Stands in for async_session_factory; keeps each INSERT as compiled for
+    PostgreSQL and answers product slug lookups from `products`.
+    """
+
+    def __init__(self, products=None):
+        self.inserts = []
+        self.lookups = 0
+        self.products = products or {}
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        if statement.is_select:
+            self.lookups += 1
+            return _Rows(list(self.products.items()))
+        self.inserts.append(statement.compile(dialect=postgresql.dialect()))
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_ingest_buffers_events_and_inserts_them_in_batches(monkeypatch):
+    factory = _RecordingSessionFactory()
+    monkeypatch.setattr(analytics_ingest_service, "async_session_factory", factory)
+    monkeypatch.setattr(analytics_ingest_service.settings, "ANALYTICS_INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(analytics_ingest_service.settings, "ANALYTICS_INGEST_QUEUE_SIZE", 3)
+    dropped = registry.counters.get("analytics_events_dropped_total", 0)
+
+    event = AnalyticsEventCreate(event_type="page_view", session_id="s1", page_url="/")
+    rows = [AnalyticsIngestService.build_row(event, ip_address="10.0.0.1") for _ in range(4)]
+    assert AnalyticsIngestService.enqueue(*rows[:3])
+    assert not AnalyticsIngestService.enqueue(rows[3])  # buffer full: refused, not blocked
+    assert registry.counters["analytics_events_dropped_total"] == dropped + 1
+
+    assert await AnalyticsIngestService.flush() == 3
+    assert [sql.string.count("%(id_m") for sql in factory.inserts] == [2, 1]
+    assert factory.inserts[0].params["ip_address_m1"] == "10.0.0.1"
+    assert registry.gauges["analytics_ingest_buffer_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_a_row_the_database_rejects_only_drops_itself(monkeypatch):
+    from sqlalchemy.exc import DataError
+
+    class _RejectingFactory(_RecordingSessionFactory):
+        async def execute(self, statement):
+            compiled = statement.compile(dialect=postgresql.dialect())
+            if "rejected" in compiled.params.values():
+                raise DataError("INSERT", {}, Exception("value too long"))
+            return await super().execute(statement)
+
+    factory = _RejectingFactory()
+    monkeypatch.setattr(analytics_ingest_service, "async_session_factory", factory)
+    monkeypatch.setattr(analytics_ingest_service.settings, "ANALYTICS_INGEST_BATCH_SIZE", 8)
+    failed = registry.counters.get("analytics_events_failed_total", 0)
+
+    long_url = "/?utm_source=" + "x" * 600
+    rows = [
+        AnalyticsIngestService.build_row(
+            AnalyticsEventCreate.model_construct(
+                event_type="page_view", session_id=f"s{i}", page_url=long_url
+            )
+        )
+        for i in range(5)
+    ]
+    assert len(rows[0]["page_url"]) == 500  # cut to the column, not rejected
+    rows[3]["event_type"] = "rejected"
+    AnalyticsIngestService.enqueue(*rows)
+
+    assert await AnalyticsIngestService.flush() == 4
+    assert registry.counters["analytics_events_failed_total"] == failed + 1
+    assert sum(sql.string.count("%(id_m") for sql in factory.inserts) == 4
+
+
+def test_event_batch_is_validated_once_and_stamped_once(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1.analytics import router
+    from app.schemas.analytics import MAX_EVENTS_PER_BATCH
+
+    queued = []
+    monkeypatch.setattr(
+        AnalyticsIngestService, "enqueue", lambda *rows: queued.append(rows) or True
+    )
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    events = [{"event_type": "page_view", "page_url": f"/p/{i}"} for i in range(3)]
+    response = client.post("/analytics/events/batch", json={"events": events},
+                           headers={"user-agent": "test-agent"})
+
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 3}
+    assert len(queued) == 1
+    rows = queued[0]
+    assert [row["page_url"] for row in rows] == ["/p/0", "/p/1", "/p/2"]
+    assert {(row["user_agent"], row["created_at"]) for row in rows} == {
+        ("test-agent", rows[0]["created_at"])
+    }
+
+    too_many = {"events": [events[0]] * (MAX_EVENTS_PER_BATCH + 1)}
+    assert client.post("/analytics/events/batch", json=too_many).status_code == 422
+    assert client.post("/analytics/events/batch", json={"events": []}).status_code == 422
+    # Longer than the analytics_events column: refused at the edge
+    too_long = {"events": [events[0], {**events[1], "page_url": "/?q=" + "x" * 500}]}
+    assert client.post("/analytics/events/batch", json=too_long).status_code == 422
+    assert len(queued) == 1
+
+
+class _HllRedis:
+    """HyperLogLog commands over exact sets (PFCOUNT of several keys = size of the union)."""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        redis, calls = self, []
+
+        class _Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: calls.append((name, args))
+
+            async def execute(self):
+                return [await getattr(redis, name)(*args) for name, args in calls]
+
+        return _Pipeline()
+
+    async def setnx(self, key, value):
+        return self.data.setdefault(key, value) == value
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def pfadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+        return 1
+
+    async def pfcount(self, *keys):
+        return len(set().union(*(self.data.get(key, set()) for key in keys)))
+
+
+@pytest.mark.asyncio
+async def test_flushed_page_views_feed_the_unique_visitor_sketches(monkeypatch):
+    redis = _HllRedis()
+
+    async def _get_redis():
+        return redis
+
+    product_id = uuid.uuid4()
+    factory = _RecordingSessionFactory(products={"baklava": product_id})
+    monkeypatch.setattr(visitor_counter_service, "get_redis", _get_redis)
+    monkeypatch.setattr(analytics_ingest_service, "async_session_factory", factory)
+    monkeypatch.setattr(analytics_ingest_service, "_product_ids", {})
+    today = datetime.now(timezone.utc)
+    yesterday = today - timedelta(days=1)
+    rows = [
+        AnalyticsIngestService.build_row(
+            AnalyticsEventCreate(event_type=event_type, session_id=session, page_url=url),
+            created_at=at,
+        )
+        for event_type, session, url, at in (
+            ("page_view", "s1", "/products/baklava", yesterday),
+            ("page_view", "s2", "/", yesterday),
+            ("page_view", "s1", "/products/baklava?ref=home", today),
+            ("page_view", "s3", "/products/baklava/", today),
+            ("add_to_cart", "s4", "/products/baklava", today),
+        )
+    ]
+    AnalyticsIngestService.enqueue(*rows)
+    await AnalyticsIngestService.flush()
+
+    start, end = yesterday.date(), today.date()
+    assert await VisitorCounter.daily(start, end) == {start: 2, end: 2}
+    assert await VisitorCounter.unique(start, end) == 3
+    # Keyed by product id, so renaming the slug keeps the counts
+    other_id = str(uuid.uuid4())
+    assert await VisitorCounter.unique_by_product(start, end, [str(product_id), other_id]) == {
+        str(product_id): 2, other_id: 0,
+    }
+    # Counting started part-way through yesterday: full coverage from today
+    assert await VisitorCounter.tracked_since() == end
+    assert await VisitorCounter.tracked_since(products=True) == end
+
+
+@pytest.mark.asyncio
+async def test_days_whose_sketch_is_gone_are_not_trusted(monkeypatch):
+    redis = _HllRedis()
+
+    async def _get_redis():
+        return redis
+
+    monkeypatch.setattr(visitor_counter_service, "get_redis", _get_redis)
+    monkeypatch.setattr(visitor_counter_service.settings, "ANALYTICS_HLL_TTL_DAYS", 5)
+    today = datetime.now(timezone.utc).date()
+    redis.data[visitor_counter_service.TRACKED_SINCE_KEY] = (
+        today - timedelta(days=20)
+    ).isoformat()
+    for offset in range(1, 8):
+        redis.data[visitor_counter_service.day_key(today - timedelta(days=offset))] = {"s"}
+
+    # Counting started 20 days ago, but sketches only live 5 days
+    assert await VisitorCounter.tracked_since() == today - timedelta(days=4)
+
+    # An evicted day moves coverage past it
+    del redis.data[visitor_counter_service.day_key(today - timedelta(days=2))]
+    assert await VisitorCounter.tracked_since() == today - timedelta(days=1)
+
+
+@pytest.mark.asyncio
+async def test_product_page_views_are_resolved_to_products_at_ingestion(monkeypatch):
+    product_id = uuid.uuid4()
+    factory = _RecordingSessionFactory(products={"baklava": product_id})
+    monkeypatch.setattr(analytics_ingest_service, "async_session_factory", factory)
+    monkeypatch.setattr(analytics_ingest_service, "_product_ids", {})
+
+    def _row(page_url, event_type="page_view", **fields):
+        return AnalyticsIngestService.build_row(
+            AnalyticsEventCreate(event_type=event_type, page_url=page_url, **fields)
+        )
+
+    rows = [
+        _row("https://kabulsweets.com/products/baklava?ref=home"),
+        _row("/products/unknown"),
+        _row("/about"),
+        _row("/products/baklava", event_type="add_to_cart"),
+        _row("/products/baklava", resource_type="category", resource_id="sweets"),
+    ]
+    AnalyticsIngestService.enqueue(*rows)
+    await AnalyticsIngestService.flush()
+    AnalyticsIngestService.enqueue(_row("/products/baklava/"))
+    await AnalyticsIngestService.flush()
+
+    params = factory.inserts[0].params
+    assert [(params[f"resource_type_m{i}"], params[f"resource_id_m{i}"]) for i in range(5)] == [
+        ("product", str(product_id)),
+        (None, None),
+        (None, None),
+        (None, None),
+        ("category", "sweets"),
+    ]
+    assert factory.inserts[1].params["resource_id_m0"] == str(product_id)
+    assert factory.lookups == 1  # second batch served from the slug cache
+
+
+def test_user_agents_are_classified_once_and_memoized(monkeypatch):
+    from app.services import event_enrichment_service
+    from app.services.event_enrichment_service import EventEnrichmentService
+
+    monkeypatch.setattr(
+        event_enrichment_service, "_user_agents", event_enrichment_service.OrderedDict()
+    )
+    iphone = (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1"
+    )
+    edge = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0"
+    )
+    samsung_tablet = (
+        "Mozilla/5.0 (Linux; Android 14; SM-X710) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "SamsungBrowser/25.0 Chrome/121.0.0.0 Safari/537.36"
+    )
+    googlebot = "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"
+    cases = {
+        iphone: ("mobile", "Safari", "iOS"),
+        edge: ("desktop", "Edge", "Windows"),
+        samsung_tablet: ("tablet", "Samsung Internet", "Android"),
+        googlebot: ("bot", "Other", "Other"),
+    }
+    for user_agent, expected in cases.items():
+        assert tuple(EventEnrichmentService.parse_user_agent(user_agent)) == expected
+    assert EventEnrichmentService.parse_user_agent(None) == (None, None, None)
+
+    monkeypatch.setattr(
+        event_enrichment_service, "_classify", lambda ua: pytest.fail("not memoized")
+    )
+    row = AnalyticsIngestService.build_row(
+        AnalyticsEventCreate(event_type="page_view"), user_agent=iphone, ip_address="10.0.0.1"
+    )
+    EventEnrichmentService.enrich([row])
+    assert (row["device_type"], row["browser"], row["os"]) == ("mobile", "Safari", "iOS")
+    assert (row["country"], row["city"]) == (None, None)  # no GeoIP database configured
@@ -0,0 +1,380 @@
+import asyncio
+import json
+
+import anyio
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import CachedResponse, CacheService, _LocalCache
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = _LocalCache(max_entries=2, max_ttl=30)
+    local.set("a", 1, 30)
+    local.set("b", 2, 30)
+    assert local.get("a") == 1  # touch "a" so "b" becomes the LRU entry
+    local.set("c", 3, 30)
+
+    assert local.get("b") is None
+    assert local.get("a") == 1
+    assert local.get("c") == 3
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_service.time, "monotonic", lambda: now[0])
+    local = _LocalCache(max_entries=4, max_ttl=30)
+    local.set("k", "v", 300)  # capped at max_ttl
+
+    now[0] += 29
+    assert local.get("k") == "v"
+    now[0] += 2
+    assert local.get("k") is None
+
+
+
+def test_local_cache_hands_out_copies():
+    local = _LocalCache(max_entries=4, max_ttl=30)
+    value = {"items": [1, 2]}
+    local.set("k", value, 30)
+    value["items"].append(3)  # the caller keeps using what it stored
+    local.get("k")["items"].append(4)  # and a reader mutates its result
+
+    assert local.get("k") == {"items": [1, 2]}
+    response = CachedResponse(b"[]", '"e"')
+    local.set("r", response, 30)
+    assert local.get("r") is response  # immutable: shared, not copied
+
+
+def test_local_cache_drops_writes_that_started_before_an_invalidation():
+    local = _LocalCache(max_entries=4, max_ttl=30)
+    since = local.epoch  # a read of "k" from Redis starts
+    local.delete("k")  # pub/sub invalidation arrives meanwhile
+    local.set("k", "stale", 30, since=since)
+    assert local.get("k") is None
+
+    since = local.epoch
+    local.delete_tags(["products"])
+    local.set("list", "stale", 30, tags=("products",), since=since)
+    local.set("other", "fresh", 30, tags=("orders",), since=since)
+    assert local.get("list") is None
+    assert local.get("other") == "fresh"
+
+    since = local.epoch
+    local.set("k", "fresh", 30, since=since)
+    assert local.get("k") == "fresh"
+
+@pytest.mark.asyncio
+async def test_repeat_reads_are_served_from_worker_memory(fake_redis):
+    fake_redis.data["ks:cache:product_list"] = json.dumps([{"id": 1}])
+
+    assert await CacheService.get("ks:cache:product_list") == [{"id": 1}]
+    assert await CacheService.get("ks:cache:product_list") == [{"id": 1}]
+    assert fake_redis.get_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_delete_broadcasts_and_peer_invalidation_drops_local_copy(fake_redis):
+    await CacheService.set("ks:cache:product_detail:1", {"id": 1}, ttl=60)
+    await CacheService.delete("ks:cache:product_detail:1")
+
+    channel, message = fake_redis.published[-1]
+    assert channel == cache_service.INVALIDATION_CHANNEL
+    assert message["keys"] == ["ks:cache:product_detail:1"]
+
+    cache_service._local.set("ks:cache:product_list:x", [1], 30)
+    CacheService._apply_invalidation({"origin": "another-worker", "prefixes": ["ks:cache:product"]})
+    assert cache_service._local.get("ks:cache:product_list:x") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tags_only_touches_tagged_keys(fake_redis):
+    await CacheService.set("ks:cache:list:cake", [1], ttl=60, tags=("products", "category:cake"))
+    await CacheService.set("ks:cache:list:all", [1, 2], ttl=60, tags=("products",))
+    await CacheService.set("ks:cache:dashboard", {"x": 1}, ttl=60, tags=("dashboard",))
+
+    removed = await CacheService.invalidate_tags("category:cake")
+
+    assert removed == 1
+    assert "ks:cache:list:cake" not in fake_redis.data
+    assert "ks:cache:list:all" in fake_redis.data
+    assert cache_service._local.get("ks:cache:list:cake") is None
+    assert cache_service._local.get("ks:cache:list:all") == [1, 2]
+    assert fake_redis.published[-1][1]["tags"] == ["category:cake"]
+
+    await CacheService.invalidate_product("abc")
+    assert "ks:cache:list:all" not in fake_redis.data
+    assert "ks:cache:dashboard" in fake_redis.data
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_coalesces_concurrent_misses(fake_redis):
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["cake"]
+
+    results = await asyncio.gather(
+        *[CacheService.get_or_set("ks:cache:hot", factory, ttl=60) for _ in range(20)]
+    )
+
+    assert calls == 1
+    assert results == [["cake"]] * 20
+    assert "ks:lock:ks:cache:hot" not in fake_redis.data
+
+
+@pytest.mark.asyncio
+async def test_value_computed_across_an_invalidation_is_not_kept(fake_redis):
+    async def _factory():
+        # A product write lands while the old list is being computed
+        await CacheService.invalidate_tags("products")
+        return ["stale"]
+
+    assert await CacheService.get_or_set("ks:cache:list", _factory, tags=("products",)) == [
+        "stale"
+    ]
+    assert "ks:cache:list" not in fake_redis.data
+    assert await CacheService.get("ks:cache:list") is None
+
+    async def _fresh():
+        return ["fresh"]
+
+    await CacheService.get_or_set("ks:cache:list", _fresh, tags=("products",))
+    assert CacheService.unwrap(await CacheService.get("ks:cache:list")) == ["fresh"]
+
+
+@pytest.mark.asyncio
+async def test_invalidation_still_applies_when_the_tag_set_was_evicted(fake_redis):
+    async def _old():
+        return ["old"]
+
+    await CacheService.get_or_set("ks:cache:list", _old, tags=("products",))
+    del fake_redis.data["ks:cache:tag:products"]  # evicted under allkeys-lru
+    await CacheService.invalidate_tags("products")
+    assert "ks:cache:list" in fake_redis.data  # nothing left to find it by
+
+    cache_service._local.clear()  # a worker reading it back from Redis
+    assert await CacheService.get("ks:cache:list") is None
+    assert await CacheService.get_many(["ks:cache:list"]) == [None]
+
+    async def _new():
+        return ["new"]
+
+    assert await CacheService.get_or_set("ks:cache:list", _new, tags=("products",)) == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_serves_stale_value_while_refreshing(fake_redis, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_service.time, "time", lambda: now[0])
+    versions = iter(["v1", "v2"])
+
+    async def factory():
+        return next(versions)
+
+    assert await CacheService.get_or_set("ks:cache:swr", factory, ttl=10, stale_ttl=30) == "v1"
+
+    now[0] += 15  # past the soft TTL, inside the stale window
+    assert await CacheService.get_or_set("ks:cache:swr", factory, ttl=10, stale_ttl=30) == "v1"
+    await asyncio.gather(*cache_service._background_tasks)
+
+    assert await CacheService.get_or_set("ks:cache:swr", factory, ttl=10, stale_ttl=30) == "v2"
+
+
+def test_product_list_hits_are_served_as_cached_bytes(fake_redis, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1 import products
+
+    loads = 0
+
+    async def _load_product_list(**filters):
+        nonlocal loads
+        loads += 1
+        return CachedResponse.payload([{"name": "Baklava", "filler": "x" * 600}])
+
+    monkeypatch.setattr(products, "_load_product_list", _load_product_list)
+    app = FastAPI()
+    app.include_router(products.router)
+    client = TestClient(app)
+
+    first = client.get("/products/", headers={"Accept-Encoding": "identity"})
+    second = client.get("/products/", headers={"Accept-Encoding": "gzip"})
+
+    assert loads == 1
+    assert first.json()[0]["name"] == "Baklava"
+    assert first.headers["etag"] == second.headers["etag"]
+    assert second.headers["content-encoding"] == "gzip"
+    assert second.json() == first.json()
+
+    revalidated = client.get("/products/", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert loads == 1
+
+    anyio.run(CacheService.invalidate_product, "p1")  # as an admin product edit would
+    changed = client.get("/products/", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert loads == 2
+
+
+def test_product_detail_is_cached_once_for_id_and_slug(fake_redis, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1 import products
+
+    product_id = "6f1c2b0e-1a7d-4c55-9a39-2f8e5c1d0b11"
+    loads, resolves = [], []
+
+    async def _load_product_detail(pid):
+        loads.append(str(pid))
+        return CachedResponse.payload(
+            {"id": str(pid), "name": "Baklava"}, last_modified="Mon, 05 Oct 2026 10:00:00 GMT"
+        )
+
+    async def _resolve_slug(slug):
+        resolves.append(slug)
+        return product_id if slug == "baklava" else None
+
+    monkeypatch.setattr(products, "_load_product_detail", _load_product_detail)
+    monkeypatch.setattr(products, "_resolve_slug", _resolve_slug)
+    app = FastAPI()
+    app.include_router(products.router)
+    client = TestClient(app)
+
+    by_id = client.get(f"/products/{product_id}")
+    by_slug = client.get("/products/slug/baklava")
+    assert by_id.json() == by_slug.json() == {"id": product_id, "name": "Baklava"}
+    assert by_id.headers["last-modified"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+    assert loads == [product_id]
+
+    assert client.get("/products/slug/missing").status_code == 404
+    assert client.get("/products/slug/missing").status_code == 404
+    assert resolves == ["baklava", "missing"]
+
+    # Simulate a cold worker: the batch endpoint hydrates from one MGET
+    # (plus one for the tag generations the entries are checked against)
+    cache_service._local.clear()
+    fake_redis.get_calls = 0
+    batch = client.get("/products/batch", params={"ids": [product_id]})
+    assert batch.json() == [{"id": product_id, "name": "Baklava"}]
+    assert fake_redis.get_calls == 2
+    assert loads == [product_id]
+
+
+@pytest.mark.asyncio
+async def test_on_commit_runs_after_commit_and_is_dropped_on_rollback():
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    calls = []
+
+    async def _invalidate():
+        calls.append("invalidated")
+
+    engine = create_engine("sqlite://")
+    with Session(engine) as session:
+        CacheService.on_commit(session, "product:1", _invalidate)
+        CacheService.on_commit(session, "product:1", _invalidate)  # deduplicated
+        session.commit()
+        await asyncio.gather(*cache_service._background_tasks)
+        assert calls == ["invalidated"]
+
+        session.execute(text("SELECT 1"))
+        CacheService.on_commit(session, "product:1", _invalidate)
+        session.rollback()
+        session.commit()
+        await asyncio.gather(*cache_service._background_tasks)
+        assert calls == ["invalidated"]
+
+
+@pytest.mark.asyncio
+async def test_catalog_refresh_rebuilds_only_affected_documents(fake_redis, monkeypatch):
+    from types import SimpleNamespace
+
+    from app.models.product import ProductCategory
+    from app.services import catalog_service
+    from app.services.catalog_service import CatalogService
+
+    class _Result:
+        def one_or_none(self):
+            return SimpleNamespace(category=ProductCategory.CAKE, is_featured=False)
+
+    class _Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, query):
+            return _Result()
+
+    built = []
+
+    async def _build(name):
+        built.append(name)
+        return CachedResponse.payload([{"name": name}])
+
+    monkeypatch.setattr(catalog_service, "async_session_factory", _Session)
+    monkeypatch.setattr(CatalogService, "_build", staticmethod(_build))
+    await CacheService.set(CatalogService._ids_key("popular"), ["p1", "p2"], ttl=60)
+    await CacheService.set(CatalogService._ids_key("featured"), ["p3"], ttl=60)
+
+    # Moved from pastry to cake; listed in "popular" but not "featured"
+    await CatalogService.refresh_for_product("p1", ["pastry"])
+
+    assert built == ["category:cake", "category:pastry", "popular"]
+    document = await CatalogService.get_document("category:cake")
+    assert json.loads(document.body) == [{"name": "category:cake"}]
+    assert fake_redis.published[-1][1]["keys"] == [CatalogService._key("popular")]
+
+
+@pytest.mark.asyncio
+async def test_variant_stock_writes_invalidate_product_caches(monkeypatch):
+    import uuid
+    from types import SimpleNamespace
+
+    from app.models.product import ProductVariant
+    from app.services import catalog_service
+    from app.services.catalog_service import CatalogService
+
+    refreshed = []
+
+    async def _refresh(product_id, categories=()):
+        refreshed.append((product_id, tuple(categories)))
+
+    invalidated = []
+
+    async def _invalidate(product_id=None, categories=None):
+        invalidated.append(product_id)
+
+    monkeypatch.setattr(CatalogService, "refresh_for_product", staticmethod(_refresh))
+    monkeypatch.setattr(CacheService, "invalidate_product", staticmethod(_invalidate))
+    product_id = uuid.uuid4()
+    variant = ProductVariant(product_id=product_id, name="Box of 12", stock_quantity=3)
+    untouched = ProductVariant(product_id=uuid.uuid4(), name="Single")
+    session = SimpleNamespace(dirty=[variant, untouched], info={})
+    # A ProductService write in the same transaction keeps its own refresh
+    CacheService.on_commit(
+        session, f"catalog:{product_id}", lambda: _refresh(product_id, ["cake"])
+    )
+
+    catalog_service._track_stock_writes(session, None)
+
+    pending = session.info[cache_service._ON_COMMIT_KEY]
+    assert sorted(pending) == [f"catalog:{product_id}", f"product:{product_id}"]
+    await pending[f"catalog:{product_id}"]()
+    assert refreshed == [(product_id, ("cake",))]
+    await pending[f"product:{product_id}"]()
+    assert invalidated == [str(product_id)]
+
+    session.info.clear()
+    catalog_service._track_stock_writes(session, None)
+    await session.info[cache_service._ON_COMMIT_KEY][f"catalog:{product_id}"]()
+    assert refreshed[-1] == (product_id, ())
@@ -0,0 +1,77 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import (
+    MetricsMiddleware,
+    MetricsRegistry,
+    latency_summary,
+    merge_snapshots,
+    render_prometheus,
+)
+
+
+def test_middleware_records_templated_routes():
+    metrics = MetricsRegistry()
+    app = FastAPI()
+
+    @app.get("/api/v1/products/{product_id}")
+    async def get_product(product_id: str):
+        return {"id": product_id}
+
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+    client = TestClient(app)
+    client.get("/api/v1/products/a")
+    client.get("/api/v1/products/b")
+    client.get("/nope")
+
+    route = "/api/v1/products/{product_id}"
+    assert metrics.requests[("GET", route, 200)] == 2
+    assert metrics.requests[("GET", "unmatched", 404)] == 1
+    assert sum(metrics.latency[("GET", route)].counts) == 2
+    assert metrics.sizes[("GET", route)].sum == 2 * len(b'{"id":"a"}')
+    assert metrics.in_flight == 0
+
+    text = render_prometheus(merge_snapshots([metrics.snapshot()]))
+    assert f'http_requests_total{{method="GET",route="{route}",status="200"}} 2' in text
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}"}} 2' in text
+
+
+def test_snapshots_merge_across_workers_into_percentiles():
+    workers = [MetricsRegistry(), MetricsRegistry()]
+    for _ in range(90):
+        workers[0].observe("GET", "/fast", 200, 0.004, 100)
+    for _ in range(10):
+        workers[1].observe("GET", "/fast", 200, 0.8, 100)
+    workers[1].in_flight = 3
+
+    merged = merge_snapshots([w.snapshot() for w in workers])
+    [row] = latency_summary(merged)
+
+    assert merged["in_flight"] == 3
+    assert row["count"] == 100
+    assert row["p50_ms"] <= 5
+    assert 500 <= row["p95_ms"] <= 1000
+
+
+def test_metrics_token_is_checked_without_a_database_session(monkeypatch):
+    from app.api.v1 import metrics as metrics_api
+
+    def _no_session():
+        raise AssertionError("token-authenticated scrape opened a session")
+
+    async def _collect():
+        return merge_snapshots([MetricsRegistry().snapshot()])
+
+    monkeypatch.setattr(metrics_api.settings, "METRICS_TOKEN", "scrape-token")
+    monkeypatch.setattr(metrics_api, "async_session_factory", _no_session)
+    monkeypatch.setattr(metrics_api, "collect", _collect)
+    app = FastAPI()
+    app.include_router(metrics_api.router)
+    client = TestClient(app)
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+
+    assert response.status_code == 200
+    with pytest.raises(AssertionError, match="opened a session"):
+        client.get("/metrics", headers={"Authorization": "Bearer wrong"})
@@ -0,0 +1,143 @@
+import time
+
+import anyio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core.query_stats import QueryStatsMiddleware, instrument_engine, statement_shape
+
+
+@pytest.fixture
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    return engine
+
+
+def test_statement_shape_collapses_expanded_in_lists():
+    assert statement_shape("SELECT *\n  FROM t WHERE id IN ($1, $2, $3)") == (
+        statement_shape("SELECT * FROM t WHERE id IN ($1)")
+    )
+
+
+def test_failed_statements_do_not_leave_a_start_time_behind(sqlite_engine):
+    from sqlalchemy.exc import OperationalError
+
+    from app.core.query_stats import track_queries
+
+    with track_queries() as stats, sqlite_engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.info["query_stats_start"] == []
+        conn.execute(text("SELECT 1"))
+
+    assert stats.count == 1
+
+
+def test_endpoint_headers_and_n_plus_one_warning(sqlite_engine, max_queries, caplog):
+    app = FastAPI()
+
+    @app.get("/loop")
+    async def loop():
+        with sqlite_engine.connect() as conn:
+            for i in range(6):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return {}
+
+    app.add_middleware(QueryStatsMiddleware, expose_headers=True)
+    client = TestClient(app)
+
+    with max_queries(6) as stats:
+        response = client.get("/loop")
+
+    assert response.headers["x-db-queries"] == "6"
+    assert float(response.headers["x-db-time"]) >= 0
+    assert stats.repeated() == [("SELECT ?", 6)]
+    assert "Possible N+1 on GET /loop: 6 executions" in caplog.text
+
+    with pytest.raises(AssertionError, match="at most 5 queries"):
+        with max_queries(5):
+            client.get("/loop")
+
+
+class _ListRedis:
+    def __init__(self):
+        self.lists = {}
+
+    def pipeline(self, transaction=True):
+        return _ListPipeline(self)
+
+    async def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+
+class _ListPipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+
+    def lpush(self, key, value):
+        self._ops.append(lambda items: items.insert(0, value))
+        self._key = key
+
+    def ltrim(self, key, start, end):
+        self._ops.append(lambda items: items.__delitem__(slice(end + 1, None)))
+
+    async def execute(self):
+        items = self._redis.lists.setdefault(self._key, [])
+        for op in self._ops:
+            op(items)
+
+
+def test_slow_queries_are_recorded_with_route_and_parameter_shape(monkeypatch):
+    from sqlalchemy import event
+    from sqlalchemy.exc import OperationalError
+
+    from app.core import slow_queries
+
+    redis = _ListRedis()
+
+    async def _get_redis():
+        return redis
+
+    monkeypatch.setattr(slow_queries, "get_redis", _get_redis)
+    monkeypatch.setattr(slow_queries.settings, "SLOW_QUERY_MS", 20)
+    monkeypatch.setattr(slow_queries.settings, "SLOW_QUERY_BUFFER_SIZE", 2)
+
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _register_sleep(dbapi_conn, record):
+        dbapi_conn.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000) or ms)
+
+    instrument_engine(engine)
+    assert slow_queries.install_slow_query_log(engine)
+    slow_queries._engine = None  # sqlite has no EXPLAIN (FORMAT JSON)
+
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+
+    @app.get("/reports/{name}")
+    async def report(name: str):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT sleep(:ms), :name"), {"ms": 30, "name": name})
+            conn.execute(text("SELECT 1"))
+        return {}
+
+    client = TestClient(app)
+    for name in ("a", "b", "c"):
+        client.get(f"/reports/{name}")
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM missing"))
+        assert conn.info["slow_query_start"] == []
+
+    entries = anyio.run(slow_queries.read)
+
+    assert len(entries) == 2  # ring buffer keeps the newest SLOW_QUERY_BUFFER_SIZE
+    assert entries[0]["route"] == "GET /reports/{name}"
+    assert entries[0]["sql"] == "SELECT sleep(?), ?"
+    assert entries[0]["parameters"] == ["int", "str"]
+    assert entries[0]["duration_ms"] >= 20
@@ -0,0 +1,75 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from redis.exceptions import NoScriptError
+
+from app.core import rate_limiter
+from app.core.rate_limiter import check_rate_limit
+from app.core.security_middleware import SecurityHeadersMiddleware
+
+
+class _ScriptRedis:
+    """Replays the Lua script's reply; the first EVALSHA misses the script cache."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def evalsha(self, sha, numkeys, key, *args):
+        self.calls.append(("evalsha", key))
+        if len(self.calls) == 1:
+            raise NoScriptError("NOSCRIPT")
+        return self.replies.pop(0)
+
+    async def eval(self, script, numkeys, key, *args):
+        self.calls.append(("eval", key))
+        return self.replies.pop(0)
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    def _make(redis):
+        async def _get_redis():
+            return redis
+
+        monkeypatch.setattr(rate_limiter, "get_redis", _get_redis)
+        app = FastAPI()
+        app.add_middleware(SecurityHeadersMiddleware)
+
+        @app.post("/login")
+        async def login(request: Request):
+            await check_rate_limit(request, limit=2, window=60)
+            return {"ok": True}
+
+        return TestClient(app)
+
+    return _make
+
+
+def test_rate_limit_headers_and_429(client_for):
+    redis = _ScriptRedis([[1, 1, 60_000], [1, 0, 59_200], [0, 0, 1_500]])
+    client = client_for(redis)
+
+    first = client.post("/login")
+    assert first.status_code == 200
+    assert first.headers["ratelimit-limit"] == "2"
+    assert first.headers["ratelimit-remaining"] == "1"
+    assert first.headers["ratelimit-policy"] == "2;w=60"
+
+    assert client.post("/login").headers["ratelimit-remaining"] == "0"
+
+    blocked = client.post("/login")
+    assert blocked.status_code == 429
+    assert blocked.headers["retry-after"] == "2"
+    assert blocked.headers["ratelimit-reset"] == "2"
+    assert [c[0] for c in redis.calls] == ["evalsha", "eval", "evalsha", "evalsha"]
+
+
+def test_rate_limiter_fails_open_without_redis(client_for):
+    class _Down:
+        async def evalsha(self, *args):
+            raise ConnectionError("redis down")
+
+    response = client_for(_Down()).post("/login")
+    assert response.status_code == 200
+    assert "ratelimit-limit" not in response.headers
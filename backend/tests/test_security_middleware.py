@@ -0,0 +1,93 @@
+from app.core.security_middleware import IPTokenBuckets
+
+
+def test_token_bucket_allows_burst_then_refills():
+    buckets = IPTokenBuckets(rate=2, max_ips=10)
+
+    assert buckets.allow("1.1.1.1", 0.0)
+    assert buckets.allow("1.1.1.1", 0.0)
+    assert not buckets.allow("1.1.1.1", 0.0)
+    assert buckets.allow("1.1.1.1", 0.5)  # one token back after half a second
+    assert not buckets.allow("1.1.1.1", 0.5)
+
+
+def test_token_buckets_evict_least_recently_seen_ip_at_cap():
+    buckets = IPTokenBuckets(rate=1, max_ips=2)
+    buckets.allow("a", 0.0)
+    buckets.allow("b", 0.0)
+    assert not buckets.allow("a", 0.1)  # touches "a"; "b" is now the LRU entry
+    buckets.allow("c", 0.1)
+
+    assert len(buckets) == 2
+    assert buckets.allow("b", 0.1)  # forgotten, so it starts with a full bucket
+    assert not buckets.allow("c", 0.1)
+
+
+def test_security_middleware_streams_and_adds_headers_in_one_pass():
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from fastapi.testclient import TestClient
+
+    from app.core.security_middleware import SecurityMiddleware
+
+    app = FastAPI()
+
+    @app.get("/api/v1/export")
+    async def export():
+        async def rows():
+            for i in range(3):
+                yield f"row{i}\n".encode()
+
+        return StreamingResponse(rows(), media_type="text/plain")
+
+    app.add_middleware(SecurityMiddleware, requests_per_second=1)
+    client = TestClient(app)
+
+    streamed = client.get("/api/v1/export")
+    assert streamed.text == "row0\nrow1\nrow2\n"
+    assert streamed.headers["x-frame-options"] == "DENY"
+    assert streamed.headers["x-request-id"]
+
+    throttled = client.get("/api/v1/export")
+    assert throttled.status_code == 429
+    assert throttled.headers["x-content-type-options"] == "nosniff"
+
+
+def test_pattern_scanner_reloads_blocklist_file(tmp_path, monkeypatch):
+    import os
+
+    from app.core import security_middleware
+    from app.core.security_middleware import PatternScanner
+
+    now = [100.0]
+    monkeypatch.setattr(security_middleware.time, "monotonic", lambda: now[0])
+    blocklist = tmp_path / "blocklist.txt"
+    blocklist.write_text("# comment\nunion select\n' or \n")
+
+    scanner = PatternScanner(("ignored",), str(blocklist))
+    assert scanner.search("q=1' or 2") == "' or "
+    assert scanner.search("q=ignored") is None
+
+    blocklist.write_text("sleep(\n")
+    os.utime(blocklist, ns=(1, 1))
+    assert scanner.search("q=union select") == "union select"  # not re-checked yet
+    now[0] += PatternScanner.RELOAD_INTERVAL
+    assert scanner.search("q=union select") is None
+    assert scanner.search("q=sleep(5)") == "sleep("
+
+
+def test_request_validation_decodes_query_once():
+    from app.core.security_middleware import RequestValidationMiddleware
+
+    middleware = RequestValidationMiddleware(None, blocklist_file="")
+
+    def scope(query: bytes, path: str = "/api/v1/products/"):
+        return {"type": "http", "path": path, "query_string": query, "headers": []}
+
+    assert middleware.reject(scope(b"search=pistachio+baklava&limit=24")) is None
+    assert middleware.reject(scope(b"search=1%20UNION%20SELECT%20pw")) is not None
+    assert middleware.reject(scope(b"file=%2e%2e%2f%2e%2e%2f%2e%2e%2fetc")) is not None
+    assert middleware.reject(scope(b"file=%252e%252e%252fetc")) is not None
+    # Only the decoded form is scanned: one encoded "../" is a relative link
+    assert middleware.reject(scope(b"next=%2e%2e%2fcart")) is None
+    assert middleware.reject(scope(b"", path="/api/v1/../etc")) is not None